@@ -0,0 +1,75 @@
+"""Course-code lookup: linear scan vs. the ChunkStore inverted index.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_course_lookup [--chunks 50000] [--queries 2000]
+
+Builds a synthetic corpus, then times exact-code and prefix lookups with the
+old per-query scan and with the precomputed code/prefix index.
+"""
+import argparse
+import random
+import time
+from utils.chunk_store import ChunkStore
+
+DEPARTMENTS = ["EE", "CS", "MA", "PH", "CH", "ME", "CE", "HS", "BSE", "MM"]
+
+
+def synthetic_store(num_chunks: int, seed: int = 0) -> tuple[ChunkStore, list[str]]:
+    rng = random.Random(seed)
+    codes = [f"{dept}{year}{num:02d}" for dept in DEPARTMENTS for year in range(1, 5) for num in range(1, 60)]
+    metadata = []
+    for i in range(num_chunks):
+        code = rng.choice(codes)
+        # Mimic the raw "Course Code" field, which sometimes contains spaces
+        raw_code = f"{code[:-3]} {code[-3:]}" if i % 3 == 0 else code
+        metadata.append({"course": raw_code, "title": f"Course {code}", "doc_id": code})
+    chunks = [f"chunk {i}" for i in range(num_chunks)]
+    return ChunkStore(ids=range(num_chunks), chunks=chunks, metadata=metadata), codes
+
+
+def linear_scan(store: ChunkStore, course_code: str) -> list:
+    """The previous QueryBot.get_chunks_by_course_code implementation."""
+    course_code_clean = course_code.upper().replace(" ", "")
+    chunks_found = []
+    for i, chunk in enumerate(store.chunks):
+        code_in_chunk = store.metadata[i]["course"].upper().replace(" ", "")
+        if course_code_clean in code_in_chunk:
+            chunks_found.append((chunk, store.metadata[i]))
+    return chunks_found
+
+
+def indexed(store: ChunkStore, course_code: str) -> list:
+    return [store.get(chunk_id) for chunk_id in store.chunk_ids_for_code(course_code)]
+
+
+def timed(func, store, queries) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        func(store, query)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def main(num_chunks: int, num_queries: int):
+    start = time.perf_counter()
+    store, codes = synthetic_store(num_chunks)
+    build_time = time.perf_counter() - start
+
+    rng = random.Random(1)
+    exact_queries = [rng.choice(codes) for _ in range(num_queries)]
+    prefix_queries = [code[:3] for code in exact_queries]
+    scan_queries = max(1, num_queries // 20)
+
+    print(f"Corpus: {num_chunks} chunks, {len(codes)} course codes (index build {build_time * 1000:.1f} ms)")
+    for label, queries in (("exact", exact_queries), ("prefix", prefix_queries)):
+        scan = timed(linear_scan, store, queries[:scan_queries])
+        index = timed(indexed, store, queries)
+        print(f"{label:>6}: scan {scan * 1e6:10.1f} us/query | index {index * 1e6:8.1f} us/query | {scan / index:8.0f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+    main(args.chunks, args.queries)
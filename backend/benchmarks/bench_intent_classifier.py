@@ -0,0 +1,85 @@
+"""Compare the local intent classifier with the Groq router on a labeled set.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_intent_classifier [--skip-llm]
+
+Reports accuracy of the local classifier, the LLM router and the hybrid
+(local when confident, LLM otherwise), plus the average latency saved per
+request by not calling Groq.
+"""
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+from sentence_transformers import SentenceTransformer
+from core.config import Config
+from core.database import db
+from core.llm_client import GroqClient
+from services.router_agent import RouterAgent
+
+EVAL_SET = Path(__file__).parent / "intent_eval.jsonl"
+
+
+def load_eval_set(path: Path = EVAL_SET) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def main(skip_llm: bool):
+    samples = load_eval_set()
+    llm = GroqClient()
+    await db.connect_db()
+    router = RouterAgent(db.db, llm)
+    router.intent_classifier.fit(SentenceTransformer(Config.SENTENCE_TRANSFORMER_MODEL))
+    threshold = router.intent_classifier.threshold
+
+    local_correct = confident = confident_correct = hybrid_correct = 0
+    llm_correct = agree = 0
+    local_time = llm_time = 0.0
+
+    for sample in samples:
+        start = time.perf_counter()
+        label, confidence = router.intent_classifier.predict(sample["prompt"])
+        local_time += time.perf_counter() - start
+        is_confident = confidence >= threshold
+        local_correct += label == sample["label"]
+        confident += is_confident
+        confident_correct += is_confident and label == sample["label"]
+
+        llm_label = None
+        if not skip_llm:
+            start = time.perf_counter()
+            llm_label = await router.classify_prompt_llm(sample["prompt"])
+            llm_time += time.perf_counter() - start
+            llm_correct += llm_label == sample["label"]
+            agree += llm_label == label
+
+        hybrid_label = label if is_confident or skip_llm else llm_label
+        hybrid_correct += hybrid_label == sample["label"]
+
+    n = len(samples)
+    print(f"Samples:                 {n} (threshold {threshold})")
+    print(f"Local accuracy:          {local_correct / n:.1%}")
+    print(f"Local coverage:          {confident / n:.1%} answered without Groq")
+    if confident:
+        print(f"Local confident acc.:    {confident_correct / confident:.1%}")
+    print(f"Local latency:           {local_time / n * 1000:.1f} ms/prompt")
+    if not skip_llm:
+        print(f"LLM accuracy:            {llm_correct / n:.1%}")
+        print(f"Local/LLM agreement:     {agree / n:.1%}")
+        print(f"Hybrid accuracy:         {hybrid_correct / n:.1%}")
+        print(f"LLM latency:             {llm_time / n * 1000:.1f} ms/prompt")
+        saved = confident / n * (llm_time - local_time) / n
+        print(f"Latency saved (avg):     {saved * 1000:.1f} ms/request")
+
+    await llm.close()
+    await db.close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--skip-llm", action="store_true", help="Only evaluate the local classifier")
+    args = parser.parse_args()
+    asyncio.run(main(args.skip_llm))
@@ -0,0 +1,139 @@
+"""Answer-key PDF layout: previous canvas-based path vs. utils.pdf_layout.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_pdf_layout [--pages 30] [--runs 5]
+
+Generates a synthetic answer key of roughly `--pages` pages, then times
+wrapping + rendering with the old implementation (stringWidth on every
+candidate line, a dummy canvas on disk, one drawString per line) and with the
+cached glyph-width tables and per-page text objects.
+"""
+import argparse
+import io
+import os
+import random
+import tempfile
+import time
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from utils import pdf_layout
+
+WORDS = ("the function derivative integral matrix eigenvalue theorem therefore hence "
+         "substituting boundary condition we obtain solution probability distribution "
+         "x^2 + 3x - 4 = 0 lim sin(x)/x dy/dx = 2x convergence series").split()
+
+
+def synthetic_answer_key(pages: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    lines = ["INDIAN INSTITUTE OF TECHNOLOGY INDORE", "End Semester Examination",
+             "MA 105: Calculus", "Answer Key", "Maximum Marks: 100", ""]
+    # ~30 source lines wrap to one A4 page of text
+    question = 1
+    while len(lines) < pages * 30:
+        lines.append(f"Question {question}: " + " ".join(rng.choices(WORDS, k=rng.randint(10, 30))))
+        lines.append(f"Solution {question}:")
+        for _ in range(rng.randint(4, 10)):
+            lines.append(" ".join(rng.choices(WORDS, k=rng.randint(5, 45))))
+        lines.append("")
+        question += 1
+    return "\n".join(lines)
+
+
+def old_wrap_text(text, canvas_obj, font_name, font_size, max_width):
+    words = text.split()
+    lines = []
+    current_line = ""
+    for word in words:
+        test_line = f"{current_line} {word}".strip()
+        if canvas_obj.stringWidth(test_line, font_name, font_size) <= max_width:
+            current_line = test_line
+        else:
+            lines.append(current_line)
+            current_line = word
+    if current_line:
+        lines.append(current_line)
+    return lines
+
+
+def old_render(text: str, temp_dir: str) -> tuple[list, io.BytesIO]:
+    """The previous QuestionPaperBot.text_to_formatted_pdf / split_lines_to_fit_page."""
+    dummy_canvas = canvas.Canvas(os.path.join(temp_dir, "dummy.pdf"))
+    usable_width = A4[0] - 2 * 50
+    lines = []
+    for line in text.split("\n"):
+        if line.strip() == "":
+            lines.append("")
+        else:
+            lines.extend(old_wrap_text(line, dummy_canvas, "Times-Roman", 11, usable_width))
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    y = height - 50
+    for i, line in enumerate(lines):
+        clean_line = line.strip()
+        if i < 5 and clean_line:
+            c.setFont("Times-Bold", 14)
+            c.drawString((width - c.stringWidth(clean_line, "Times-Bold", 14)) / 2, y, clean_line)
+            y -= 14
+        elif any(clean_line.lower().startswith(p) for p in pdf_layout.HEADING_PREFIXES):
+            c.setFont("Times-Bold", 12)
+            c.drawString(50, y, clean_line)
+            y -= 14
+        elif clean_line == "":
+            y -= 14 // 2
+        else:
+            c.setFont("Times-Roman", 11)
+            c.drawString(50, y, clean_line)
+            y -= 14
+        if y < 50:
+            c.showPage()
+            y = height - 50
+            c.setFont("Times-Roman", 11)
+    c.save()
+    buffer.seek(0)
+    return lines, buffer
+
+
+def new_render(text: str) -> tuple[list, io.BytesIO]:
+    lines = pdf_layout.fit_lines(text.split("\n"))
+    return lines, pdf_layout.render_lines(lines)
+
+
+def page_count(buffer: io.BytesIO) -> int:
+    return buffer.getvalue().count(b"/Type /Page\n")
+
+
+def time_runs(func, runs: int) -> float:
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=30)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    text = synthetic_answer_key(args.pages)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        old_lines, old_pdf = old_render(text, temp_dir)
+        new_lines, new_pdf = new_render(text)
+        print(f"Input: {len(text.splitlines())} lines, {len(text)} chars")
+        print(f"Wrapped lines identical: {old_lines == new_lines} ({len(new_lines)} lines)")
+        print(f"Pages: old={page_count(old_pdf)} new={page_count(new_pdf)}")
+        print(f"PDF size: old={len(old_pdf.getvalue())} B new={len(new_pdf.getvalue())} B")
+
+        old_ms = time_runs(lambda: old_render(text, temp_dir), args.runs)
+        new_ms = time_runs(lambda: new_render(text), args.runs)
+    print(f"Old path: {old_ms:.1f} ms")
+    print(f"New path: {new_ms:.1f} ms ({old_ms / new_ms:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Startup: import time of `main`, time to /health and time to /ready.
+
+Run from the backend directory (needs the usual .env):
+
+    python -m benchmarks.bench_startup [--runs 3] [--port 8011]
+
+Times `import main` in fresh interpreters. The server is then started with
+blocking warm-up (STARTUP_BACKGROUND_WARMUP=false) and with background
+warm-up, and /health and /ready are polled until each first answers 200.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import httpx
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def import_time() -> float:
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def wait_for(url: str, started: float, timeout: float) -> float | None:
+    while time.perf_counter() - started < timeout:
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    return None
+
+
+def server_times(port: int, background: bool, timeout: float) -> tuple[float | None, float | None]:
+    env = {**os.environ, "STARTUP_BACKGROUND_WARMUP": "true" if background else "false"}
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL
+    )
+    try:
+        health = wait_for(f"http://127.0.0.1:{port}/health", started, timeout)
+        ready = wait_for(f"http://127.0.0.1:{port}/ready", started, timeout)
+        return health, ready
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def fmt(seconds: float | None) -> str:
+    return "timeout" if seconds is None else f"{seconds * 1000:8.0f} ms"
+
+
+def main(runs: int, port: int, timeout: float):
+    imports = [import_time() for _ in range(runs)]
+    print(f"import main:        {statistics.median(imports) * 1000:8.0f} ms (median of {runs})")
+    for background in (False, True):
+        health, ready = server_times(port, background, timeout)
+        mode = "background" if background else "blocking"
+        print(f"{mode:>10} warm-up: /health {fmt(health)}   /ready {fmt(ready)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+    main(args.runs, args.port, args.timeout)
@@ -0,0 +1,156 @@
+"""Per-worker memory: shared index pages and the shared embedding sidecar.
+
+Run from the backend directory after the server has built the index once:
+
+    python -m benchmarks.bench_worker_memory [--workers 4] [--queries 50]
+
+or, without a server, MongoDB or embedding model, against a synthetic index
+of N random 384-dimensional vectors (index cases only):
+
+    python -m benchmarks.bench_worker_memory --index-only --synthetic 200000
+
+Starts N worker processes that load the stored index artifact, answer a few
+searches, and report their RSS / USS / PSS while all of them are alive. The
+index is loaded once into private memory (`faiss.read_index`, what every
+worker paid before the artifact was memory-mapped) and once mapped with
+`IndexStore.load`. The embedding model is then loaded in every worker and
+in a single sidecar. Total PSS (which splits shared pages between the
+processes mapping them) is the number to compare.
+"""
+import argparse
+import multiprocessing as mp
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from core.config import Config
+from utils.chunk_store import ChunkStore
+from utils.index_store import INDEX_FILE, MANIFEST_FILE, IndexStore
+from utils.memory import memory_usage
+
+SYNTHETIC_DIM = 384
+
+
+def latest_version(store: IndexStore) -> str | None:
+    if store.current() is not None:
+        return store.current()
+    versions = [
+        name for name in os.listdir(store.root)
+        if os.path.exists(os.path.join(store.root, name, MANIFEST_FILE))
+    ] if os.path.isdir(store.root) else []
+    return max(versions, key=lambda v: os.path.getmtime(store.path_for(v)), default=None)
+
+
+def build_synthetic(root: str, num_vectors: int) -> str:
+    import faiss
+
+    vectors = np.random.default_rng(0).random((num_vectors, SYNTHETIC_DIM), dtype=np.float32)
+    index = faiss.IndexIDMap2(faiss.IndexFlatL2(SYNTHETIC_DIM))
+    index.add_with_ids(vectors, np.arange(num_vectors, dtype=np.int64))
+    store = ChunkStore(ids=range(num_vectors), chunks=[""] * num_vectors, metadata=[{}] * num_vectors)
+    IndexStore(root).save("synthetic", index, store, "synthetic")
+    return "synthetic"
+
+
+def worker(root: str, version: str, private_index: bool, model_mode: str | None, sidecar_socket: str,
+           num_queries: int, results, done):
+    model = None
+    if model_mode == "sidecar":
+        from services.embedding_sidecar import RemoteEmbeddingModel
+        model = RemoteEmbeddingModel(sidecar_socket)
+        model.wait_until_ready()
+    elif model_mode == "in-process":
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(Config.SENTENCE_TRANSFORMER_MODEL)
+    if private_index:
+        import faiss
+        index = faiss.read_index(os.path.join(IndexStore(root).path_for(version), INDEX_FILE))
+    else:
+        index = IndexStore(root).load(version)["index"]
+    rng = np.random.default_rng(os.getpid())
+    for i in range(num_queries):
+        if model is None:
+            query_vec = rng.random((1, index.d), dtype=np.float32)
+        else:
+            query_vec = np.asarray(model.encode([f"syllabus of course {i}"]), dtype=np.float32)
+        index.search(query_vec, 4)
+    results.put((os.getpid(), memory_usage()))
+    # Stay alive until every worker has reported, so shared pages are split fairly
+    done.wait()
+
+
+def run(label: str, root: str, version: str, num_workers: int, num_queries: int,
+        private_index: bool = False, model_mode: str | None = None) -> dict:
+    sidecar, sidecar_socket = None, ""
+    if model_mode == "sidecar":
+        sidecar_socket = os.path.join(tempfile.mkdtemp(), "embedding.sock")
+        sidecar = subprocess.Popen(
+            [sys.executable, "-m", "services.embedding_sidecar"],
+            env={**os.environ, "EMBEDDING_SIDECAR_SOCKET": sidecar_socket}
+        )
+    ctx = mp.get_context("spawn")
+    results, done = ctx.Queue(), ctx.Event()
+    procs = [
+        ctx.Process(target=worker, args=(root, version, private_index, model_mode, sidecar_socket,
+                                         num_queries, results, done))
+        for _ in range(num_workers)
+    ]
+    for p in procs:
+        p.start()
+    reports = [results.get() for _ in procs]
+    if sidecar is not None:
+        reports.append(("sidecar", memory_usage(sidecar.pid)))
+    done.set()
+    for p in procs:
+        p.join()
+    if sidecar is not None:
+        sidecar.terminate()
+        sidecar.wait()
+
+    print(f"\n{label}: {num_workers} workers")
+    for pid, usage in reports:
+        print(f"  {str(pid):>8}  " + "  ".join(f"{k.upper()} {v:8.1f} MB" for k, v in usage.items()))
+    totals = {k: sum(usage.get(k, 0.0) for _, usage in reports) for k in reports[0][1]}
+    print("     total  " + "  ".join(f"{k.upper()} {v:8.1f} MB" for k, v in totals.items()))
+    return totals
+
+
+def main(num_workers: int, num_queries: int, index_only: bool, synthetic: int):
+    tmp_root = None
+    if synthetic:
+        root = tmp_root = tempfile.mkdtemp()
+        version = build_synthetic(root, synthetic)
+    else:
+        root = Config.INDEX_CACHE_DIR
+        version = latest_version(IndexStore(root))
+        if version is None:
+            sys.exit(f"No index artifact in {root}; start the server once to build it (or pass --synthetic N).")
+    # A freshly written artifact is dirty page cache, which smaps counts as private until written back
+    os.sync()
+    start = time.perf_counter()
+    try:
+        private = run("index read into each worker", root, version, num_workers, num_queries, private_index=True)
+        shared = run("index memory-mapped (IO_FLAG_MMAP_IFC)", root, version, num_workers, num_queries)
+        print(f"\nIndex, total PSS: {private.get('pss', 0):.1f} MB -> {shared.get('pss', 0):.1f} MB")
+        if not index_only:
+            before = run("model in every worker", root, version, num_workers, num_queries, model_mode="in-process")
+            after = run("model in the sidecar", root, version, num_workers, num_queries, model_mode="sidecar")
+            print(f"\nModel, total PSS: {before.get('pss', 0):.1f} MB -> {after.get('pss', 0):.1f} MB")
+    finally:
+        if tmp_root is not None:
+            shutil.rmtree(tmp_root, ignore_errors=True)
+    print(f"({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--index-only", action="store_true", help="skip the embedding model cases")
+    parser.add_argument("--synthetic", type=int, default=0, metavar="N",
+                        help="measure a temporary index of N random vectors instead of INDEX_CACHE_DIR")
+    args = parser.parse_args()
+    main(args.workers, args.queries, args.index_only, args.synthetic)
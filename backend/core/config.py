@@ -16,10 +16,156 @@ class Config:
     SENTENCE_TRANSFORMER_MODEL = "all-MiniLM-L6-v2"
     GROQ_MODEL = "llama-3.1-8b-instant"
     GROQ_VERSATILE_MODEL = "llama-3.3-70b-versatile"
+    GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+
+    # Shared Groq HTTP client (connection pool + timeouts)
+    GROQ_HTTP2 = os.getenv("GROQ_HTTP2", "true").lower() == "true"
+    GROQ_MAX_CONNECTIONS = int(os.getenv("GROQ_MAX_CONNECTIONS", "100"))
+    GROQ_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("GROQ_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    GROQ_KEEPALIVE_EXPIRY = float(os.getenv("GROQ_KEEPALIVE_EXPIRY", "60"))
+    GROQ_CONNECT_TIMEOUT = float(os.getenv("GROQ_CONNECT_TIMEOUT", "5"))
+    GROQ_DEFAULT_TIMEOUT = float(os.getenv("GROQ_DEFAULT_TIMEOUT", "30"))
+
+    # Groq call governor: per-model rate limits (defaults are Groq's free-tier limits).
+    # Limits are enforced per process, so with N uvicorn workers set each to 1/N of the account limit.
+    GROQ_GOVERNOR_ENABLED = os.getenv("GROQ_GOVERNOR_ENABLED", "false").lower() == "true"
+    GROQ_FAST_RPM = int(os.getenv("GROQ_FAST_RPM", "30"))
+    GROQ_FAST_TPM = int(os.getenv("GROQ_FAST_TPM", "6000"))
+    GROQ_VERSATILE_RPM = int(os.getenv("GROQ_VERSATILE_RPM", "30"))
+    GROQ_VERSATILE_TPM = int(os.getenv("GROQ_VERSATILE_TPM", "12000"))
+    # Share of each budget only the routing lane may use
+    GROQ_PRIORITY_RESERVE = float(os.getenv("GROQ_PRIORITY_RESERVE", "0.2"))
+    # Output tokens reserved per call before the real usage is known (capped at max_tokens)
+    GROQ_EXPECTED_OUTPUT_TOKENS = int(os.getenv("GROQ_EXPECTED_OUTPUT_TOKENS", "300"))
+    # Longest a call may queue for budget per lane before failing as busy (0 = no limit)
+    GROQ_MAX_WAIT_ROUTING = float(os.getenv("GROQ_MAX_WAIT_ROUTING", "5"))
+    GROQ_MAX_WAIT_INTERACTIVE = float(os.getenv("GROQ_MAX_WAIT_INTERACTIVE", "15"))
+    GROQ_MAX_WAIT_BACKGROUND = float(os.getenv("GROQ_MAX_WAIT_BACKGROUND", "120"))
+    GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "3"))
+    GROQ_BACKOFF_BASE = float(os.getenv("GROQ_BACKOFF_BASE", "1"))
+    GROQ_BACKOFF_MAX = float(os.getenv("GROQ_BACKOFF_MAX", "30"))
+
+    # Persisted FAISS index artifacts (rebuilt only when the curriculum changes)
+    INDEX_CACHE_DIR = os.getenv("INDEX_CACHE_DIR", str(Path(__file__).parent.parent / "index_cache"))
+
+    # Pick up curriculum edits without a restart (change stream, polling fallback)
+    CURRICULUM_WATCH_ENABLED = os.getenv("CURRICULUM_WATCH_ENABLED", "true").lower() == "true"
+    CURRICULUM_POLL_INTERVAL = float(os.getenv("CURRICULUM_POLL_INTERVAL", "60"))
+    # How often non-leader workers check for an index version published by the leader
+    CURRICULUM_FOLLOW_INTERVAL = float(os.getenv("CURRICULUM_FOLLOW_INTERVAL", "5"))
+
+    # Micro-batching query embedding service
+    EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "32"))
+    EMBEDDING_MAX_WAIT_MS = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5"))
+    EMBEDDING_MAX_QUEUE_SIZE = int(os.getenv("EMBEDDING_MAX_QUEUE_SIZE", "1024"))
+
+    # Multi-worker mode: one embedding sidecar serves every worker over a Unix socket
+    EMBEDDING_SIDECAR_SOCKET = os.getenv("EMBEDDING_SIDECAR_SOCKET", "")  # empty = model loaded in-process
+    EMBEDDING_SIDECAR_TIMEOUT = float(os.getenv("EMBEDDING_SIDECAR_TIMEOUT", "30"))
+    EMBEDDING_SIDECAR_CONNECT_TIMEOUT = float(os.getenv("EMBEDDING_SIDECAR_CONNECT_TIMEOUT", "120"))
+
+    # LRU + TTL caches for query embeddings and retrieval results
+    QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "2048"))
+    QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+
+    # Exact + semantic cache of academic query answers
+    RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+    RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "21600"))
+    RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.92"))
+
+    # PDF text extraction: use the text layer unless a page looks scanned/garbled
+    PDF_TEXT_MIN_CHARS = int(os.getenv("PDF_TEXT_MIN_CHARS", "40"))
+    PDF_TEXT_MAX_GARBAGE_RATIO = float(os.getenv("PDF_TEXT_MAX_GARBAGE_RATIO", "0.1"))
+
+    # In-memory render -> OCR pipeline (per request)
+    OCR_PAGES_IN_FLIGHT = int(os.getenv("OCR_PAGES_IN_FLIGHT", "4"))
+    OCR_QUEUE_DEPTH = int(os.getenv("OCR_QUEUE_DEPTH", "2"))
+
+    # Process-wide OCR scheduler (0 workers = one per CPU core)
+    OCR_PROCESS_WORKERS = int(os.getenv("OCR_PROCESS_WORKERS", "0"))
+    OCR_MAX_PAGES_PER_REQUEST = int(os.getenv("OCR_MAX_PAGES_PER_REQUEST", "30"))
+    OCR_MAX_QUEUED_PAGES = int(os.getenv("OCR_MAX_QUEUED_PAGES", "200"))
+
+    # Content-addressed cache of OCR text and answer papers
+    PAPER_CACHE_DIR = os.getenv("PAPER_CACHE_DIR", str(Path(__file__).parent.parent / "paper_cache"))
+    PAPER_CACHE_MAX_BYTES = int(os.getenv("PAPER_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+    PAPER_CACHE_REUSE_TEXT_FOR_GENERATE = os.getenv("PAPER_CACHE_REUSE_TEXT_FOR_GENERATE", "true").lower() == "true"
+
+    # Map-reduce solving of long question papers
+    PAPER_BATCH_MAX_QUESTIONS = int(os.getenv("PAPER_BATCH_MAX_QUESTIONS", "4"))
+    PAPER_BATCH_MAX_CHARS = int(os.getenv("PAPER_BATCH_MAX_CHARS", "4000"))
+    PAPER_SOLVE_CONCURRENCY = int(os.getenv("PAPER_SOLVE_CONCURRENCY", "4"))
+
+    # Uploads: files up to the spool threshold stay in memory, larger ones go to temp/
+    UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+    UPLOAD_SPOOL_THRESHOLD = int(os.getenv("UPLOAD_SPOOL_THRESHOLD", str(8 * 1024 * 1024)))
+    UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+    # Chat history: recent-message cache and batched (write-behind) inserts
+    HISTORY_CACHE_CONVERSATIONS = int(os.getenv("HISTORY_CACHE_CONVERSATIONS", "1024"))
+    HISTORY_CACHE_MESSAGES = int(os.getenv("HISTORY_CACHE_MESSAGES", "20"))
+    # Cached history older than this is checked against MongoDB for turns saved by other workers
+    # (0 = check on every load; raise it only with a single worker)
+    HISTORY_CACHE_REVALIDATE_SECONDS = float(os.getenv("HISTORY_CACHE_REVALIDATE_SECONDS", "0"))
+    HISTORY_FLUSH_BATCH = int(os.getenv("HISTORY_FLUSH_BATCH", "100"))
+    HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "1"))
+    HISTORY_MAX_PENDING = int(os.getenv("HISTORY_MAX_PENDING", "10000"))
+    HISTORY_TTL_DAYS = float(os.getenv("HISTORY_TTL_DAYS", "0"))  # 0 keeps history forever
+
+    # Token-budgeted history: older turns are replaced by a rolling summary
+    HISTORY_COMPACTION_ENABLED = os.getenv("HISTORY_COMPACTION_ENABLED", "true").lower() == "true"
+    HISTORY_TOKEN_BUDGET_GENERAL = int(os.getenv("HISTORY_TOKEN_BUDGET_GENERAL", "800"))
+    HISTORY_TOKEN_BUDGET_QUERY = int(os.getenv("HISTORY_TOKEN_BUDGET_QUERY", "1500"))
+    HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "200"))
+
+    # Background question-paper jobs (/jobs)
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "32"))
+    JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "3600"))
+    JOB_STORE = os.getenv("JOB_STORE", "memory")  # "memory" or "mongo"
+    JOB_EVENTS_POLL_INTERVAL = float(os.getenv("JOB_EVENTS_POLL_INTERVAL", "2"))
+
+    # Adaptive 8B/70B model cascade for course answers and paper solving
+    CASCADE_ENABLED = os.getenv("CASCADE_ENABLED", "true").lower() == "true"
+    CASCADE_MAX_SMALL_PROMPT_TOKENS = int(os.getenv("CASCADE_MAX_SMALL_PROMPT_TOKENS", "2500"))
+    CASCADE_MAX_SMALL_QUESTIONS = int(os.getenv("CASCADE_MAX_SMALL_QUESTIONS", "1"))
+    CASCADE_ESCALATE_LOW_CONFIDENCE = os.getenv("CASCADE_ESCALATE_LOW_CONFIDENCE", "true").lower() == "true"
+
+    # Templated answers for single-field course lookups ("credits of CS103"), no LLM call
+    COURSE_FAST_PATH_ENABLED = os.getenv("COURSE_FAST_PATH_ENABLED", "true").lower() == "true"
+
+    # Local embedding-based intent classifier (falls back to Groq when unsure)
+    INTENT_CLASSIFIER_ENABLED = os.getenv("INTENT_CLASSIFIER_ENABLED", "true").lower() == "true"
+    INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.75"))
     
+    # Load the embedding model and index after the server starts accepting requests (see /ready)
+    STARTUP_BACKGROUND_WARMUP = os.getenv("STARTUP_BACKGROUND_WARMUP", "true").lower() == "true"
+    # A failed warm-up is retried with exponential backoff (0 attempts = keep retrying)
+    STARTUP_WARMUP_MAX_ATTEMPTS = int(os.getenv("STARTUP_WARMUP_MAX_ATTEMPTS", "0"))
+    STARTUP_WARMUP_BACKOFF_BASE = float(os.getenv("STARTUP_WARMUP_BACKOFF_BASE", "5"))
+    STARTUP_WARMUP_BACKOFF_MAX = float(os.getenv("STARTUP_WARMUP_BACKOFF_MAX", "300"))
+
     # Environment detection
     DEBUG = os.getenv("DEBUG", "false").lower() == "true"
     
+    @classmethod
+    def groq_rate_limits(cls) -> dict[str, tuple[int, int]]:
+        """(requests per minute, tokens per minute) per governed model."""
+        return {
+            cls.GROQ_MODEL: (cls.GROQ_FAST_RPM, cls.GROQ_FAST_TPM),
+            cls.GROQ_VERSATILE_MODEL: (cls.GROQ_VERSATILE_RPM, cls.GROQ_VERSATILE_TPM)
+        }
+
+    @classmethod
+    def groq_max_wait(cls) -> dict[str, float]:
+        """Maximum queue wait in seconds per governor lane; lanes set to 0 wait without limit."""
+        waits = {
+            "routing": cls.GROQ_MAX_WAIT_ROUTING,
+            "interactive": cls.GROQ_MAX_WAIT_INTERACTIVE,
+            "background": cls.GROQ_MAX_WAIT_BACKGROUND
+        }
+        return {lane: seconds for lane, seconds in waits.items() if seconds > 0}
+
     @classmethod
     def validate(cls) -> list[str]:
         """Validate required environment variables. Returns list of errors."""
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import random
+from typing import AsyncIterator
+import httpx
+from core.config import Config
+from core.rate_limiter import ModelLimiter
+from utils.metrics import metrics
+from utils.tokens import estimate_tokens, messages_tokens
+
+RETRYABLE_STATUS_CODES = (429, 503)
+
+class GroqClient:
+    """Shared, pooled async HTTP client for Groq chat completions.
+
+    One instance is created in the FastAPI lifespan and handed to every bot so
+    that all Groq calls reuse the same keep-alive (HTTP/2) connections instead
+    of paying a TCP+TLS handshake per request.
+
+    Calls to models with configured limits go through a per-model governor
+    (requests and tokens per minute, priority lanes, see core.rate_limiter).
+    A call reserves its prompt plus an expected output size, and the
+    reservation is settled against the usage Groq reports once the response
+    is complete. 429/503 responses are retried after Retry-After or an
+    exponential backoff with jitter.
+    """
+
+    def __init__(self,
+                 api_key: str = Config.GROQ_API_KEY,
+                 api_url: str = Config.GROQ_API_URL,
+                 http2: bool = Config.GROQ_HTTP2,
+                 max_connections: int = Config.GROQ_MAX_CONNECTIONS,
+                 max_keepalive_connections: int = Config.GROQ_MAX_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry: float = Config.GROQ_KEEPALIVE_EXPIRY,
+                 connect_timeout: float = Config.GROQ_CONNECT_TIMEOUT,
+                 default_timeout: float = Config.GROQ_DEFAULT_TIMEOUT,
+                 rate_limits: dict | None = None,
+                 max_retries: int = Config.GROQ_MAX_RETRIES,
+                 expected_output_tokens: int = Config.GROQ_EXPECTED_OUTPUT_TOKENS):
+        self.api_key = api_key
+        self.api_url = api_url
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.connect_timeout = connect_timeout
+        self.default_timeout = default_timeout
+        self.max_retries = max_retries
+        self.expected_output_tokens = expected_output_tokens
+        if rate_limits is None:
+            rate_limits = Config.groq_rate_limits() if Config.GROQ_GOVERNOR_ENABLED else {}
+        self.limiters = {
+            model: ModelLimiter(model, rpm, tpm, Config.GROQ_PRIORITY_RESERVE)
+            for model, (rpm, tpm) in rate_limits.items()
+        }
+        self._client: httpx.AsyncClient | None = None
+
+    async def start(self):
+        """Open the underlying connection pool."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=self.limits,
+                timeout=self._timeout(self.default_timeout),
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                }
+            )
+
+    async def close(self):
+        """Close all pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _timeout(self, timeout: float) -> httpx.Timeout:
+        return httpx.Timeout(timeout, connect=min(self.connect_timeout, timeout))
+
+    async def _send(self, payload: dict, timeout: float | None, lane: str, stream: bool):
+        """Open a (possibly streamed) response under the model's governor, retrying 429/503.
+
+        Returns (response, limiter, reserved tokens); the caller closes the
+        response and settles the reservation. A failed call (transport error
+        or error status) refunds its reservation before raising. Raises ModelBusyError when the
+        governor cannot start the call within the lane's maximum wait.
+        """
+        if self._client is None:
+            await self.start()
+        limiter = self.limiters.get(payload.get("model"))
+        reserved = 0
+        for attempt in range(self.max_retries + 1):
+            if limiter is not None:
+                reserved = await limiter.acquire(lane, self._reservation(payload))
+            request = self._client.build_request(
+                "POST",
+                self.api_url,
+                json={**payload, "stream": True} if stream else payload,
+                timeout=self._timeout(timeout or self.default_timeout)
+            )
+            try:
+                response = await self._client.send(request, stream=stream)
+            except BaseException:
+                # Timeout, connection error or cancellation: nothing was generated
+                if limiter is not None:
+                    limiter.refund(reserved)
+                raise
+            if response.status_code not in RETRYABLE_STATUS_CODES or attempt == self.max_retries:
+                break
+            await response.aclose()
+            metrics.incr(f"groq.status_{response.status_code}")
+            delay = self._retry_delay(response, attempt)
+            if limiter is not None:
+                # Nothing was generated; the whole reservation goes back
+                limiter.refund(reserved)
+                await limiter.block(delay)
+            metrics.incr("groq.retries")
+            await asyncio.sleep(delay)
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            metrics.incr(f"groq.status_{response.status_code}")
+        if response.is_error:
+            if limiter is not None:
+                limiter.refund(reserved)
+            if stream:
+                await response.aread()
+                await response.aclose()
+            response.raise_for_status()
+        return response, limiter, reserved
+
+    def _reservation(self, payload: dict) -> int:
+        """Tokens to reserve up front: the prompt plus the expected, not the maximum, output."""
+        max_tokens = payload.get("max_tokens", 1024)
+        return messages_tokens(payload.get("messages", [])) + min(max_tokens, self.expected_output_tokens)
+
+    @staticmethod
+    def _retry_delay(response: httpx.Response, attempt: int) -> float:
+        retry_after = response.headers.get("retry-after")
+        try:
+            if retry_after is not None:
+                return float(retry_after) + random.uniform(0, 0.5)
+        except ValueError:
+            pass
+        # Full jitter: spread retries of concurrent callers over the backoff window
+        return random.uniform(0, min(Config.GROQ_BACKOFF_MAX, Config.GROQ_BACKOFF_BASE * 2 ** attempt))
+
+    async def chat_completion(self, payload: dict, timeout: float | None = None, lane: str = "interactive") -> dict:
+        """POST a chat completion payload and return the decoded JSON body.
+
+        Raises the usual httpx exceptions (TimeoutException, HTTPStatusError) so
+        callers keep their existing error handling.
+        """
+        response, limiter, reserved = await self._send(payload, timeout, lane, stream=False)
+        data = response.json()
+        if limiter is not None:
+            limiter.settle(reserved, (data.get("usage") or {}).get("total_tokens", reserved))
+        return data
+
+    async def complete(self, payload: dict, timeout: float | None = None, lane: str = "interactive") -> str:
+        """Return the stripped message content of the first choice."""
+        data = await self.chat_completion(payload, timeout=timeout, lane=lane)
+        return data["choices"][0]["message"]["content"].strip()
+
+    async def stream_completion(self, payload: dict, timeout: float | None = None,
+                                lane: str = "interactive") -> AsyncIterator[str]:
+        """Yield content deltas from a streamed (`stream: true`) chat completion."""
+        response, limiter, reserved = await self._send(payload, timeout, lane, stream=True)
+        generated = 0
+        usage = None
+        try:
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                # Groq reports usage on the final chunk under x_groq
+                usage = chunk.get("usage") or (chunk.get("x_groq") or {}).get("usage") or usage
+                choices = chunk.get("choices") or [{}]
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    generated += estimate_tokens(delta)
+                    yield delta
+        finally:
+            await response.aclose()
+            if limiter is not None:
+                used = (usage or {}).get("total_tokens")
+                if used is None:
+                    used = messages_tokens(payload.get("messages", [])) + generated
+                limiter.settle(reserved, used)
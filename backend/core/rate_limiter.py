@@ -0,0 +1,154 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from core.config import Config
+from utils.metrics import metrics
+
+# Lanes in priority order: routing decisions gate every request, interactive
+# answers are what users wait on, background covers paper generation and
+# conversation summaries.
+LANES = ("routing", "interactive", "background")
+
+
+class ModelBusyError(Exception):
+    """The model's budget cannot serve a request within its lane's maximum wait; the message is user-facing."""
+
+    def __init__(self, model: str, retry_after: float):
+        self.model = model
+        self.retry_after = retry_after
+        super().__init__(
+            "I'm handling a lot of requests right now. "
+            f"Please try again in about {max(1, math.ceil(retry_after))} seconds."
+        )
+
+
+class TokenBucket:
+    """Continuously refilling bucket of `capacity` units per `period` seconds."""
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, reserve: float = 0.0) -> float:
+        """Seconds until `amount` can be taken while leaving `reserve` in the bucket."""
+        self._refill()
+        missing = amount + reserve - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= amount
+
+    def refund(self, amount: float):
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class ModelLimiter:
+    """Requests-per-minute and tokens-per-minute budget for one model.
+
+    Waiters are served strictly by (lane, arrival), and lower lanes may not
+    dip into the last `reserve_fraction` of either bucket, so a routing call
+    never queues behind a burst of paper generation. A 429 pauses the whole
+    model until its Retry-After has passed. A request that could not start
+    within its lane's `max_wait` seconds fails with ModelBusyError instead
+    of queueing without bound.
+    """
+
+    def __init__(self, model: str, rpm: int, tpm: int, reserve_fraction: float = 0.2,
+                 max_wait: dict[str, float] | None = None):
+        self.model = model
+        self.max_wait = max_wait if max_wait is not None else Config.groq_max_wait()
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.reserve_fraction = reserve_fraction
+        self.blocked_until = 0.0
+        self._cond = asyncio.Condition()
+        self._waiters: list = []
+        self._seq = itertools.count()
+
+    def _delay(self, lane: str, tokens: int) -> float:
+        reserve = 0.0 if lane == LANES[0] else self.reserve_fraction
+        return max(
+            self.blocked_until - time.monotonic(),
+            self.requests.delay(1, reserve * self.requests.capacity),
+            self.tokens.delay(tokens, reserve * self.tokens.capacity)
+        )
+
+    async def acquire(self, lane: str, tokens: int) -> int:
+        """Wait for capacity for one request of about `tokens` tokens; returns the amount taken.
+
+        Raises ModelBusyError once the wait would exceed the lane's maximum.
+        """
+        # Only a request larger than the whole bucket is cut down, so it can ever start
+        tokens = min(tokens, int(self.tokens.capacity * (1 - self.reserve_fraction)))
+        entry = (LANES.index(lane), next(self._seq))
+        started = time.perf_counter()
+        max_wait = self.max_wait.get(lane)
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+        async with self._cond:
+            heapq.heappush(self._waiters, entry)
+            metrics.set_gauge(f"groq.{self.model}.waiting", len(self._waiters))
+            try:
+                while True:
+                    remaining = math.inf if deadline is None else deadline - time.monotonic()
+                    if self._waiters[0] == entry:
+                        timeout = self._delay(lane, tokens)
+                        if timeout <= 0:
+                            break
+                        if timeout > remaining:
+                            self._busy(lane, timeout)
+                    elif remaining <= 0:
+                        self._busy(lane, self._delay(lane, tokens))
+                    else:
+                        timeout = None if deadline is None else remaining
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                metrics.set_gauge(f"groq.{self.model}.waiting", len(self._waiters))
+                # The next waiter in line may be able to go now
+                self._cond.notify_all()
+            self.requests.take(1)
+            self.tokens.take(tokens)
+        metrics.observe(f"groq.queue_wait_ms.{lane}", (time.perf_counter() - started) * 1000)
+        return tokens
+
+    def _busy(self, lane: str, retry_after: float):
+        metrics.incr(f"groq.busy.{lane}")
+        raise ModelBusyError(self.model, retry_after)
+
+    def refund(self, tokens: int):
+        """Return a reservation for a request that generated nothing."""
+        if tokens > 0:
+            self.tokens.refund(tokens)
+
+    def settle(self, reserved: int, used: int):
+        """Correct a reservation to the tokens the request actually used.
+
+        Reservations only estimate the output, so a long answer takes the
+        difference out of the bucket (which may go negative and delay the
+        next callers) and a short one gives the rest back.
+        """
+        if used > reserved:
+            self.tokens.take(used - reserved)
+        else:
+            self.refund(reserved - used)
+
+    async def block(self, seconds: float):
+        """Pause every lane after a 429, then wake waiters so they re-check."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        async with self._cond:
+            self._cond.notify_all()
@@ -1,3 +1,8 @@
+import time
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import io
 import os
 import uuid
 import json
@@ -7,8 +12,28 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, StreamingResponse
 from core.database import db
 from core.config import Config
+from core.llm_client import GroqClient
 from services.router_agent import RouterAgent
+from services.ocr_scheduler import ocr_scheduler
+from services.job_manager import JobManager, JobQueueFullError, InMemoryJobStore, MongoJobStore
+from utils.metrics import metrics
+from utils.memory import record_memory_gauges
+from utils.uploads import UploadLimitMiddleware, UploadTooLargeError, read_upload, discard_upload
 from contextlib import asynccontextmanager
+import psutil
+
+metrics.set_gauge("startup.import_ms", round((time.perf_counter() - IMPORT_STARTED) * 1000, 1))
+
+def ms_since_process_start() -> float:
+    return round((time.time() - psutil.Process(os.getpid()).create_time()) * 1000, 1)
+
+def record_time_to_ready(router: RouterAgent):
+    if router.ready:
+        elapsed = ms_since_process_start()
+        metrics.set_gauge("startup.time_to_ready_ms", elapsed)
+        print(f"NEXUS Backend ready ({elapsed:.0f} ms after process start)")
+    else:
+        print(f"NEXUS Backend warm-up {router.warmup_status}: semantic retrieval is unavailable")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -21,11 +46,39 @@ async def lifespan(app: FastAPI):
     
     # Startup
     await db.connect_db()
-    app.state.router = RouterAgent(db.db)
-    await app.state.router.initialize_bots()
+    app.state.llm = GroqClient()
+    await app.state.llm.start()
+    app.state.router = RouterAgent(db.db, app.state.llm)
+    app.state.warmup = None
+    if Config.STARTUP_BACKGROUND_WARMUP:
+        # Serve /health (and degraded answers) while the model and index load; /ready reports when they have
+        app.state.warmup = asyncio.create_task(app.state.router.initialize_bots())
+
+        def _on_warmup_done(task: asyncio.Task):
+            if not task.cancelled() and task.exception() is not None:
+                print(f"Warm-up failed: {task.exception()}")
+            if not task.cancelled():
+                record_time_to_ready(app.state.router)
+
+        app.state.warmup.add_done_callback(_on_warmup_done)
+    else:
+        await app.state.router.initialize_bots()
+        record_time_to_ready(app.state.router)
+    job_store = MongoJobStore(db.db) if Config.JOB_STORE == "mongo" else InMemoryJobStore()
+    await job_store.ensure_indexes()
+    app.state.jobs = JobManager(app.state.router.run_question_paper_job, job_store)
+    app.state.jobs.start()
+    metrics.set_gauge("startup.time_to_serving_ms", ms_since_process_start())
     print("NEXUS Backend started successfully!")
     yield
     # Shutdown
+    if app.state.warmup is not None and not app.state.warmup.done():
+        app.state.warmup.cancel()
+        await asyncio.gather(app.state.warmup, return_exceptions=True)
+    await app.state.jobs.stop()
+    await app.state.router.shutdown()
+    await app.state.llm.close()
+    ocr_scheduler.shutdown()
     await db.close_db()
     # Cleanup temp directory on shutdown
     if os.path.exists("temp"):
@@ -39,6 +92,9 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Added first so it runs inside CORSMiddleware and its 413s still carry CORS headers
+app.add_middleware(UploadLimitMiddleware, paths=("/route", "/jobs"))
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -54,31 +110,132 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+async def ndjson_stream(deltas):
+    """Encode text deltas as newline-delimited JSON events, ending with a 'done' event."""
+    try:
+        async for delta in deltas:
+            yield json.dumps({"type": "delta", "text": delta}) + "\n"
+    except Exception as e:
+        print(f"Error while streaming response: {e}")
+        yield json.dumps({"type": "error", "text": "The response was interrupted. Please try again."}) + "\n"
+    yield json.dumps({"type": "done"}) + "\n"
+
+async def single_delta(text: str):
+    yield text
+
+def ndjson_response(deltas) -> StreamingResponse:
+    return StreamingResponse(
+        ndjson_stream(deltas),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def build_result_response(result: dict) -> Response:
+    """Encode a bot result as multipart (text + PDF), a PDF download or JSON."""
+    text = result.get("text", "")
+    pdf_file = result.get("pdf_file", None)
+
+    if text and pdf_file:
+        # Multipart response for both text and PDF
+        if isinstance(text, list):
+            text_str = "\n".join(text)
+        else:
+            text_str = str(text)
+
+        try:
+            pdf_file.seek(0)
+            pdf_bytes = pdf_file.read()
+        except Exception as e:
+            print(f"Error reading PDF file: {e}")
+            # Fall back to text-only response
+            return JSONResponse({"text": text_str})
+
+        boundary = "----Boundary"
+
+        parts = [
+            f'--{boundary}\r\nContent-Type: application/json\r\n\r\n{json.dumps({"text": text_str})}\r\n'.encode('utf-8'),
+            f'--{boundary}\r\nContent-Type: application/pdf\r\nContent-Disposition: attachment; filename=result.pdf\r\n\r\n'.encode('utf-8') + pdf_bytes,
+            f'\r\n--{boundary}--\r\n'.encode('utf-8')
+        ]
+        body = b''.join(parts)
+        return Response(content=body, media_type=f'multipart/mixed; boundary={boundary}')
+
+    if pdf_file:
+        try:
+            pdf_file.seek(0)
+            return StreamingResponse(pdf_file, media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=result.pdf"})
+        except Exception as e:
+            print(f"Error streaming PDF: {e}")
+            return JSONResponse({"text": "Error generating PDF. Please try again."}, status_code=500)
+
+    return JSONResponse({"text": text}, status_code=result.get("status_code", 200))
+
+def set_session_cookies(resp: Response, user_id: str, convo_id: str):
+    # Set cookies - use secure=False for local development (DEBUG mode)
+    cookie_secure = not Config.DEBUG
+    cookie_samesite = "None" if cookie_secure else "Lax"
+    resp.set_cookie(key="user_id", value=user_id, max_age=86400, samesite=cookie_samesite, secure=cookie_secure, path="/")
+    resp.set_cookie(key="convo_id", value=convo_id, max_age=86400, samesite=cookie_samesite, secure=cookie_secure, path="/")
+
+def job_view(job: dict) -> dict:
+    """Public status of a job (without the PDF bytes)."""
+    finished = job["status"] == "done"
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "progress": job["progress"],
+        "error": job["error"],
+        "text": job["result_text"] if finished else None,
+        "has_pdf": finished and job["pdf"] is not None,
+        "result_url": f"/jobs/{job['id']}/result" if job["status"] in ("done", "failed") else None,
+        "created_at": job["created_at"].isoformat(),
+        "updated_at": job["updated_at"].isoformat()
+    }
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
     return {"status": "healthy", "service": "NEXUS API"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 once the embedding model and index are loaded, 503 until then."""
+    router = app.state.router
+    body = {
+        "status": "ready" if router.ready else router.warmup_status,
+        "retrieval": router.query_bot.ready,
+        "intent_classifier": router.intent_classifier.ready,
+        "warmup_attempts": router.warmup_attempts
+    }
+    if router.warmup_error is not None:
+        body["error"] = router.warmup_error
+    return JSONResponse(body, status_code=200 if router.ready else 503)
+
+@app.get("/metrics")
+async def get_metrics():
+    """Runtime counters, latency summaries and memory of the worker that served the request."""
+    record_memory_gauges()
+    return {**metrics.snapshot(), "pid": os.getpid()}
+
 @app.post("/route")
 async def route_query(
     request: Request,
     prompt: str = Form(...),
-    file: UploadFile = File(None)
+    file: UploadFile = File(None),
+    stream: bool = Form(False)
 ):
     """Main endpoint for routing user queries to appropriate bots."""
     # Get user_id and convo_id from cookies or generate new
     user_id = request.cookies.get("user_id", str(uuid.uuid4()))
     convo_id = request.cookies.get("convo_id", str(uuid.uuid4()))
 
-    file_path = None
+    pdf_source = None
     if file and file.filename:
-        os.makedirs("temp", exist_ok=True)
-        # Use unique filename to avoid collisions
-        unique_filename = f"{uuid.uuid4()}_{file.filename}"
-        file_path = os.path.join("temp", unique_filename)
         try:
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+            pdf_source = await read_upload(file)
+        except UploadTooLargeError as e:
+            return JSONResponse({"text": str(e)}, status_code=413)
         except Exception as e:
             print(f"Error saving file: {e}")
             return JSONResponse(
@@ -87,58 +244,23 @@ async def route_query(
             )
 
     try:
-        result = await app.state.router.route(prompt, user_id, convo_id, file_path)
+        result = await app.state.router.route(prompt, user_id, convo_id, pdf_source, stream=stream)
         
         # Handle None result
         if result is None:
             result = {"text": "I'm having trouble processing your request. Please try again.", "pdf_file": None}
         
-        text = result.get("text", "")
-        pdf_file = result.get("pdf_file", None)
-
-        resp = None
-        if text and pdf_file:
-            # Multipart response for both text and PDF
-            if isinstance(text, list):
-                text_str = "\n".join(text)
-            else:
-                text_str = str(text)
-
-            try:
-                pdf_file.seek(0)
-                pdf_bytes = pdf_file.read()
-            except Exception as e:
-                print(f"Error reading PDF file: {e}")
-                # Fall back to text-only response
-                return JSONResponse({"text": text_str})
-            
-            boundary = "----Boundary"
-            
-            parts = [
-                f'--{boundary}\r\nContent-Type: application/json\r\n\r\n{json.dumps({"text": text_str})}\r\n'.encode('utf-8'),
-                f'--{boundary}\r\nContent-Type: application/pdf\r\nContent-Disposition: attachment; filename=result.pdf\r\n\r\n'.encode('utf-8') + pdf_bytes,
-                f'\r\n--{boundary}--\r\n'.encode('utf-8')
-            ]
-            body = b''.join(parts)
-            resp = Response(content=body, media_type=f'multipart/mixed; boundary={boundary}')
-        
-        elif pdf_file:
-            try:
-                pdf_file.seek(0)
-                resp = StreamingResponse(pdf_file, media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=result.pdf"})
-            except Exception as e:
-                print(f"Error streaming PDF: {e}")
-                return JSONResponse({"text": "Error generating PDF. Please try again."}, status_code=500)
-        
+        if result.get("stream") is not None:
+            resp = ndjson_response(result["stream"])
+        elif stream and not result.get("pdf_file") and result.get("status_code", 200) == 200:
+            # Canned and templated replies (course lookups, warm-up, fallbacks) keep the
+            # stream format: the whole text as one delta, then done
+            text = result.get("text", "")
+            resp = ndjson_response(single_delta("\n".join(text) if isinstance(text, list) else str(text)))
         else:
-            resp = JSONResponse({"text": text})
+            resp = build_result_response(result)
 
-        # Set cookies - use secure=False for local development (DEBUG mode)
-        cookie_secure = not Config.DEBUG
-        cookie_samesite = "None" if cookie_secure else "Lax"
-        resp.set_cookie(key="user_id", value=user_id, max_age=86400, samesite=cookie_samesite, secure=cookie_secure, path="/")
-        resp.set_cookie(key="convo_id", value=convo_id, max_age=86400, samesite=cookie_samesite, secure=cookie_secure, path="/")
-        
+        set_session_cookies(resp, user_id, convo_id)
         return resp
 
     except Exception as e:
@@ -149,11 +271,91 @@ async def route_query(
         )
     finally:
         # Clean up uploaded file after processing
-        if file_path and os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except Exception as e:
-                print(f"Error cleaning up file {file_path}: {e}")
+        await discard_upload(pdf_source)
+
+@app.post("/jobs", status_code=202)
+async def create_job(
+    request: Request,
+    prompt: str = Form(...),
+    file: UploadFile = File(...),
+    action: str = Form(None)
+):
+    """Queue a question paper for solving ("answer") or regeneration ("generate").
+
+    Returns immediately with a job id; poll GET /jobs/{id} or follow
+    GET /jobs/{id}/events, then fetch GET /jobs/{id}/result.
+    """
+    user_id = request.cookies.get("user_id", str(uuid.uuid4()))
+    convo_id = request.cookies.get("convo_id", str(uuid.uuid4()))
+
+    if action is not None and action not in ("answer", "generate"):
+        return JSONResponse({"text": 'action must be "answer" or "generate".'}, status_code=400)
+    if not file.filename:
+        return JSONResponse({"text": "Please upload a question paper PDF."}, status_code=400)
+
+    try:
+        pdf_source = await read_upload(file)
+    except UploadTooLargeError as e:
+        return JSONResponse({"text": str(e)}, status_code=413)
+    except Exception as e:
+        print(f"Error saving file: {e}")
+        return JSONResponse({"text": "Error uploading file. Please try again."}, status_code=400)
+
+    try:
+        job = await app.state.jobs.submit(
+            pdf_source, prompt=prompt, action=action,
+            user_id=user_id, conversation_id=convo_id
+        )
+    except JobQueueFullError as e:
+        await discard_upload(pdf_source)
+        return JSONResponse({"text": str(e)}, status_code=503)
+
+    resp = JSONResponse({
+        **job_view(job),
+        "status_url": f"/jobs/{job['id']}",
+        "events_url": f"/jobs/{job['id']}/events"
+    }, status_code=202)
+    set_session_cookies(resp, user_id, convo_id)
+    return resp
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status and progress of a question-paper job."""
+    job = await app.state.jobs.get(job_id)
+    if job is None:
+        return JSONResponse({"text": "Job not found or expired."}, status_code=404)
+    return job_view(job)
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-sent events with the job's status on every stage/progress change."""
+    if await app.state.jobs.get(job_id) is None:
+        return JSONResponse({"text": "Job not found or expired."}, status_code=404)
+
+    async def events():
+        async for job in app.state.jobs.watch(job_id):
+            yield f"event: {job['status']}\ndata: {json.dumps(job_view(job))}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    """The finished job's answer, encoded like a /route response."""
+    job = await app.state.jobs.get(job_id)
+    if job is None:
+        return JSONResponse({"text": "Job not found or expired."}, status_code=404)
+    if job["status"] == "failed":
+        return JSONResponse({"text": job["error"]}, status_code=500)
+    if job["status"] != "done":
+        return JSONResponse(job_view(job), status_code=409)
+    return build_result_response({
+        "text": job["result_text"],
+        "pdf_file": io.BytesIO(job["pdf"]) if job["pdf"] is not None else None
+    })
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,147 @@
+import json
+import re
+import time
+from core.config import Config
+from utils.chunk_store import COURSE_CODE_PATTERN, normalize_course_code
+from utils.metrics import metrics
+
+QUERY_CODE_PATTERN = re.compile(r"\b([A-Z]{2,3}\s?\d{3}[A-Z]?)\b")
+
+# Field name -> (how students ask for it, which curriculum keys hold it)
+FIELDS = {
+    "credits": (
+        re.compile(r"\bcredits?\b|\bl-?t-?p\b", re.IGNORECASE),
+        re.compile(r"credit|l-?t-?p", re.IGNORECASE)
+    ),
+    "textbooks": (
+        re.compile(r"\btext ?books?\b|(?<!reference )\bbooks?\b|\breading material\b", re.IGNORECASE),
+        re.compile(r"text ?books?", re.IGNORECASE)
+    ),
+    "references": (
+        re.compile(r"\breferences?\b|\breference books?\b", re.IGNORECASE),
+        re.compile(r"reference", re.IGNORECASE)
+    ),
+    "syllabus": (
+        re.compile(r"\bsyllabus\b|\bcourse contents?\b|\btopics\b", re.IGNORECASE),
+        re.compile(r"syllabus|contents?$|topics", re.IGNORECASE)
+    ),
+    "prerequisites": (
+        re.compile(r"\bpre-?requisites?\b|\bpre-?reqs?\b", re.IGNORECASE),
+        re.compile(r"pre-?requisite", re.IGNORECASE)
+    ),
+    "title": (
+        re.compile(r"\b(?:course )?(?:title|full name)\b|\bname of\b", re.IGNORECASE),
+        re.compile(r"title", re.IGNORECASE)
+    ),
+}
+
+# Questions that need reasoning over the record rather than restating one field
+REASONING_PATTERN = re.compile(
+    r"\b(?:why|explain|compare|comparison|difference|vs|versus|should|better|easier|harder|"
+    r"prepare|study|plan|summari[sz]e|important|how (?:to|do|does|should|can|is|are))\b",
+    re.IGNORECASE
+)
+MAX_QUERY_WORDS = 12
+
+
+class CourseFieldLookup:
+    """Answers single-field course lookups ("credits of CS103") from the curriculum documents.
+
+    Holds the structured course documents by course code and renders the
+    requested field from a template, with no retrieval or LLM call. A query
+    is only answered here when it names exactly one course code that maps to
+    exactly one document, asks for exactly one known field that the document
+    has, and does not ask for reasoning; everything else returns None and
+    takes the LLM path. Documents are swapped as whole snapshots, so updates
+    never expose a half-applied state.
+    """
+
+    def __init__(self, enabled: bool = Config.COURSE_FAST_PATH_ENABLED):
+        self.enabled = enabled
+        self.courses: dict[str, dict] = {}
+        self.code_index: dict[str, list[str]] = {}
+
+    def load(self, raw_courses: list[dict]):
+        self._swap({str(course.get("_id")): course for course in raw_courses})
+
+    def apply_changes(self, upserted: list[dict], removed_doc_ids: list[str]):
+        courses = dict(self.courses)
+        for doc_id in removed_doc_ids:
+            courses.pop(doc_id, None)
+        for course in upserted:
+            courses[str(course.get("_id"))] = course
+        self._swap(courses)
+
+    def _swap(self, courses: dict[str, dict]):
+        code_index: dict[str, list[str]] = {}
+        for doc_id, course in courses.items():
+            normalized = normalize_course_code(str(course.get("Course Code", "")))
+            # A course field may list several codes ("EE101/EE102"); index each one
+            for code in {normalized, *COURSE_CODE_PATTERN.findall(normalized)} - {""}:
+                code_index.setdefault(code, []).append(doc_id)
+        self.courses, self.code_index = courses, code_index
+
+    def answer(self, query: str) -> str | None:
+        """Templated answer for a single-field lookup, or None when the LLM should answer."""
+        if not self.enabled:
+            return None
+        started = time.perf_counter()
+        text = self._answer(query)
+        if text is None:
+            metrics.incr("course_lookup.fallbacks")
+        else:
+            metrics.incr("course_lookup.hits")
+            metrics.observe("course_lookup.render_ms", (time.perf_counter() - started) * 1000)
+        return text
+
+    def _answer(self, query: str) -> str | None:
+        if len(query.split()) > MAX_QUERY_WORDS or REASONING_PATTERN.search(query):
+            return None
+        codes = {code.replace(" ", "") for code in QUERY_CODE_PATTERN.findall(query.upper())}
+        fields = [field for field, (asked, _) in FIELDS.items() if asked.search(query)]
+        if len(codes) != 1 or len(fields) != 1:
+            return None
+
+        code = codes.pop()
+        courses, code_index = self.courses, self.code_index
+        doc_ids = code_index.get(code, [])
+        if len(doc_ids) != 1:
+            return None
+        course = courses[doc_ids[0]]
+
+        _, stored_as = FIELDS[fields[0]]
+        values = [
+            (key, value) for key, value in course.items()
+            if key != "_id" and stored_as.search(key) and _has_content(value)
+        ]
+        if not values:
+            return None
+        return render_fields(code, course.get("Course Title", course.get("Title", "")), values)
+
+
+def _has_content(value) -> bool:
+    if isinstance(value, str):
+        return bool(value.strip())
+    return value is not None and value != [] and value != {}
+
+
+def _render_value(value) -> list[str]:
+    if isinstance(value, list):
+        return [f"- {item if isinstance(item, str) else json.dumps(item)}" for item in value]
+    if isinstance(value, dict):
+        return [f"- **{k}:** {v if isinstance(v, str) else json.dumps(v)}" for k, v in value.items()]
+    text = str(value).strip()
+    return [text] if "\n" not in text else text.splitlines()
+
+
+def render_fields(code: str, title: str, values: list[tuple[str, object]]) -> str:
+    """Markdown answer listing each (curriculum key, value) of a course."""
+    heading = f"{code} - {title}" if title else code
+    sections = []
+    for key, value in values:
+        lines = _render_value(value)
+        if len(lines) == 1 and not lines[0].startswith("- "):
+            sections.append(f"**{key}** for {heading}: {lines[0]}")
+        else:
+            sections.append(f"**{key}** for {heading}:\n" + "\n".join(lines))
+    return "\n\n".join(sections)
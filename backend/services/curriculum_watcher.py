@@ -0,0 +1,140 @@
+import asyncio
+from pymongo.errors import OperationFailure
+from core.config import Config
+from utils.index_store import doc_hash
+
+class CurriculumWatcher:
+    """Keeps QueryBot's index in sync with the curriculum collection.
+
+    Uses a MongoDB change stream when the deployment supports it (replica set
+    or Atlas) and falls back to polling otherwise. Polling compares `updatedAt`
+    stamps when documents carry them and per-document content hashes when they
+    don't, so only changed courses are re-chunked and re-embedded.
+
+    With several workers sharing INDEX_CACHE_DIR, only the one holding the
+    leader lock watches the collection, applies changes and saves the new
+    version. The others poll for the version it publishes and map it from
+    disk, and take over the lead if the leader exits.
+    """
+
+    def __init__(self, db, query_bot,
+                 collection_name: str = "First_Year_Curriculum",
+                 poll_interval: float = Config.CURRICULUM_POLL_INTERVAL,
+                 use_change_stream: bool = True,
+                 follow_interval: float = Config.CURRICULUM_FOLLOW_INTERVAL):
+        self.collection = db[collection_name]
+        self.query_bot = query_bot
+        self.poll_interval = poll_interval
+        self.use_change_stream = use_change_stream
+        self.follow_interval = follow_interval
+        self.leader = False
+        # doc_id -> last seen updatedAt, for cheap polling
+        self._stamps: dict[str, object] = {}
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.leader:
+            self.query_bot.index_store.release_leadership()
+            self.leader = False
+
+    async def _run(self):
+        followed = False
+        while not self.query_bot.index_store.try_lead():
+            followed = True
+            try:
+                await self.follow_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Curriculum follow error: {e}")
+            await asyncio.sleep(self.follow_interval)
+        self.leader = True
+        print("This worker applies curriculum updates for all workers")
+        if followed:
+            # Catch up on changes made after the previous leader's last version
+            try:
+                await self.poll_once()
+            except Exception as e:
+                print(f"Curriculum poll error: {e}")
+        if self.use_change_stream:
+            try:
+                await self._watch_change_stream()
+                return
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                print(f"Curriculum change stream unavailable ({e}); falling back to polling")
+            except Exception as e:
+                print(f"Curriculum change stream error: {e}; falling back to polling")
+        await self._poll_forever()
+
+    async def _watch_change_stream(self):
+        async with self.collection.watch(full_document="updateLookup") as stream:
+            print("Watching curriculum collection via change stream")
+            async for change in stream:
+                operation = change.get("operationType")
+                if operation in ("insert", "update", "replace") and change.get("fullDocument"):
+                    await self.query_bot.apply_course_changes([change["fullDocument"]], [])
+                elif operation == "delete":
+                    await self.query_bot.apply_course_changes([], [str(change["documentKey"]["_id"])])
+                elif operation in ("drop", "rename", "dropDatabase", "invalidate"):
+                    await self.poll_once()
+
+    async def _poll_forever(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Curriculum poll error: {e}")
+
+    async def follow_once(self) -> bool:
+        """Reload the version the leader last published, if it is newer than ours."""
+        version = self.query_bot.index_store.current()
+        if version is None or version == self.query_bot.index_version:
+            return False
+        raw_courses = await self.collection.find({}).to_list(length=None)
+        return await self.query_bot.reload_index(version, raw_courses)
+
+    async def poll_once(self):
+        """Diff the collection against the indexed state and apply the changes."""
+        stamps = await self.collection.find({}, projection={"updatedAt": 1}).to_list(length=None)
+        current_ids = {str(doc["_id"]) for doc in stamps}
+        known_hashes = self.query_bot.doc_hashes
+
+        to_fetch = [
+            doc["_id"] for doc in stamps
+            if "updatedAt" not in doc
+            or str(doc["_id"]) not in known_hashes
+            or self._stamps.get(str(doc["_id"])) != doc["updatedAt"]
+        ]
+        upserted = []
+        if to_fetch:
+            fetched = await self.collection.find({"_id": {"$in": to_fetch}}).to_list(length=None)
+            for course in fetched:
+                doc_id = str(course["_id"])
+                if "updatedAt" in course:
+                    self._stamps[doc_id] = course["updatedAt"]
+                if known_hashes.get(doc_id) != doc_hash(course):
+                    upserted.append(course)
+
+        removed = [doc_id for doc_id in known_hashes if doc_id not in current_ids]
+        for doc_id in removed:
+            self._stamps.pop(doc_id, None)
+
+        if upserted or removed:
+            await self.query_bot.apply_course_changes(upserted, removed)
+        return upserted, removed
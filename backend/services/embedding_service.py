@@ -0,0 +1,120 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from core.config import Config
+from utils.metrics import metrics
+
+
+class EmbeddingServiceStopped(RuntimeError):
+    """The service was stopped before this text was encoded."""
+
+
+class EmbeddingService:
+    """Micro-batching front end for SentenceTransformer.encode.
+
+    Concurrent `encode` calls are queued (bounded, so callers back off under
+    overload) and coalesced into one batch of up to `max_batch_size` texts,
+    waiting at most `max_wait_ms` for the batch to fill. Encoding runs on a
+    dedicated worker thread so the event loop is never blocked. Stopping
+    fails every queued and in-flight request with EmbeddingServiceStopped
+    rather than leaving its caller waiting.
+    """
+
+    def __init__(self, model,
+                 max_batch_size: int = Config.EMBEDDING_MAX_BATCH_SIZE,
+                 max_wait_ms: float = Config.EMBEDDING_MAX_WAIT_MS,
+                 max_queue_size: int = Config.EMBEDDING_MAX_QUEUE_SIZE):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_size = max_queue_size
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._batch: list = []
+        self._stopped = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+
+    def start(self):
+        if self._worker is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._stopped = True
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._fail_pending()
+        self._executor.shutdown(wait=False)
+
+    def _fail_pending(self):
+        pending = self._batch
+        self._batch = []
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for _, future, _ in pending:
+            if not future.done():
+                future.set_exception(EmbeddingServiceStopped("Embedding service stopped"))
+        metrics.set_gauge("embedding.queue_depth", 0)
+
+    async def encode(self, text: str) -> np.ndarray:
+        """Embed one text; resolves once its batch has been encoded."""
+        if self._stopped:
+            raise EmbeddingServiceStopped("Embedding service stopped")
+        if self._worker is None:
+            self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future, time.perf_counter()))
+        if self._stopped:
+            # stop() drained the queue while this caller was waiting for room
+            self._fail_pending()
+        metrics.set_gauge("embedding.queue_depth", self._queue.qsize())
+        return await future
+
+    async def _next_batch(self) -> list:
+        # Kept on the instance so stop() can fail a batch that is still filling
+        self._batch = batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            started = time.perf_counter()
+            metrics.set_gauge("embedding.queue_depth", self._queue.qsize())
+            metrics.incr("embedding.batches")
+            metrics.observe("embedding.batch_size", len(batch))
+            for _, _, enqueued_at in batch:
+                metrics.observe("embedding.queue_delay_ms", (started - enqueued_at) * 1000)
+
+            texts = [text for text, _, _ in batch]
+            try:
+                vectors = await loop.run_in_executor(
+                    self._executor,
+                    lambda: np.asarray(self.model.encode(texts, batch_size=len(texts)), dtype=np.float32)
+                )
+            except Exception as e:
+                print(f"Embedding batch error: {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            metrics.observe("embedding.encode_ms", (time.perf_counter() - started) * 1000)
+            for (_, future, _), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
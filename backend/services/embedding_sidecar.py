@@ -0,0 +1,199 @@
+"""Shared embedding model for multi-worker deployments.
+
+Every uvicorn worker would otherwise load its own SentenceTransformer. With
+EMBEDDING_SIDECAR_SOCKET set, one sidecar process holds the model and the
+workers encode through it over a Unix socket:
+
+    python -m services.embedding_sidecar
+    EMBEDDING_SIDECAR_SOCKET=/tmp/nexus-embedding.sock uvicorn main:app --workers 4
+
+Frames are a 4-byte big-endian length followed by a JSON body. An encode
+reply is a JSON header with the matrix shape followed by the raw float32
+vectors.
+"""
+import asyncio
+import json
+import os
+import socket
+import struct
+import threading
+import time
+import numpy as np
+from core.config import Config
+from services.embedding_service import EmbeddingService
+from utils.memory import print_memory_usage
+
+FRAME_HEADER = struct.Struct(">I")
+# Corpus encodes are split into requests of this many texts
+MAX_TEXTS_PER_REQUEST = 256
+
+
+def _pack(body: dict) -> bytes:
+    data = json.dumps(body).encode("utf-8")
+    return FRAME_HEADER.pack(len(data)) + data
+
+
+class EmbeddingSidecar:
+    """Serves one SentenceTransformer to every worker on the host.
+
+    Single-text requests (query embeddings) go through the micro-batching
+    EmbeddingService, so concurrent queries from different workers share a
+    batch; multi-text requests (corpus and curriculum updates) are encoded
+    directly in a worker thread.
+    """
+
+    def __init__(self, socket_path: str = Config.EMBEDDING_SIDECAR_SOCKET,
+                 model_name: str = Config.SENTENCE_TRANSFORMER_MODEL):
+        self.socket_path = socket_path
+        self.model_name = model_name
+        self.model = None
+        self.dim = None
+        self.batcher: EmbeddingService | None = None
+
+    async def serve(self):
+        # Only the sidecar process needs torch; workers import this module for the client
+        from sentence_transformers import SentenceTransformer
+        self.model = await asyncio.to_thread(SentenceTransformer, self.model_name)
+        self.dim = int(self.model.get_sentence_embedding_dimension())
+        self.batcher = EmbeddingService(self.model)
+        self.batcher.start()
+        # A previous sidecar that was killed leaves its socket file behind
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        os.chmod(self.socket_path, 0o660)
+        print_memory_usage("embedding sidecar ready")
+        print(f"Embedding sidecar serving {self.model_name} on {self.socket_path}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.batcher.stop()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    (length,) = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+                    request = json.loads(await reader.readexactly(length))
+                except asyncio.IncompleteReadError:
+                    return
+                try:
+                    if request.get("op") == "info":
+                        writer.write(_pack({"model": self.model_name, "dim": self.dim}))
+                    else:
+                        vectors = await self._encode(request["texts"], request.get("normalize", False))
+                        writer.write(_pack({"shape": list(vectors.shape)}) + vectors.tobytes())
+                except Exception as e:
+                    writer.write(_pack({"error": str(e)}))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _encode(self, texts: list[str], normalize: bool) -> np.ndarray:
+        if len(texts) == 1 and not normalize:
+            return (await self.batcher.encode(texts[0])).reshape(1, -1)
+        vectors = await asyncio.to_thread(
+            self.model.encode, texts, batch_size=Config.EMBEDDING_MAX_BATCH_SIZE,
+            normalize_embeddings=normalize
+        )
+        return np.asarray(vectors, dtype=np.float32).reshape(len(texts), self.dim)
+
+
+class RemoteEmbeddingModel:
+    """SentenceTransformer stand-in that encodes through the embedding sidecar.
+
+    Blocking like `SentenceTransformer.encode`, so it drops into the
+    EmbeddingService executor and `asyncio.to_thread` call sites unchanged.
+    Each thread keeps its own connection; a broken connection is reopened
+    once per request.
+    """
+
+    def __init__(self, socket_path: str = Config.EMBEDDING_SIDECAR_SOCKET,
+                 timeout: float = Config.EMBEDDING_SIDECAR_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def wait_until_ready(self, timeout: float = Config.EMBEDDING_SIDECAR_CONNECT_TIMEOUT) -> dict:
+        """Block until the sidecar answers (it may still be loading the model); returns its info."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return self.info()
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.5)
+
+    def info(self) -> dict:
+        return self._call({"op": "info"})[0]
+
+    def encode(self, sentences, batch_size: int | None = None, show_progress_bar: bool = False,
+               normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        parts = []
+        for start in range(0, len(texts), MAX_TEXTS_PER_REQUEST):
+            header, payload = self._call({
+                "op": "encode",
+                "texts": texts[start:start + MAX_TEXTS_PER_REQUEST],
+                "normalize": normalize_embeddings
+            })
+            parts.append(np.frombuffer(payload, dtype=np.float32).reshape(header["shape"]))
+        vectors = np.vstack(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+        return vectors[0] if single else vectors
+
+    def _call(self, request: dict) -> tuple[dict, bytes]:
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                sock.sendall(_pack(request))
+                header = json.loads(self._recv(sock, FRAME_HEADER.unpack(self._recv(sock, FRAME_HEADER.size))[0]))
+                if "error" in header:
+                    raise RuntimeError(f"Embedding sidecar error: {header['error']}")
+                payload = b""
+                if "shape" in header:
+                    payload = self._recv(sock, int(np.prod(header["shape"])) * 4)
+                return header, payload
+            except OSError:
+                self._disconnect()
+                if attempt:
+                    raise
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+        return sock
+
+    def _disconnect(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    @staticmethod
+    def _recv(sock: socket.socket, size: int) -> bytes:
+        buf = bytearray()
+        while len(buf) < size:
+            chunk = sock.recv(min(size - len(buf), 1 << 20))
+            if not chunk:
+                raise ConnectionError("Embedding sidecar closed the connection")
+            buf.extend(chunk)
+        return bytes(buf)
+
+
+if __name__ == "__main__":
+    asyncio.run(EmbeddingSidecar().serve())
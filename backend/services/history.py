@@ -1,33 +1,213 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
 from datetime import datetime, timezone
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError
+from core.config import Config
+from utils.metrics import metrics
+
+DUPLICATE_KEY_ERROR = 11000
 
 class ChatHistoryManager:
-    def __init__(self, db):
+    """Chat history with a recent-message cache and write-behind persistence.
+
+    The last `cache_messages` messages of up to `cache_conversations`
+    conversations are kept in an LRU cache that every save writes through.
+    Other workers save to the same conversations, so a cached entry older than
+    `cache_revalidate` seconds is checked against the newest stored message (one
+    indexed lookup of its `_id`) and reloaded when that message is missing
+    from the cache. Saved messages are buffered and written with `insert_many` once
+    `flush_batch` are pending or every `flush_interval` seconds, and on close.
+    Messages get their `_id` on save, so reads can merge the database with
+    writes that have not landed yet.
+    """
+
+    def __init__(self, db,
+                 cache_conversations: int = Config.HISTORY_CACHE_CONVERSATIONS,
+                 cache_messages: int = Config.HISTORY_CACHE_MESSAGES,
+                 flush_batch: int = Config.HISTORY_FLUSH_BATCH,
+                 flush_interval: float = Config.HISTORY_FLUSH_INTERVAL,
+                 max_pending: int = Config.HISTORY_MAX_PENDING,
+                 ttl_days: float = Config.HISTORY_TTL_DAYS,
+                 cache_revalidate: float = Config.HISTORY_CACHE_REVALIDATE_SECONDS):
         self.db = db
         self.collection = self.db["chat_history"]
+        self.cache_conversations = cache_conversations
+        self.cache_messages = cache_messages
+        self.flush_batch = flush_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.ttl_days = ttl_days
+        self.cache_revalidate = cache_revalidate
+        # (user_id, conversation_id) -> deque of the newest messages, oldest first
+        self._recent: OrderedDict[tuple, deque] = OrderedDict()
+        # (user_id, conversation_id) -> when the cached messages were last known to be current
+        self._checked_at: dict[tuple, float] = {}
+        self._pending: list[dict] = []
+        self._in_flight: list[dict] = []
+        self._flush_lock = asyncio.Lock()
+        self._flush_requested = asyncio.Event()
+        self._flusher: asyncio.Task | None = None
+
+    async def start(self):
+        """Create indexes and start the periodic flusher."""
+        await self.ensure_indexes()
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def close(self):
+        """Stop the flusher and write everything still buffered."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+        if self._pending:
+            print(f"Chat history: {len(self._pending)} message(s) could not be saved on shutdown")
 
-    async def save_message(self, user_id: str, conversation_id: str, role: str, message_content: str):
+    async def ensure_indexes(self):
+        try:
+            await self.collection.create_index(
+                [("user_id", ASCENDING), ("conversation_id", ASCENDING), ("timestamp", DESCENDING)]
+            )
+            if self.ttl_days > 0:
+                await self.collection.create_index(
+                    "timestamp", expireAfterSeconds=int(self.ttl_days * 86400)
+                )
+        except Exception as e:
+            print(f"Chat history index creation failed: {e}")
+
+    async def save_message(self, user_id: str, conversation_id: str, role: str, message_content: str,
+                           timestamp: datetime | None = None):
         message = {
+            "_id": ObjectId(),
             "user_id": user_id,
             "conversation_id": conversation_id,
             "role": role,
             "content": message_content,
-            "timestamp": datetime.now(timezone.utc)
+            "timestamp": timestamp or datetime.now(timezone.utc)
         }
-        try:
-            await self.collection.insert_one(message)
-        except Exception as e:
-            print(f"Database save error: {str(e)}")
-            raise
+        recent = self._recent.get((user_id, conversation_id))
+        if recent is not None:
+            recent.append(message)
+            self._recent.move_to_end((user_id, conversation_id))
+
+        self._pending.append(message)
+        if len(self._pending) > self.max_pending:
+            # The database has been unreachable for a while; keep memory bounded
+            dropped = len(self._pending) - self.max_pending
+            del self._pending[:dropped]
+            metrics.incr("history.dropped", dropped)
+            print(f"Chat history buffer full: dropped {dropped} unsaved message(s)")
+        metrics.set_gauge("history.pending", len(self._pending))
+        if len(self._pending) >= self.flush_batch:
+            self._flush_requested.set()
+
+    async def load_history(self, user_id: str, conversation_id: str, limit: int = 10,
+                           before: datetime | None = None, include_timestamps: bool = False) -> list[dict]:
+        """Load the last `limit` messages, optionally only those older than `before`."""
+        key = (user_id, conversation_id)
+        recent = self._recent.get(key)
+        if recent is None or limit > self.cache_messages or not await self._is_current(key, recent):
+            metrics.incr("history.cache_misses")
+            try:
+                recent = await self._load_recent(user_id, conversation_id, max(limit, self.cache_messages))
+            except Exception as e:
+                print(f"Error loading history: {e}")
+                return []
+            if limit <= self.cache_messages:
+                recent = self._remember(key, recent)
+        else:
+            metrics.incr("history.cache_hits")
+            self._recent.move_to_end(key)
 
-    async def load_history(self, user_id: str, conversation_id: str, limit: int = 10) -> list[dict]:
+        messages = [m for m in recent if before is None or m["timestamp"] < before]
+        fields = ("role", "content", "timestamp") if include_timestamps else ("role", "content")
+        return [{field: m[field] for field in fields} for m in messages[-limit:]]
+
+    async def _is_current(self, key: tuple, recent: deque) -> bool:
+        """Whether the cache holds the newest stored message, i.e. no other worker added one since."""
+        now = time.monotonic()
+        if now - self._checked_at.get(key, 0.0) < self.cache_revalidate:
+            return True
+        user_id, conversation_id = key
         try:
-            cursor = self.collection.find(
+            newest = await self.collection.find_one(
                 {"user_id": user_id, "conversation_id": conversation_id},
-                projection={"role": 1, "content": 1, "_id": 0}
-            ).sort("timestamp", -1).limit(limit)
-            
-            history = [doc async for doc in cursor]
-            return history[::-1]
+                projection={"_id": 1}, sort=[("timestamp", DESCENDING)]
+            )
         except Exception as e:
-            print(f"Error loading history: {e}")
-            return []
+            print(f"Error revalidating cached history: {e}")
+            return True
+        if newest is not None and all(m["_id"] != newest["_id"] for m in recent):
+            metrics.incr("history.cache_stale")
+            return False
+        self._checked_at[key] = now
+        return True
+
+    async def _load_recent(self, user_id: str, conversation_id: str, limit: int) -> list[dict]:
+        cursor = self.collection.find(
+            {"user_id": user_id, "conversation_id": conversation_id},
+            projection={"role": 1, "content": 1, "timestamp": 1}
+        ).sort("timestamp", -1).limit(limit)
+        stored = [doc async for doc in cursor]
+        for doc in stored:
+            # Mongo hands back naive UTC datetimes
+            if doc["timestamp"].tzinfo is None:
+                doc["timestamp"] = doc["timestamp"].replace(tzinfo=timezone.utc)
+
+        # Writes still buffered (or being flushed) are not in the query result yet
+        seen = {doc["_id"] for doc in stored}
+        unsaved = [
+            m for m in self._in_flight + self._pending
+            if m["user_id"] == user_id and m["conversation_id"] == conversation_id and m["_id"] not in seen
+        ]
+        messages = sorted(stored + unsaved, key=lambda m: m["timestamp"])
+        return messages[-limit:]
+
+    def _remember(self, key: tuple, messages: list[dict]) -> deque:
+        recent = deque(messages, maxlen=self.cache_messages)
+        if self.cache_conversations > 0:
+            self._recent[key] = recent
+            self._recent.move_to_end(key)
+            self._checked_at[key] = time.monotonic()
+            while len(self._recent) > self.cache_conversations:
+                evicted, _ = self._recent.popitem(last=False)
+                self._checked_at.pop(evicted, None)
+        return recent
+
+    async def flush(self):
+        """Write buffered messages with one insert_many; failed batches are retried later."""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, []
+            self._in_flight = batch
+            started = time.perf_counter()
+            try:
+                await self.collection.insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                # A retried batch may be partly stored already; only duplicate keys are harmless
+                errors = e.details.get("writeErrors", [])
+                if any(err.get("code") != DUPLICATE_KEY_ERROR for err in errors):
+                    print(f"Database save error: {e}")
+                    self._pending = batch + self._pending
+            except Exception as e:
+                print(f"Database save error: {str(e)}")
+                self._pending = batch + self._pending
+            finally:
+                self._in_flight = []
+            metrics.observe("history.flush_size", len(batch))
+            metrics.observe("history.flush_ms", (time.perf_counter() - started) * 1000)
+            metrics.set_gauge("history.pending", len(self._pending))
+
+    async def _flush_periodically(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
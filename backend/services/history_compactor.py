@@ -0,0 +1,153 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from pymongo import ASCENDING
+from core.config import Config
+from core.llm_client import GroqClient
+from utils.cache import TTLCache
+from utils.metrics import metrics
+from utils.tokens import MESSAGE_OVERHEAD_TOKENS, message_tokens, messages_tokens
+
+SUMMARY_PREFIX = "Summary of the earlier conversation with this student:\n"
+# Per-message cap when feeding old turns to the summarizer
+SUMMARY_INPUT_CHARS_PER_MESSAGE = 2000
+_MISSING = object()
+
+class HistoryCompactor:
+    """Fits chat history into a per-bot prompt-token budget.
+
+    The newest messages are kept verbatim while they fit; older ones are
+    replaced by a rolling summary of the conversation. Summaries are written
+    by the small model off the request path and stored in MongoDB, so a turn
+    never waits for one: it uses the latest stored summary (at worst a turn
+    behind) and schedules a refresh when that summary is stale.
+    """
+
+    def __init__(self, db, llm_client: GroqClient,
+                 model: str = Config.GROQ_MODEL,
+                 summary_max_tokens: int = Config.HISTORY_SUMMARY_MAX_TOKENS,
+                 enabled: bool = Config.HISTORY_COMPACTION_ENABLED):
+        self.collection = db["conversation_summaries"]
+        self.llm = llm_client
+        self.model = model
+        self.summary_max_tokens = summary_max_tokens
+        self.enabled = enabled
+        # (user_id, conversation_id) -> summary doc, or None when there is none yet
+        self._summaries = TTLCache(max_size=Config.HISTORY_CACHE_CONVERSATIONS, ttl=3600, name="summaries")
+        self._refreshing: set[tuple] = set()
+        self._tasks: set[asyncio.Task] = set()
+
+    async def ensure_indexes(self):
+        try:
+            await self.collection.create_index(
+                [("user_id", ASCENDING), ("conversation_id", ASCENDING)], unique=True
+            )
+        except Exception as e:
+            print(f"Summary index creation failed: {e}")
+
+    async def close(self):
+        """Wait for summaries that are still being written."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def fit(self, user_id: str, conversation_id: str, history: list[dict], budget: int,
+                  bot: str) -> list[dict]:
+        """Return `history` (messages with timestamps) as prompt messages within `budget` tokens."""
+        messages = [{"role": m["role"], "content": m["content"]} for m in history]
+        before = messages_tokens(messages)
+        if not self.enabled or before <= budget:
+            metrics.observe(f"history.{bot}.prompt_tokens", before)
+            return messages
+
+        # Leave room for the summary that stands in for the older turns
+        available = budget - self.summary_max_tokens - MESSAGE_OVERHEAD_TOKENS
+        keep, used = 0, 0
+        for message in reversed(messages):
+            used += message_tokens(message)
+            if used > available:
+                break
+            keep += 1
+        older = history[:len(history) - keep]
+
+        summary = await self._get_summary(user_id, conversation_id)
+        if summary is None or summary["covered_until"] < older[-1]["timestamp"]:
+            self._schedule_refresh(user_id, conversation_id, summary, older)
+
+        compacted = messages[len(messages) - keep:]
+        if summary is not None:
+            compacted.insert(0, {"role": "system", "content": SUMMARY_PREFIX + summary["summary"]})
+        after = messages_tokens(compacted)
+        metrics.incr("history.compactions")
+        metrics.incr("history.prompt_tokens_saved", before - after)
+        metrics.observe(f"history.{bot}.prompt_tokens", after)
+        return compacted
+
+    async def _get_summary(self, user_id: str, conversation_id: str) -> dict | None:
+        key = (user_id, conversation_id)
+        summary = self._summaries.get(key, _MISSING)
+        if summary is not _MISSING:
+            return summary
+        try:
+            summary = await self.collection.find_one(
+                {"user_id": user_id, "conversation_id": conversation_id},
+                projection={"_id": 0, "summary": 1, "covered_until": 1}
+            )
+        except Exception as e:
+            print(f"Error loading conversation summary: {e}")
+            return None
+        if summary is not None and summary["covered_until"].tzinfo is None:
+            # Mongo hands back naive UTC datetimes
+            summary["covered_until"] = summary["covered_until"].replace(tzinfo=timezone.utc)
+        self._summaries.set(key, summary)
+        return summary
+
+    def _schedule_refresh(self, user_id: str, conversation_id: str, summary: dict | None, older: list[dict]):
+        key = (user_id, conversation_id)
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        task = asyncio.create_task(self._refresh(user_id, conversation_id, summary, older))
+        self._tasks.add(task)
+
+        def _on_done(t: asyncio.Task):
+            self._tasks.discard(t)
+            self._refreshing.discard(key)
+            if not t.cancelled() and t.exception() is not None:
+                print(f"Conversation summary failed: {t.exception()}")
+
+        task.add_done_callback(_on_done)
+
+    async def _refresh(self, user_id: str, conversation_id: str, summary: dict | None, older: list[dict]):
+        """Fold the turns not yet covered into the stored summary."""
+        new_turns = [m for m in older if summary is None or m["timestamp"] > summary["covered_until"]]
+        transcript = "\n".join(
+            f"{'Student' if m['role'] == 'user' else 'Tutor'}: {m['content'][:SUMMARY_INPUT_CHARS_PER_MESSAGE]}"
+            for m in new_turns
+        )
+        prompt = (
+            "You maintain a running summary of a conversation between a student and NEXUS, "
+            "an academic tutor for IIT Indore.\n\n"
+            f"Current summary:\n{summary['summary'] if summary else '(none)'}\n\n"
+            f"New turns:\n{transcript}\n\n"
+            f"Write the updated summary in at most {self.summary_max_tokens * 3 // 4} words. Keep course codes, "
+            "the student's goals, constraints and any facts or decisions later turns may refer to. "
+            "Return only the summary."
+        )
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0.2,
+            "max_tokens": self.summary_max_tokens
+        }
+        started = time.perf_counter()
+        text = await self.llm.complete(payload, timeout=20, lane="background")
+        metrics.observe("history.summary_ms", (time.perf_counter() - started) * 1000)
+        metrics.incr("history.summaries")
+
+        doc = {"summary": text, "covered_until": older[-1]["timestamp"]}
+        await self.collection.update_one(
+            {"user_id": user_id, "conversation_id": conversation_id},
+            {"$set": {**doc, "updated_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+        self._summaries.set((user_id, conversation_id), doc)
@@ -0,0 +1,116 @@
+import numpy as np
+from core.config import Config
+
+# Labeled exemplar prompts per routing category. Keep them short and varied:
+# each category's centroid is the mean of these embeddings.
+INTENT_EXEMPLARS = {
+    "general": [
+        "hi",
+        "hello there",
+        "hey, good morning",
+        "what can you do?",
+        "help me",
+        "how does this work?",
+        "who are you?",
+        "thanks a lot",
+        "thank you, bye",
+        "goodbye",
+        "tell me a joke",
+        "how are you doing today?",
+    ],
+    "questionpaper": [
+        "solve this question paper",
+        "give me the solutions to the questions in this pdf",
+        "answer the questions from the uploaded file",
+        "explain the answers of this exam paper",
+        "generate a similar question paper",
+        "make another set of questions like this paper",
+        "create a practice paper based on this one",
+        "solve the attached midsem paper",
+        "can you solve these exam questions for me",
+        "generate more questions from this document",
+        "give answers for the previous year paper I uploaded",
+        "create a new paper with the same pattern",
+    ],
+    "scheduler": [
+        "create a study plan for my exams",
+        "make a weekly schedule for me",
+        "plan my day, I wake up at 7 am",
+        "I have 3 days to prepare for physics and maths, make a timetable",
+        "help me organize my time for assignments",
+        "generate a daily routine for productivity",
+        "schedule my tasks for tomorrow",
+        "build a revision timetable for endsems",
+        "make a 5 day plan to finish my lab reports",
+        "how should I split my time between coding and studying this week",
+        "create a timetable with breaks for studying",
+        "plan my week around my quiz on friday",
+    ],
+    "query": [
+        "what is EE101 about?",
+        "syllabus of MA105",
+        "books for PH102",
+        "credits of CS103",
+        "what topics are covered in CS202?",
+        "recommended textbooks for engineering mechanics",
+        "which courses are in the first semester?",
+        "what is taught in the chemistry course?",
+        "list the reference books for calculus",
+        "tell me about the course on data structures",
+        "what are the prerequisites for EE102",
+        "first year curriculum subjects",
+    ],
+}
+
+
+class IntentClassifier:
+    """Nearest-centroid intent classifier over sentence embeddings.
+
+    Prompts are embedded with the same SentenceTransformer QueryBot loads and
+    compared (cosine) against one centroid per category. A temperature-scaled
+    softmax over the similarities gives a confidence; callers should fall back
+    to the LLM router when it is below `threshold`.
+    """
+
+    def __init__(self,
+                 exemplars: dict = None,
+                 threshold: float = Config.INTENT_CONFIDENCE_THRESHOLD,
+                 temperature: float = 0.05):
+        self.exemplars = exemplars or INTENT_EXEMPLARS
+        self.threshold = threshold
+        self.temperature = temperature
+        self.labels = list(self.exemplars.keys())
+        self.model = None
+        self.centroids = None
+
+    @property
+    def ready(self) -> bool:
+        return self.model is not None and self.centroids is not None
+
+    def fit(self, model):
+        """Precompute normalized centroids for every category."""
+        centroids = []
+        for label in self.labels:
+            vectors = model.encode(self.exemplars[label], normalize_embeddings=True)
+            centroid = np.mean(vectors, axis=0)
+            centroids.append(centroid / np.linalg.norm(centroid))
+        self.centroids = np.vstack(centroids).astype(np.float32)
+        self.model = model
+
+    def scores(self, query_vec: np.ndarray) -> np.ndarray:
+        """Class probabilities for a query embedding."""
+        query_vec = np.asarray(query_vec, dtype=np.float32).reshape(-1)
+        sims = self.centroids @ (query_vec / (np.linalg.norm(query_vec) or 1.0))
+        logits = (sims - sims.max()) / self.temperature
+        probs = np.exp(logits)
+        return probs / probs.sum()
+
+    def predict(self, prompt: str) -> tuple[str, float]:
+        """Return (label, confidence) for a prompt."""
+        return self.predict_vector(self.model.encode([prompt])[0])
+
+    def predict_vector(self, query_vec: np.ndarray) -> tuple[str, float]:
+        """Return (label, confidence) for an already computed prompt embedding."""
+        probs = self.scores(query_vec)
+        best = int(np.argmax(probs))
+        return self.labels[best], float(probs[best])
@@ -0,0 +1,275 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+from core.config import Config
+from utils.metrics import metrics
+from utils.uploads import discard_upload
+
+TERMINAL_STATUSES = ("done", "failed")
+
+
+class JobQueueFullError(Exception):
+    """Too many jobs are waiting; the message is user-facing."""
+
+
+class InMemoryJobStore:
+    """Job records held in this process; expired records are dropped on access."""
+
+    def __init__(self):
+        self._jobs: dict[str, dict] = {}
+
+    async def ensure_indexes(self):
+        pass
+
+    async def create(self, job: dict):
+        self._jobs[job["id"]] = dict(job)
+
+    async def get(self, job_id: str) -> dict | None:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if job["expires_at"] <= datetime.now(timezone.utc):
+            del self._jobs[job_id]
+            return None
+        return dict(job)
+
+    async def update(self, job_id: str, fields: dict):
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.update(fields)
+
+    async def purge_expired(self):
+        now = datetime.now(timezone.utc)
+        for job_id in [i for i, job in self._jobs.items() if job["expires_at"] <= now]:
+            del self._jobs[job_id]
+
+
+class MongoJobStore:
+    """Job records in MongoDB so every API worker can report status and serve results.
+
+    Jobs still run in the worker that accepted them; a TTL index removes
+    records once `expires_at` has passed.
+    """
+
+    def __init__(self, db, collection_name: str = "paper_jobs"):
+        self.collection = db[collection_name]
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def create(self, job: dict):
+        await self.collection.insert_one({"_id": job["id"], **job})
+
+    async def get(self, job_id: str) -> dict | None:
+        # The TTL monitor only runs once a minute, so filter on expiry as well
+        return await self.collection.find_one(
+            {"_id": job_id, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+            projection={"_id": 0}
+        )
+
+    async def update(self, job_id: str, fields: dict):
+        await self.collection.update_one({"_id": job_id}, {"$set": fields})
+
+    async def purge_expired(self):
+        pass
+
+
+class JobManager:
+    """Runs question-paper jobs on a bounded pool of worker tasks.
+
+    `submit` enqueues a job and returns immediately; at most `workers` jobs run
+    at once and at most `max_pending` wait, beyond which submissions are
+    refused. `runner(job, progress)` does the work and returns a result dict
+    ({"text", "pdf_file"}); progress updates are written to the store
+    (coalesced, so a burst of OCR pages costs one write) and wake up `watch`
+    subscribers. Records, including results, expire `ttl` seconds after their
+    last update.
+    """
+
+    def __init__(self,
+                 runner: Callable[[dict, Callable], Awaitable[dict]],
+                 store=None,
+                 workers: int = Config.JOB_WORKERS,
+                 max_pending: int = Config.JOB_MAX_PENDING,
+                 ttl: float = Config.JOB_RESULT_TTL,
+                 poll_interval: float = Config.JOB_EVENTS_POLL_INTERVAL):
+        self.runner = runner
+        self.store = store or InMemoryJobStore()
+        self.workers = workers
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._tasks: list[asyncio.Task] = []
+        self._running = 0
+        # job_id -> Event set (and replaced) whenever the job changes in this process
+        self._changed: dict[str, asyncio.Event] = {}
+        # job_id -> open watch() generators; the last one to exit drops the Event
+        self._watchers: dict[str, int] = {}
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+            self._tasks.append(asyncio.create_task(self._janitor()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while not self._queue.empty():
+            job = self._queue.get_nowait()
+            await discard_upload(job["pdf_source"])
+            await self._update(job["id"], status="failed", error="The server restarted before this job ran.")
+
+    async def submit(self, pdf_source: bytes | str, **fields) -> dict:
+        """Create a queued job from `fields` (prompt, action, ...) and enqueue it.
+
+        The uploaded PDF (bytes or spooled path) only travels with the queued
+        work item; it is never written to the store.
+        """
+        if self._queue.full():
+            metrics.incr("jobs.rejected")
+            raise JobQueueFullError(
+                "I'm processing a lot of question papers right now. Please try again in a minute."
+            )
+        now = datetime.now(timezone.utc)
+        job = {
+            **fields,
+            "id": str(uuid.uuid4()),
+            "status": "queued",
+            "stage": "queued",
+            "progress": None,
+            "error": None,
+            "result_text": None,
+            "pdf": None,
+            "created_at": now,
+            "updated_at": now,
+            "expires_at": now + timedelta(seconds=self.ttl)
+        }
+        await self.store.create(job)
+        self._queue.put_nowait({**job, "pdf_source": pdf_source, "enqueued_at": time.perf_counter()})
+        metrics.incr("jobs.submitted")
+        self._update_gauges()
+        return job
+
+    async def get(self, job_id: str) -> dict | None:
+        return await self.store.get(job_id)
+
+    async def watch(self, job_id: str):
+        """Yield the job each time it changes, ending after it finishes or expires."""
+        last_seen = None
+        self._watchers[job_id] = self._watchers.get(job_id, 0) + 1
+        try:
+            while True:
+                # Registered before reading, so a change made in between still wakes us
+                changed = self._changed.setdefault(job_id, asyncio.Event())
+                job = await self.store.get(job_id)
+                if job is None:
+                    return
+                marker = (job["status"], job["stage"], job["progress"])
+                if marker != last_seen:
+                    last_seen = marker
+                    yield job
+                if job["status"] in TERMINAL_STATUSES:
+                    return
+                try:
+                    # Jobs running in another API worker are only visible by polling the store
+                    await asyncio.wait_for(changed.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._watchers[job_id] -= 1
+            if not self._watchers[job_id]:
+                # Unknown, finished or remote jobs may never be updated here again
+                del self._watchers[job_id]
+                self._changed.pop(job_id, None)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            metrics.observe("jobs.queue_wait_ms", (time.perf_counter() - job["enqueued_at"]) * 1000)
+            self._running += 1
+            self._update_gauges()
+            try:
+                await self._run(job)
+            finally:
+                self._running -= 1
+                self._update_gauges()
+                await discard_upload(job["pdf_source"])
+
+    async def _run(self, job: dict):
+        job_id = job["id"]
+        state = {"stage": "queued", "progress": None, "finished": False}
+        dirty = asyncio.Event()
+
+        def progress(stage: str, done: int | None = None, total: int | None = None):
+            state["stage"] = stage
+            state["progress"] = {"done": done, "total": total} if total is not None else None
+            dirty.set()
+
+        async def publish():
+            while True:
+                await dirty.wait()
+                if state["finished"]:
+                    return
+                dirty.clear()
+                await self._update(job_id, stage=state["stage"], progress=state["progress"])
+
+        await self._update(job_id, status="running")
+        publisher = asyncio.create_task(publish())
+        started = time.perf_counter()
+        try:
+            result = await self.runner(job, progress) or {}
+            text = result.get("text", "")
+            if isinstance(text, list):
+                text = "\n".join(text)
+            pdf_file = result.get("pdf_file")
+            failed = result.get("status_code", 200) >= 400
+            fields = {
+                "status": "failed" if failed else "done",
+                "stage": "failed" if failed else "done",
+                "progress": None,
+                "error": text if failed else None,
+                "result_text": text,
+                "pdf": pdf_file.getvalue() if pdf_file is not None else None
+            }
+        except asyncio.CancelledError:
+            fields = {"status": "failed", "stage": "failed", "error": "The server restarted while this job was running."}
+            raise
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            fields = {"status": "failed", "stage": "failed", "error": "Processing failed. Please try again."}
+        finally:
+            # Let an in-flight progress write land before the final state is written
+            state["finished"] = True
+            dirty.set()
+            await publisher
+            metrics.observe("jobs.run_ms", (time.perf_counter() - started) * 1000)
+            metrics.incr("jobs.failed" if fields["status"] == "failed" else "jobs.completed")
+            await self._update(job_id, **fields)
+
+    async def _update(self, job_id: str, **fields):
+        now = datetime.now(timezone.utc)
+        fields.update(updated_at=now, expires_at=now + timedelta(seconds=self.ttl))
+        try:
+            await self.store.update(job_id, fields)
+        except Exception as e:
+            print(f"Job store update failed for {job_id}: {e}")
+        changed = self._changed.pop(job_id, None)
+        if changed is not None:
+            changed.set()
+
+    async def _janitor(self):
+        while True:
+            await asyncio.sleep(60)
+            try:
+                await self.store.purge_expired()
+            except Exception as e:
+                print(f"Job store purge failed: {e}")
+
+    def _update_gauges(self):
+        metrics.set_gauge("jobs.pending", self._queue.qsize())
+        metrics.set_gauge("jobs.running", self._running)
+
@@ -0,0 +1,111 @@
+import re
+import time
+from typing import Awaitable, Callable
+from core.config import Config
+from core.rate_limiter import ModelBusyError
+from utils.metrics import metrics
+
+# Hedges that mark an answer as worth a second opinion from the larger model
+LOW_CONFIDENCE_PATTERN = re.compile(
+    r"\b(?:i(?:'m| am) not (?:sure|certain)|i (?:don't|do not) know|(?:cannot|can't|unable to) solve)\b",
+    re.IGNORECASE
+)
+# Statements that the given material lacks the answer. For answers grounded in
+# retrieved context these are the requested behaviour and the larger model
+# would see the same context, so they are not escalated.
+MISSING_INFORMATION_PATTERN = re.compile(
+    r"\b(?:(?:not enough|insufficient) information|(?:cannot|can't|unable to) (?:determine|be determined)|"
+    r"(?:isn't|is not|aren't|are not|not) (?:mentioned |provided |available |included |specified |covered )?"
+    r"in the (?:provided |given |available )?(?:context|curriculum|information|documents?))\b",
+    re.IGNORECASE
+)
+SOLUTION_HEADING_PATTERN = re.compile(r"(?im)^[ \t*#]*solution\b")
+MIN_ANSWER_CHARS = 20
+
+
+class ModelCascade:
+    """Chooses between the 8B and 70B models per request.
+
+    The small model is used unless the prompt is long (the limit doubles when
+    the context is an exact course-code match, which needs little reasoning)
+    or more than `max_small_questions` questions must be solved at once. A
+    small-model answer that hedges, is nearly empty or solves fewer questions
+    than asked is retried on the large model. Answers grounded in retrieved
+    context that say the context lacks the answer are kept. Latency per tier
+    and the escalation rate are exported as metrics.
+    """
+
+    def __init__(self,
+                 small_model: str = Config.GROQ_MODEL,
+                 large_model: str = Config.GROQ_VERSATILE_MODEL,
+                 enabled: bool = Config.CASCADE_ENABLED,
+                 max_small_prompt_tokens: int = Config.CASCADE_MAX_SMALL_PROMPT_TOKENS,
+                 max_small_questions: int = Config.CASCADE_MAX_SMALL_QUESTIONS,
+                 escalate: bool = Config.CASCADE_ESCALATE_LOW_CONFIDENCE):
+        self.small_model = small_model
+        self.large_model = large_model
+        self.enabled = enabled
+        self.max_small_prompt_tokens = max_small_prompt_tokens
+        self.max_small_questions = max_small_questions
+        self.escalate = escalate
+
+    def choose(self, prompt_tokens: int, num_questions: int = 0, course_code_hit: bool = False,
+               default: str | None = None) -> str:
+        """Model for a request; `default` is used when the cascade is disabled."""
+        if not self.enabled:
+            return default or self.small_model
+        token_limit = self.max_small_prompt_tokens * (2 if course_code_hit else 1)
+        if prompt_tokens > token_limit or num_questions > self.max_small_questions:
+            return self.large_model
+        return self.small_model
+
+    def low_confidence(self, answer: str, num_questions: int = 0, grounded: bool = False) -> bool:
+        if MISSING_INFORMATION_PATTERN.search(answer):
+            return not grounded
+        if len(answer.strip()) < MIN_ANSWER_CHARS or LOW_CONFIDENCE_PATTERN.search(answer):
+            return True
+        # Answer keys carry one "Solution" heading per question
+        return num_questions > 1 and len(SOLUTION_HEADING_PATTERN.findall(answer)) < num_questions
+
+    async def run(self, call: Callable[[str], Awaitable[str]], bot: str, prompt_tokens: int,
+                  num_questions: int = 0, course_code_hit: bool = False, default: str | None = None,
+                  grounded: bool = False) -> str:
+        """Answer with `call(model)` on the chosen model, escalating low-confidence small-model answers.
+
+        `grounded` marks answers restricted to retrieved context, where saying
+        the context lacks the answer is correct rather than a hedge.
+        """
+        model = self.choose(prompt_tokens, num_questions, course_code_hit, default)
+        answer = await self._timed(call, model, bot)
+        if (self.enabled and self.escalate and model == self.small_model
+                and self.low_confidence(answer, num_questions, grounded)):
+            metrics.incr("cascade.escalations")
+            metrics.incr(f"cascade.{bot}.escalations")
+            try:
+                answer = await self._timed(call, self.large_model, bot)
+            except ModelBusyError:
+                # The small model's answer beats telling the user to retry
+                metrics.incr("cascade.escalations_busy")
+        self._update_escalation_rate()
+        return answer
+
+    def record_choice(self, model: str, bot: str):
+        """Count a request that used `model` without going through `run` (e.g. a stream)."""
+        metrics.incr(f"cascade.{bot}.{self._tier(model)}")
+        metrics.incr(f"cascade.{self._tier(model)}.requests")
+
+    async def _timed(self, call, model: str, bot: str) -> str:
+        self.record_choice(model, bot)
+        started = time.perf_counter()
+        try:
+            return await call(model)
+        finally:
+            metrics.observe(f"cascade.{self._tier(model)}.latency_ms", (time.perf_counter() - started) * 1000)
+
+    def _tier(self, model: str) -> str:
+        return "large" if model == self.large_model else "small"
+
+    def _update_escalation_rate(self):
+        small_requests = metrics.counter("cascade.small.requests")
+        if small_requests:
+            metrics.set_gauge("cascade.escalation_rate", metrics.counter("cascade.escalations") / small_requests)
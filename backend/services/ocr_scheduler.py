@@ -0,0 +1,167 @@
+import asyncio
+import multiprocessing
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from core.config import Config
+from utils.metrics import metrics
+
+
+class OCRRejectedError(Exception):
+    """An OCR request was refused before any work was done; the message is user-facing."""
+
+
+class OCRBusyError(OCRRejectedError):
+    """The global OCR queue is full."""
+
+
+class OCRPageLimitError(OCRRejectedError):
+    """The document has more pages needing OCR than one request may submit."""
+
+
+def _ocr_worker(size: tuple[int, int], samples: bytes) -> str:
+    """Run Tesseract on a grayscale page image (executes in a pool process)."""
+    # Imported in the pool processes only; the API process never needs them
+    import pytesseract
+    from PIL import Image
+
+    image = Image.frombytes("L", size, samples)
+    try:
+        return pytesseract.image_to_string(image)
+    finally:
+        image.close()
+
+
+class OCRTicket:
+    """Admission for one request's pages; hands pages to the scheduler."""
+
+    def __init__(self, scheduler: "OCRScheduler", request_id: str):
+        self.scheduler = scheduler
+        self.request_id = request_id
+
+    async def ocr(self, size: tuple[int, int], samples: bytes) -> str:
+        return await self.scheduler._submit(self.request_id, size, samples)
+
+
+class OCRScheduler:
+    """Process-wide OCR scheduler backed by a process pool.
+
+    Requests reserve their pages up front: a request over the per-request page
+    limit, or one that would push the number of admitted pages past the global
+    limit, is rejected immediately so the caller can say "busy, retry later".
+    Admitted pages wait in per-request queues that are served round-robin, so
+    one large upload cannot starve small ones.
+    """
+
+    def __init__(self,
+                 max_workers: int = Config.OCR_PROCESS_WORKERS or os.cpu_count() or 1,
+                 max_pages_per_request: int = Config.OCR_MAX_PAGES_PER_REQUEST,
+                 max_admitted_pages: int = Config.OCR_MAX_QUEUED_PAGES):
+        self.max_workers = max_workers
+        self.max_pages_per_request = max_pages_per_request
+        self.max_admitted_pages = max_admitted_pages
+        self._executor: ProcessPoolExecutor | None = None
+        # request_id -> deque of (size, samples, future, enqueued_at), in round-robin order
+        self._queues: OrderedDict[str, deque] = OrderedDict()
+        self._admitted = 0
+        self._queued = 0
+        self._running = 0
+
+    def _ensure_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a process that already runs torch/event-loop threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @asynccontextmanager
+    async def request(self, num_pages: int):
+        """Reserve capacity for `num_pages` pages, raising OCRRejectedError if it is not available."""
+        if num_pages > self.max_pages_per_request:
+            metrics.incr("ocr.rejected_page_limit")
+            raise OCRPageLimitError(
+                f"This document has {num_pages} scanned pages, but I can only OCR "
+                f"{self.max_pages_per_request} pages per request. Please split it into smaller files."
+            )
+        if self._admitted + num_pages > self.max_admitted_pages:
+            metrics.incr("ocr.rejected_busy")
+            raise OCRBusyError(
+                "I'm processing a lot of question papers right now. Please try again in a minute."
+            )
+
+        request_id = str(uuid.uuid4())
+        self._admitted += num_pages
+        self._update_gauges()
+        try:
+            yield OCRTicket(self, request_id)
+        finally:
+            self._admitted -= num_pages
+            leftover = self._queues.pop(request_id, None)
+            if leftover:
+                self._queued -= len(leftover)
+                for *_, future, _ in leftover:
+                    future.cancel()
+            self._update_gauges()
+
+    async def _submit(self, request_id: str, size: tuple[int, int], samples: bytes) -> str:
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(request_id, deque()).append((size, samples, future, time.perf_counter()))
+        self._queued += 1
+        self._dispatch()
+        return await future
+
+    def _next_item(self):
+        """Pop the next page, rotating across requests."""
+        while self._queues:
+            request_id, pending = next(iter(self._queues.items()))
+            item = pending.popleft()
+            self._queued -= 1
+            if pending:
+                self._queues.move_to_end(request_id)
+            else:
+                del self._queues[request_id]
+            if not item[2].cancelled():
+                return item
+        return None
+
+    def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while self._running < self.max_workers:
+            item = self._next_item()
+            if item is None:
+                break
+            size, samples, future, enqueued_at = item
+            metrics.observe("ocr.wait_ms", (time.perf_counter() - enqueued_at) * 1000)
+            metrics.incr("ocr.pages")
+            self._running += 1
+            work = loop.run_in_executor(self._ensure_executor(), _ocr_worker, size, samples)
+            work.add_done_callback(lambda done, future=future: self._on_done(done, future))
+        self._update_gauges()
+
+    def _on_done(self, done: asyncio.Future, future: asyncio.Future):
+        self._running -= 1
+        if not future.done():
+            if done.cancelled():
+                future.cancel()
+            elif done.exception() is not None:
+                future.set_exception(done.exception())
+            else:
+                future.set_result(done.result())
+        self._dispatch()
+
+    def _update_gauges(self):
+        metrics.set_gauge("ocr.queue_depth", self._queued)
+        metrics.set_gauge("ocr.running", self._running)
+        metrics.set_gauge("ocr.admitted_pages", self._admitted)
+
+ocr_scheduler = OCRScheduler()
@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import io
+import os
+import threading
+from core.config import Config
+from utils.metrics import metrics
+
+class PaperCache:
+    """Content-addressed disk cache for question-paper processing.
+
+    Entries are keyed by the SHA-256 of the uploaded file: the extracted text is
+    stored under the digest alone, rendered results under digest + action
+    (e.g. "answer"). Total size is bounded by `max_bytes`; the least recently
+    used files (by mtime, refreshed on every hit) are evicted first.
+    """
+
+    def __init__(self, root: str = Config.PAPER_CACHE_DIR, max_bytes: int = Config.PAPER_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes: dict[str, int] | None = None
+
+    @staticmethod
+    def digest_file(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def digest_bytes(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    @classmethod
+    def digest_source(cls, source: str | bytes) -> str:
+        """Digest of an upload held either on disk (path) or in memory (bytes)."""
+        if isinstance(source, (bytes, bytearray)):
+            return cls.digest_bytes(source)
+        return cls.digest_file(source)
+
+    async def get_text(self, digest: str) -> str | None:
+        data = await asyncio.to_thread(self._read, f"{digest}.text.txt")
+        self._record("text", data is not None)
+        return data.decode("utf-8") if data is not None else None
+
+    async def put_text(self, digest: str, text: str):
+        await asyncio.to_thread(self._write, {f"{digest}.text.txt": text.encode("utf-8")})
+
+    async def get_result(self, digest: str, action: str) -> dict | None:
+        """Return a cached {"text", "pdf_file"} result for this file and action."""
+        def read():
+            text = self._read(f"{digest}.{action}.txt")
+            pdf = self._read(f"{digest}.{action}.pdf")
+            return text, pdf
+        text, pdf = await asyncio.to_thread(read)
+        hit = text is not None and pdf is not None
+        self._record(action, hit)
+        if not hit:
+            return None
+        return {"text": text.decode("utf-8"), "pdf_file": io.BytesIO(pdf)}
+
+    async def put_result(self, digest: str, action: str, result: dict):
+        text = result.get("text", "")
+        if isinstance(text, list):
+            text = "\n".join(text)
+        pdf_file = result.get("pdf_file")
+        if pdf_file is None:
+            return
+        pdf_bytes = pdf_file.getvalue()
+        await asyncio.to_thread(self._write, {
+            f"{digest}.{action}.txt": text.encode("utf-8"),
+            f"{digest}.{action}.pdf": pdf_bytes
+        })
+
+    def _record(self, kind: str, hit: bool):
+        metrics.incr(f"paper_cache.{kind}.{'hits' if hit else 'misses'}")
+
+    def _load_sizes(self):
+        if self._sizes is None:
+            os.makedirs(self.root, exist_ok=True)
+            self._sizes = {
+                entry.name: entry.stat().st_size
+                for entry in os.scandir(self.root)
+                if entry.is_file() and ".tmp-" not in entry.name
+            }
+
+    def _read(self, name: str) -> bytes | None:
+        path = os.path.join(self.root, name)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # Refresh recency for LRU eviction
+            os.utime(path)
+            return data
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Paper cache read error for {name}: {e}")
+            return None
+
+    def _write(self, files: dict[str, bytes]):
+        try:
+            with self._lock:
+                self._load_sizes()
+                for name, data in files.items():
+                    path = os.path.join(self.root, name)
+                    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+                    with open(tmp_path, "wb") as f:
+                        f.write(data)
+                    os.replace(tmp_path, path)
+                    self._sizes[name] = len(data)
+                self._evict()
+        except Exception as e:
+            print(f"Paper cache write error: {e}")
+
+    def _evict(self):
+        total = sum(self._sizes.values())
+        if total <= self.max_bytes:
+            return
+        by_age = sorted(
+            self._sizes,
+            key=lambda name: self._mtime(os.path.join(self.root, name))
+        )
+        for name in by_age:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.root, name))
+            except FileNotFoundError:
+                pass
+            total -= self._sizes.pop(name)
+            metrics.incr("paper_cache.evictions")
+
+    @staticmethod
+    def _mtime(path: str) -> float:
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return 0.0
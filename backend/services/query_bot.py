@@ -1,48 +1,123 @@
+import asyncio
 import json
 import re
-import faiss
+import threading
 import httpx
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from core.config import Config
+from core.llm_client import GroqClient
+from core.rate_limiter import ModelBusyError
 from utils.memory import print_memory_usage
+from utils.chunk_store import ChunkStore, normalize_course_code
+from utils.index_store import IndexStore, content_hash, doc_hash
+from utils.cache import TTLCache
+from utils.metrics import metrics
+from utils.tokens import messages_tokens
+from services.embedding_service import EmbeddingService
+from services.embedding_sidecar import RemoteEmbeddingModel
+from services.response_cache import ResponseCache
+from services.model_cascade import ModelCascade
+from services.course_lookup import CourseFieldLookup
 
 class QueryBot:
-    def __init__(self, 
+    def __init__(self,
+                 llm_client: GroqClient,
                  embedding_model=Config.SENTENCE_TRANSFORMER_MODEL,
-                 groq_api_key=Config.GROQ_API_KEY,
-                 model_name=Config.GROQ_MODEL,
-                 groq_api_url="https://api.groq.com/openai/v1/chat/completions"):
+                 model_name=Config.GROQ_MODEL):
 
+        self.llm = llm_client
         self.EMBEDDING_MODEL = embedding_model
-        self.GROQ_API_KEY = groq_api_key
         self.MODEL_NAME = model_name
-        self.GROQ_API_URL = groq_api_url
 
         # Initialized in initialize() method
-        self.chunks = []
-        self.metadata = []
+        self.store = ChunkStore()
         self.index = None
         self.model = None
-        self.embeddings = None
+        self.embedder = None
+        self.index_version = None
+        self.index_store = IndexStore()
+        self.doc_hashes: dict[str, str] = {}
         self._initialized = False
+        # Keeps (index, store, version) consistent for searches; updates swap all three under it
+        self._index_lock = threading.Lock()
+        # Serializes incremental updates
+        self._update_lock = asyncio.Lock()
+
+        # Normalized query -> embedding, and (index version, query, k) -> top-k chunk ids
+        self.query_vector_cache = TTLCache(Config.QUERY_CACHE_SIZE, Config.QUERY_CACHE_TTL, "query_vector")
+        self.retrieval_cache = TTLCache(Config.QUERY_CACHE_SIZE, Config.QUERY_CACHE_TTL, "retrieval")
+        # Answers keyed by question + retrieved chunk ids, with a semantic tier
+        self.response_cache = ResponseCache()
+        # Picks the 8B or 70B model per question
+        self.cascade = ModelCascade()
+        # Structured course documents for templated single-field answers
+        self.course_fields = CourseFieldLookup()
+
+    @property
+    def ready(self) -> bool:
+        """Whether semantic retrieval (embedding model + index) is available."""
+        return self._initialized
+
+    @property
+    def chunks(self) -> list:
+        return self.store.chunks
+
+    @property
+    def metadata(self) -> list:
+        return self.store.metadata
 
     async def initialize(self, db):
-        """Initialize the query bot with course data from database."""
-        try:
-            self.chunks, self.metadata = await self.load_course_chunks(db)
-            if self.chunks:
-                self.index, self.model, self.embeddings = self.build_faiss_index(self.chunks)
-                self._initialized = True
-                print(f"QueryBot initialized with {len(self.chunks)} chunks")
-            else:
-                print("Warning: No course chunks loaded - QueryBot will have limited functionality")
-        except Exception as e:
-            print(f"Error initializing QueryBot: {e}")
-            self._initialized = False
+        """Initialize the query bot with course data from database.
 
-    async def load_course_chunks(self, db):
-        """Load course data from MongoDB and create searchable chunks."""
+        Loading the model and index runs in a worker thread, so the event loop
+        keeps serving while this is awaited in the background. Until it
+        finishes, field lookups and exact course-code retrieval already work
+        from the fetched documents; only semantic search has to wait.
+
+        Raises when the courses, model or index cannot be loaded (including an
+        empty curriculum), so the caller can report the failure and retry.
+        """
+        raw_courses = await self.fetch_courses(db)
+        self.course_fields.load(raw_courses)
+        self.doc_hashes = {str(course.get("_id")): doc_hash(course) for course in raw_courses}
+        version = content_hash(self.doc_hashes.values(), self.EMBEDDING_MODEL)
+        chunks, metadata = self.chunk_courses(raw_courses)
+        if not chunks:
+            raise RuntimeError("No course chunks loaded from the curriculum collection")
+        self.store = ChunkStore(
+            ids=range(len(chunks)), chunks=chunks,
+            metadata=[{**meta, "chunk_id": chunk_id} for chunk_id, meta in enumerate(metadata)]
+        )
+        self.index, self.model, self.store = await asyncio.to_thread(
+            self.load_or_build_index, version, chunks, metadata
+        )
+        # The first encode initializes the model's kernels; pay for it here, not on a query
+        await asyncio.to_thread(self.model.encode, ["warm-up"])
+        self.embedder = EmbeddingService(self.model)
+        self.embedder.start()
+        self.index_version = version
+        self._initialized = True
+        print(f"QueryBot initialized with {len(self.store)} chunks (index {version[:12]})")
+
+    async def shutdown(self):
+        if self.embedder is not None:
+            await self.embedder.stop()
+
+    @staticmethod
+    def normalize_query(text: str) -> str:
+        return " ".join(text.lower().split())
+
+    async def embed_query(self, text: str) -> np.ndarray:
+        """Embed a single query through the micro-batching embedding service (cached)."""
+        key = self.normalize_query(text)
+        query_vec = self.query_vector_cache.get(key)
+        if query_vec is None:
+            query_vec = await self.embedder.encode(text)
+            self.query_vector_cache.set(key, query_vec)
+        return query_vec
+
+    async def fetch_courses(self, db) -> list[dict]:
+        """Fetch the raw curriculum documents from MongoDB."""
         try:
             collection = db["First_Year_Curriculum"]
             cursor = collection.find({})
@@ -51,13 +126,21 @@ class QueryBot:
         except Exception as e:
             print(f"MongoDB connection failed: {e}")
             raw_courses = []
+        return raw_courses
+
+    async def load_course_chunks(self, db):
+        """Load course data from MongoDB and create searchable chunks."""
+        return self.chunk_courses(await self.fetch_courses(db))
 
+    def chunk_courses(self, raw_courses: list[dict]):
+        """Create searchable chunks and their metadata from curriculum documents."""
         chunks = []
         metadata = []
 
         for course in raw_courses:
             code = course.get("Course Code", "")
             title = course.get("Course Title", course.get("Title", ""))
+            doc_id = str(course.get("_id"))
             full_text = f"{code}\n{title}\n"
 
             for k, v in course.items():
@@ -74,20 +157,168 @@ class QueryBot:
             for paragraph in full_text.split("\n\n"):
                 if len(paragraph.strip()) > 50:
                     chunks.append(paragraph.strip())
-                    metadata.append({"course": code, "title": title})
+                    metadata.append({"course": code, "title": title, "doc_id": doc_id})
 
         return chunks, metadata
 
+    def load_embedding_model(self):
+        """The sentence embedding model: in-process, or the shared sidecar when one is configured."""
+        if not Config.EMBEDDING_SIDECAR_SOCKET:
+            # Imported here so workers using the sidecar never load torch
+            from sentence_transformers import SentenceTransformer
+            return SentenceTransformer(self.EMBEDDING_MODEL)
+        model = RemoteEmbeddingModel(Config.EMBEDDING_SIDECAR_SOCKET)
+        info = model.wait_until_ready()
+        if info["model"] != self.EMBEDDING_MODEL:
+            raise RuntimeError(
+                f"Embedding sidecar serves {info['model']}, expected {self.EMBEDDING_MODEL}"
+            )
+        print(f"Using embedding sidecar at {Config.EMBEDDING_SIDECAR_SOCKET}")
+        return model
+
+    def load_or_build_index(self, version: str, chunks: list, metadata: list):
+        """Memory-map the stored index for this content version, building it only if missing.
+
+        Only one process builds a missing version; it then maps the artifact it
+        wrote like every other worker, so all of them share one read-only copy
+        of the index through the page cache.
+
+        Returns (index, model, store).
+        """
+        model = None
+        with self.index_store.build_lock():
+            stored = self.index_store.load(version)
+            if stored is not None:
+                print(f"Loaded FAISS index artifact {version[:12]} from disk")
+            else:
+                index, model, _ = self.build_faiss_index(chunks)
+                ids = list(range(len(chunks)))
+                metadata = [{**meta, "chunk_id": chunk_id} for meta, chunk_id in zip(metadata, ids)]
+                store = ChunkStore(ids=ids, chunks=chunks, metadata=metadata)
+                try:
+                    self.index_store.save(version, index, store, self.EMBEDDING_MODEL)
+                    self.index_store.publish(version)
+                    self.index_store.prune(keep=version)
+                    stored = self.index_store.load(version)
+                except Exception as e:
+                    print(f"Error saving index artifact: {e}")
+
+        if model is None:
+            model = self.load_embedding_model()
+        if stored is None:
+            return index, model, store
+        return stored["index"], model, stored["store"]
+
     def build_faiss_index(self, chunks):
-        """Build FAISS index for semantic search."""
+        """Build an ID-mapped FAISS index for semantic search (ids are chunk positions)."""
+        import faiss
+
         print_memory_usage("before build_faiss_index call")
-        model = SentenceTransformer(self.EMBEDDING_MODEL)
-        embeddings = model.encode(chunks, show_progress_bar=True)
-        index = faiss.IndexFlatL2(len(embeddings[0]))
-        index.add(np.array(embeddings))
+        model = self.load_embedding_model()
+        embeddings = np.asarray(model.encode(chunks, show_progress_bar=True), dtype=np.float32)
+        index = faiss.IndexIDMap2(faiss.IndexFlatL2(embeddings.shape[1]))
+        index.add_with_ids(embeddings, np.arange(len(chunks), dtype=np.int64))
         print_memory_usage("after build_faiss_index call")
         return index, model, embeddings
 
+    async def apply_course_changes(self, upserted: list[dict], removed_doc_ids: list[str]):
+        """Re-chunk changed course documents and update the index in place.
+
+        Vectors of every touched document are removed from a private copy of
+        the ID-mapped index and the new chunks are added, in a worker thread
+        while searches keep using the current index. The patched index and
+        chunk store are then swapped in one short critical section, so
+        concurrent searches see either the old or the new state, never a mix.
+
+        Only the curriculum leader (see CurriculumWatcher) calls this. The new
+        version is saved and published for the other workers to reload, and
+        the leader then maps the saved artifact again so it shares the pages
+        with them.
+        """
+        if not self._initialized or (not upserted and not removed_doc_ids):
+            return
+        async with self._update_lock:
+            new_chunks, new_metadata = self.chunk_courses(upserted)
+            new_embeddings = (
+                await asyncio.to_thread(self.model.encode, new_chunks)
+                if new_chunks else np.zeros((0, self.index.d), dtype=np.float32)
+            )
+            touched = {str(course.get("_id")) for course in upserted} | set(removed_doc_ids)
+            store, removed_ids, added_ids = self.store.replace_docs(touched, new_chunks, new_metadata)
+
+            doc_hashes = dict(self.doc_hashes)
+            for doc_id in removed_doc_ids:
+                doc_hashes.pop(doc_id, None)
+            for course in upserted:
+                doc_hashes[str(course.get("_id"))] = doc_hash(course)
+            version = content_hash(doc_hashes.values(), self.EMBEDDING_MODEL)
+
+            # Only this coroutine replaces self.index (under _update_lock), so it can be read here
+            index = await asyncio.to_thread(self._patched_index, self.index, removed_ids, added_ids, new_embeddings)
+            with self._index_lock:
+                self.index = index
+                self.store = store
+                self.doc_hashes = doc_hashes
+                self.course_fields.apply_changes(upserted, removed_doc_ids)
+                self.index_version = version
+            # Cached results refer to the old index version
+            self.retrieval_cache.clear()
+
+            print(f"QueryBot index updated: -{len(removed_ids)} +{len(added_ids)} chunks (index {version[:12]})")
+            try:
+                stored = await asyncio.to_thread(self._save_and_publish, version, self.index, store)
+            except Exception as e:
+                print(f"Error saving index artifact: {e}")
+                return
+            if stored is not None:
+                with self._index_lock:
+                    self.index = stored["index"]
+
+    def _patched_index(self, index, removed_ids: list[int], added_ids: list[int], embeddings):
+        """Writable copy of `index` with `removed_ids` dropped and `added_ids` added.
+
+        Runs in a worker thread; the copy also moves off a read-only
+        memory-mapped artifact. `index` itself is only read, so searches on it
+        continue meanwhile.
+        """
+        patched = self.index_store.private_copy(index)
+        if removed_ids:
+            patched.remove_ids(np.asarray(removed_ids, dtype=np.int64))
+        if added_ids:
+            patched.add_with_ids(np.asarray(embeddings, dtype=np.float32), np.asarray(added_ids, dtype=np.int64))
+        return patched
+
+    def _save_and_publish(self, version: str, index, store: ChunkStore) -> dict | None:
+        """Save a version, point the other workers at it and return it memory-mapped."""
+        with self.index_store.build_lock():
+            self.index_store.save(version, index, store, self.EMBEDDING_MODEL)
+            self.index_store.publish(version)
+            self.index_store.prune(keep=version)
+            return self.index_store.load(version)
+
+    async def reload_index(self, version: str, raw_courses: list[dict]) -> bool:
+        """Map a version another worker published, instead of re-embedding the changes here.
+
+        `raw_courses` are the current curriculum documents, for the field
+        lookups. Returns False when the version cannot be loaded (e.g. it was
+        already replaced); the caller tries again with the next published one.
+        """
+        if not self._initialized:
+            return False
+        async with self._update_lock:
+            stored = await asyncio.to_thread(self.index_store.load, version)
+            if stored is None:
+                return False
+            doc_hashes = {str(course.get("_id")): doc_hash(course) for course in raw_courses}
+            with self._index_lock:
+                self.index, self.store = stored["index"], stored["store"]
+                self.doc_hashes = doc_hashes
+                self.course_fields.load(raw_courses)
+                self.index_version = version
+            self.retrieval_cache.clear()
+        print(f"QueryBot reloaded published index {version[:12]} ({len(self.store)} chunks)")
+        return True
+
     def extract_course_code(self, query: str, chat_history: list = None) -> str | None:
         """Extract course code from query or chat history."""
         match = re.search(r"\b([A-Z]{2,3}\s?\d{3}[A-Z]?)\b", query.upper())
@@ -102,96 +333,170 @@ class QueryBot:
                         return history_match.group(1).replace(" ", "")
         return None
 
-    def get_chunks_by_course_code(self, course_code: str) -> list:
-        """Get all chunks for a specific course code."""
-        course_code_clean = course_code.upper().replace(" ", "")
-        chunks_found = []
-        for i, chunk in enumerate(self.chunks):
-            code_in_chunk = self.metadata[i]["course"].upper().replace(" ", "")
-            if course_code_clean in code_in_chunk:
-                chunks_found.append((chunk, self.metadata[i]))
-        return chunks_found
-
-    def retrieve_relevant_chunks(self, query: str, chat_history: list = None, top_k: int = 4) -> list:
+    def answer_field_lookup(self, query: str) -> dict | None:
+        """Answer "credits of CS103"-style lookups from the course record, or None to use the LLM."""
+        text = self.course_fields.answer(query)
+        return {"text": text, "pdf_file": None} if text is not None else None
+
+    def get_chunks_by_course_code(self, course_code: str, limit: int | None = None) -> list:
+        """Get chunks for a course code (exact match, else prefix match such as 'EE1')."""
+        store = self.store
+        chunk_ids = store.chunk_ids_for_code(course_code)
+        return [store.get(chunk_id) for chunk_id in chunk_ids[:limit]]
+
+    async def retrieve_relevant_chunks(self, query: str, chat_history: list = None, top_k: int = 4) -> list:
         """Retrieve relevant chunks for a query using semantic search."""
-        # Safety check - ensure initialization
-        if not self._initialized or self.index is None or self.model is None:
-            print("Warning: QueryBot not properly initialized")
-            return []
-        
         if not self.chunks:
             return []
             
-        # First try exact course code matching
+        # First try exact course code matching (available before the index is loaded)
         course_code = self.extract_course_code(query, chat_history)
         if course_code:
-            chunks_for_course = self.get_chunks_by_course_code(course_code)
+            chunks_for_course = self.get_chunks_by_course_code(course_code, limit=top_k)
             if chunks_for_course:
-                return chunks_for_course[:top_k]
+                return chunks_for_course
+
+        # Safety check - semantic search needs the model and index
+        if not self._initialized or self.index is None or self.embedder is None:
+            metrics.incr("query.not_ready")
+            return []
 
         # Fall back to semantic search
+        cache_key = (self.index_version, self.normalize_query(query), top_k)
+        chunk_ids = self.retrieval_cache.get(cache_key)
+        if chunk_ids is not None:
+            store = self.store
+            return [hit for hit in (store.get(i) for i in chunk_ids) if hit is not None]
         try:
-            query_vec = self.model.encode([query])
-            D, I = self.index.search(query_vec, top_k)
-            return [(self.chunks[i], self.metadata[i]) for i in I[0] if i < len(self.chunks)]
+            query_vec = (await self.embed_query(query)).reshape(1, -1)
+            with self._index_lock:
+                D, I = self.index.search(query_vec, top_k)
+                store = self.store
+                version = self.index_version
+            chunk_ids = [int(i) for i in I[0] if i >= 0]
+            if version == cache_key[0]:
+                self.retrieval_cache.set(cache_key, chunk_ids)
+            return [hit for hit in (store.get(i) for i in chunk_ids) if hit is not None]
         except Exception as e:
             print(f"Error in semantic search: {e}")
             return []
 
+    def build_llama_payload(self, query: str, context_chunks: list, chat_history: list = None) -> dict:
+        """Build the Groq payload for a question with its retrieved course context."""
+        context = "\n\n".join(f"Chunk: {chunk}" for chunk, meta in context_chunks)
+
+        messages = [
+            {
+                "role": "system", 
+                "content": "You are a helpful academic assistant for IIT Indore (IITI) students. "
+                          "Use the following course data to answer questions accurately. "
+                          "If the information isn't in the provided context, say so clearly. "
+                          "Be concise but thorough in your explanations."
+            }
+        ]
+
+        if chat_history:
+            messages.extend(chat_history)
+
+        messages.append({"role": "user", "content": f"{context}\n\nQuestion: {query}"})
+
+        return {
+            "model": self.MODEL_NAME,
+            "messages": messages,
+            "temperature": 0.2,
+            "max_tokens": 1024
+        }
+
+    def _course_code_hit(self, query: str, context_chunks: list, chat_history: list = None) -> bool:
+        """Whether the context is the exact record of the course the question names."""
+        code = self.extract_course_code(query, chat_history)
+        return code is not None and any(
+            normalize_course_code(meta.get("course")) == normalize_course_code(code) for _, meta in context_chunks
+        )
+
+    def _cascade_inputs(self, payload: dict, query: str, context_chunks: list, chat_history: list = None):
+        """Cascade inputs for a payload: (prompt tokens, course-code hit)."""
+        return messages_tokens(payload["messages"]), self._course_code_hit(query, context_chunks, chat_history)
+
+    def _error_text(self, error: Exception) -> str:
+        """User-facing message for a failed LLM call."""
+        if isinstance(error, ModelBusyError):
+            return str(error)
+        if isinstance(error, httpx.TimeoutException):
+            return "The request took too long. Please try again with a simpler question."
+        if isinstance(error, httpx.HTTPStatusError):
+            print(f"API error: {error}")
+            return "I encountered an error while processing your question. Please try again."
+        print(f"Query error: {error}")
+        return "I had trouble answering your question. Please try rephrasing it or ask about a specific course code."
+
+    def _cacheable(self, query: str, chat_history: list = None) -> bool:
+        """Whether an answer can be shared across conversations.
+
+        A follow-up that relies on earlier turns (no course code of its own but
+        prior history) would get a different answer in another conversation.
+        """
+        if not chat_history:
+            return True
+        return self.extract_course_code(query) is not None
+
+    async def _cached_answer(self, query: str, context_chunks: list, chat_history: list = None):
+        """Return (answer or None, cache key parts or None when the cache is bypassed)."""
+        # Chunk ids are provisional until the index is loaded, so they cannot key the cache yet
+        if not self._initialized or not self._cacheable(query, chat_history):
+            metrics.incr("response_cache.bypass")
+            return None, None
+        chunk_ids = [meta.get("chunk_id") for _, meta in context_chunks if meta.get("chunk_id") is not None]
+        try:
+            query_vec = await self.embed_query(query) if self.embedder is not None else None
+        except Exception as e:
+            print(f"Error embedding query for response cache: {e}")
+            query_vec = None
+        key = (query, query_vec, chunk_ids)
+        return self.response_cache.lookup(*key), key
+
     async def query_llama(self, query: str, context_chunks: list, chat_history: list = None) -> dict:
         """Query the LLM with context from retrieved chunks."""
         try:
-            context = "\n\n".join(f"Chunk: {chunk}" for chunk, meta in context_chunks)
-            
-            messages = [
-                {
-                    "role": "system", 
-                    "content": "You are a helpful academic assistant for IIT Indore (IITI) students. "
-                              "Use the following course data to answer questions accurately. "
-                              "If the information isn't in the provided context, say so clearly. "
-                              "Be concise but thorough in your explanations."
-                }
-            ]
-
-            if chat_history:
-                messages.extend(chat_history)
-
-            messages.append({"role": "user", "content": f"{context}\n\nQuestion: {query}"})
-
-            payload = {
-                "model": self.MODEL_NAME,
-                "messages": messages,
-                "temperature": 0.2,
-                "max_tokens": 1024
-            }
+            cached, cache_key = await self._cached_answer(query, context_chunks, chat_history)
+            if cached is not None:
+                return {"text": cached, "pdf_file": None}
+            payload = self.build_llama_payload(query, context_chunks, chat_history)
+            prompt_tokens, course_code_hit = self._cascade_inputs(payload, query, context_chunks, chat_history)
 
-            headers = {
-                "Authorization": f"Bearer {self.GROQ_API_KEY}",
-                "Content-Type": "application/json"
-            }
+            async def call(model: str) -> str:
+                return await self.llm.complete({**payload, "model": model}, timeout=30)
 
-            async with httpx.AsyncClient() as client:
-                response = await client.post(self.GROQ_API_URL, headers=headers, json=payload, timeout=30)
-                response.raise_for_status()
-                data = response.json()
-                return {
-                    "text": data["choices"][0]["message"]["content"].strip(),
-                    "pdf_file": None
-                }
-        except httpx.TimeoutException:
-            return {
-                "text": "The request took too long. Please try again with a simpler question.",
-                "pdf_file": None
-            }
-        except httpx.HTTPStatusError as e:
-            print(f"API error: {e}")
-            return {
-                "text": "I encountered an error while processing your question. Please try again.",
-                "pdf_file": None
-            }
+            answer = await self.cascade.run(call, "query", prompt_tokens, course_code_hit=course_code_hit,
+                                            default=self.MODEL_NAME, grounded=True)
+            if cache_key is not None:
+                self.response_cache.store(*cache_key, answer)
+            return {"text": answer, "pdf_file": None}
+        except ModelBusyError as e:
+            return {"text": str(e), "pdf_file": None, "status_code": 503}
         except Exception as e:
-            print(f"Query error: {e}")
-            return {
-                "text": "I had trouble answering your question. Please try rephrasing it or ask about a specific course code.",
-                "pdf_file": None
-            }
+            return {"text": self._error_text(e), "pdf_file": None}
+
+    async def query_llama_stream(self, query: str, context_chunks: list, chat_history: list = None):
+        """Stream the LLM answer as text deltas."""
+        started = False
+        try:
+            cached, cache_key = await self._cached_answer(query, context_chunks, chat_history)
+            if cached is not None:
+                yield cached
+                return
+            payload = self.build_llama_payload(query, context_chunks, chat_history)
+            # A streamed answer cannot be retried, so only the up-front choice applies
+            prompt_tokens, course_code_hit = self._cascade_inputs(payload, query, context_chunks, chat_history)
+            payload["model"] = self.cascade.choose(prompt_tokens, course_code_hit=course_code_hit,
+                                                   default=self.MODEL_NAME)
+            self.cascade.record_choice(payload["model"], "query")
+            parts = []
+            async for delta in self.llm.stream_completion(payload, timeout=30):
+                started = True
+                parts.append(delta)
+                yield delta
+            if cache_key is not None:
+                self.response_cache.store(*cache_key, "".join(parts).strip())
+        except Exception as e:
+            yield ("\n\n" if started else "") + self._error_text(e)
@@ -1,120 +1,166 @@
-import os
-import io
 import asyncio
-import uuid
+import re
+import unicodedata
+from typing import Callable
 import httpx
-import atexit
-from concurrent.futures import ThreadPoolExecutor
-from openai import OpenAI
 from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-import fitz
-import pytesseract
-from PIL import Image
 from core.config import Config
+from core.llm_client import GroqClient
 from utils.memory import print_memory_usage
+from utils.metrics import metrics
+from utils.tokens import estimate_tokens
+from utils import pdf_layout
+from core.rate_limiter import ModelBusyError
+from services.ocr_scheduler import OCRRejectedError, ocr_scheduler
+from services.paper_cache import PaperCache
+from services.model_cascade import ModelCascade
+
+# "Question 3", "Q.3", "Q 3", "Q3)" at the start of a line
+EXPLICIT_QUESTION_PATTERN = re.compile(r"(?im)^[ \t]*(?:question|ques\.?|q\.?)[ \t]*\d+\b")
+# "3." / "3)" at the start of a line
+NUMBERED_QUESTION_PATTERN = re.compile(r"(?m)^[ \t]*\d{1,2}[.)][ \t]+\S")
+
+# progress(stage, done=None, total=None); stages are "rendering", "ocr",
+# "generating" and "rendering_pdf"
+ProgressCallback = Callable[..., None]
+
+
+def open_pdf(pdf_source: str | bytes):
+    """Open a PDF (a fitz.Document) from a file path or from in-memory bytes."""
+    # PyMuPDF is imported on the first paper request, not at startup
+    import fitz
+    if isinstance(pdf_source, (bytes, bytearray)):
+        return fitz.open(stream=pdf_source, filetype="pdf")
+    return fitz.open(pdf_source)
+
+
+def no_progress(stage: str, done: int | None = None, total: int | None = None):
+    pass
+
 
 class QuestionPaperBot:
-    def __init__(self, groq_api_key=Config.GROQ_API_KEY):
-        self.api_key = groq_api_key
-        self.client = OpenAI(api_key=self.api_key, base_url="https://api.groq.com/openai/v1")
-        self.temp_dir = "temp"
-        os.makedirs(self.temp_dir, exist_ok=True)
-        # Thread pool for CPU-bound OCR operations
-        self._executor = ThreadPoolExecutor(max_workers=4)
-        # Register cleanup on exit
-        atexit.register(self.shutdown)
-    
-    def shutdown(self):
-        """Cleanup resources on shutdown."""
-        if self._executor:
-            self._executor.shutdown(wait=False)
-        # Clean up dummy.pdf if it exists
-        dummy_path = os.path.join(self.temp_dir, "dummy.pdf")
-        if os.path.exists(dummy_path):
+    def __init__(self, llm_client: GroqClient):
+        self.llm = llm_client
+        # Content-addressed cache of extracted text and rendered answer papers
+        self.cache = PaperCache()
+        # Short single questions can be solved by the 8B model
+        self.cascade = ModelCascade()
+
+    def _page_needs_ocr(self, text: str) -> bool:
+        """Decide whether a page's text layer is too thin or too garbled to trust."""
+        visible = [ch for ch in text if not ch.isspace()]
+        if len(visible) < Config.PDF_TEXT_MIN_CHARS:
+            return True
+        garbage = sum(
+            1 for ch in visible
+            if ch == "\ufffd" or unicodedata.category(ch).startswith("C")
+        )
+        return garbage / len(visible) > Config.PDF_TEXT_MAX_GARBAGE_RATIO
+
+    def _read_text_layer(self, pdf_source: str | bytes) -> list[str]:
+        """Read the embedded text of every page (empty for scanned pages)."""
+        with open_pdf(pdf_source) as doc:
+            return [page.get_text() for page in doc]
+
+    def _render_page(self, doc, page_index: int) -> tuple[tuple[int, int], bytes]:
+        """Rasterize one page straight into an in-memory grayscale buffer."""
+        import fitz
+
+        page = doc.load_page(page_index)
+        # Higher resolution (300 DPI) for better OCR; grayscale is all Tesseract needs
+        pix = page.get_pixmap(matrix=fitz.Matrix(300/72, 300/72), colorspace=fitz.csGRAY, alpha=False)
+        return (pix.width, pix.height), pix.samples
+
+    async def ocr_pages(self, pdf_source: str | bytes, pages: list[int],
+                        progress: ProgressCallback = no_progress) -> list[str]:
+        """OCR the given 0-based pages, overlapping rendering with OCR.
+
+        One producer renders pages into a bounded queue while consumers hand
+        them to the process-wide OCR scheduler, so at most
+        `OCR_QUEUE_DEPTH + OCR_PAGES_IN_FLIGHT` page images are held in memory
+        regardless of the page count. Nothing touches the disk.
+
+        Raises OCRRejectedError if the scheduler cannot admit the request.
+        """
+        print_memory_usage("before ocr_pages call")
+        queue: asyncio.Queue = asyncio.Queue(maxsize=Config.OCR_QUEUE_DEPTH)
+        results: dict[int, str] = {}
+        num_workers = min(Config.OCR_PAGES_IN_FLIGHT, len(pages)) or 1
+
+        async def produce():
+            doc = await asyncio.to_thread(open_pdf, pdf_source)
             try:
-                os.remove(dummy_path)
-            except Exception:
-                pass
+                for i in pages:
+                    image = await asyncio.to_thread(self._render_page, doc, i)
+                    await queue.put((i, image))
+            finally:
+                doc.close()
+                for _ in range(num_workers):
+                    await queue.put(None)
 
-    async def pdf_to_images(self, pdf_path: str, session_id: str) -> int:
-        """Convert PDF pages to images for OCR."""
-        print_memory_usage("before pdf_to_images call")
-        
-        try:
-            doc = fitz.open(pdf_path)
-            num_pages = len(doc)
-            
-            for i in range(num_pages):
-                page = doc.load_page(i)
-                # Higher resolution (300 DPI) for better OCR
-                pix = page.get_pixmap(matrix=fitz.Matrix(300/72, 300/72))
-                # Use session_id to prevent collisions between concurrent requests
-                path = os.path.join(self.temp_dir, f"{session_id}_Page_{i+1}.jpg")
-                pix.save(path)
-                print(f"Saved: {path}")
-            
-            doc.close()
-            print_memory_usage("after pdf_to_images call")
-            return num_pages
-        except Exception as e:
-            print(f"Error converting PDF to images: {e}")
-            raise
+        async def consume(ticket):
+            while (item := await queue.get()) is not None:
+                i, (size, samples) = item
+                try:
+                    results[i] = await ticket.ocr(size, samples)
+                except Exception as e:
+                    print(f"OCR error on page {i + 1}: {e}")
+                    results[i] = ""
+                progress("ocr", len(results), len(pages))
 
-    def _ocr_single_image(self, image_path: str) -> str:
-        """Synchronous OCR for a single image - runs in thread pool."""
-        try:
-            image = Image.open(image_path)
-            text = pytesseract.image_to_string(image)
-            image.close()
-            return text
-        except Exception as e:
-            print(f"OCR error for {image_path}: {e}")
-            return ""
+        async with ocr_scheduler.request(len(pages)) as ticket:
+            progress("ocr", 0, len(pages))
+            tasks = [asyncio.create_task(produce())] + [
+                asyncio.create_task(consume(ticket)) for _ in range(num_workers)
+            ]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
 
-    async def extract_text(self, num_pages: int, session_id: str) -> str:
-        """Extract text from converted images using OCR."""
-        print_memory_usage("before extract_text call")
-        
-        loop = asyncio.get_event_loop()
-        tasks = []
-        
-        for i in range(num_pages):
-            path = os.path.join(self.temp_dir, f"{session_id}_Page_{i+1}.jpg")
-            # Run OCR in thread pool to avoid blocking async event loop
-            task = loop.run_in_executor(self._executor, self._ocr_single_image, path)
-            tasks.append(task)
-        
-        texts = await asyncio.gather(*tasks)
-        text = "\n".join(texts)
-        
-        print_memory_usage("after extract_text call")
-        return text
+        print_memory_usage("after ocr_pages call")
+        return [results.get(i, "") for i in pages]
+
+    async def extract_pdf_text(self, pdf_source: str | bytes,
+                               progress: ProgressCallback = no_progress) -> tuple[str, list[dict]]:
+        """Extract a PDF's text, using the embedded text layer and OCR only where needed.
+
+        Returns the joined text and a per-page report of which path was used.
+        """
+        progress("rendering")
+        texts = await asyncio.to_thread(self._read_text_layer, pdf_source)
+        ocr_pages = [i for i, text in enumerate(texts) if self._page_needs_ocr(text)]
+
+        if ocr_pages:
+            for i, text in zip(ocr_pages, await self.ocr_pages(pdf_source, ocr_pages, progress)):
+                texts[i] = text
 
-    async def _query_groq(self, prompt: str) -> str:
+        report = [
+            {"page": i + 1, "method": "ocr" if i in ocr_pages else "text", "chars": len(text.strip())}
+            for i, text in enumerate(texts)
+        ]
+        metrics.incr("pdf.pages_text_layer", len(texts) - len(ocr_pages))
+        metrics.incr("pdf.pages_ocr", len(ocr_pages))
+        print(f"PDF text extraction: {len(texts) - len(ocr_pages)} page(s) from text layer, "
+              f"{len(ocr_pages)} page(s) via OCR {[r['page'] for r in report if r['method'] == 'ocr']}")
+        return "\n".join(texts), report
+
+    async def _query_groq(self, prompt: str, model: str = Config.GROQ_VERSATILE_MODEL) -> str:
         """Query Groq API for text generation."""
         payload = {
-            "model": Config.GROQ_VERSATILE_MODEL,
+            "model": model,
             "messages": [{"role": "user", "content": prompt}],
             "temperature": 0.7,
             "max_tokens": 4096
         }
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://api.groq.com/openai/v1/chat/completions", 
-                    headers=headers, 
-                    json=payload, 
-                    timeout=120
-                )
-                response.raise_for_status()
-                data = response.json()
-                return data["choices"][0]["message"]["content"].strip()
+            return await self.llm.complete(payload, timeout=120, lane="background")
+        except ModelBusyError:
+            raise
         except httpx.TimeoutException:
             raise Exception("Request timed out. Please try with a smaller document.")
         except httpx.HTTPStatusError as e:
@@ -122,8 +168,84 @@ class QuestionPaperBot:
         except Exception as e:
             raise Exception(f"Failed to generate response: {str(e)}")
 
-    async def generate_ans_paper_text(self, raw_text: str) -> str:
-        """Generate answers/solutions for questions extracted from PDF."""
+    def split_into_questions(self, text: str) -> tuple[str, list[str]]:
+        """Split paper text into (preamble, question blocks).
+
+        Explicit markers ("Question 3", "Q.3", "Q3)") are preferred; bare
+        numbering ("3." / "3)") at the start of a line is only used when fewer
+        than two explicit markers are found, since it also matches sub-items.
+        """
+        for pattern in (EXPLICIT_QUESTION_PATTERN, NUMBERED_QUESTION_PATTERN):
+            starts = [m.start() for m in pattern.finditer(text)]
+            if len(starts) >= 2:
+                preamble = text[:starts[0]].strip()
+                blocks = [text[a:b].strip() for a, b in zip(starts, starts[1:] + [len(text)])]
+                return preamble, [block for block in blocks if block]
+        return text.strip(), []
+
+    @staticmethod
+    def count_single_question(text: str) -> int:
+        """Question count for a paper `split_into_questions` could not split.
+
+        One explicit marker ("Question 1") is one question. Without any the
+        count is unknown (0), and the cascade decides by prompt length alone.
+        """
+        return 1 if EXPLICIT_QUESTION_PATTERN.search(text) else 0
+
+    def batch_questions(self, blocks: list[str]) -> list[list[str]]:
+        """Group consecutive question blocks into batches bounded by count and size."""
+        batches, current, current_chars = [], [], 0
+        for block in blocks:
+            if current and (len(current) >= Config.PAPER_BATCH_MAX_QUESTIONS
+                            or current_chars + len(block) > Config.PAPER_BATCH_MAX_CHARS):
+                batches.append(current)
+                current, current_chars = [], 0
+            current.append(block)
+            current_chars += len(block)
+        if current:
+            batches.append(current)
+        return batches
+
+    async def generate_ans_paper_text(self, raw_text: str, progress: ProgressCallback = no_progress) -> str:
+        """Generate answers/solutions for questions extracted from PDF.
+
+        Papers with several detected questions are solved in batches by
+        parallel Groq calls (at most PAPER_SOLVE_CONCURRENCY at a time) and the
+        answers are merged back in question order, so wall-clock time follows
+        the slowest batch rather than the paper length.
+        """
+        preamble, blocks = self.split_into_questions(raw_text)
+        batches = self.batch_questions(blocks)
+        if len(batches) <= 1:
+            progress("generating")
+            return await self._solve_questions_text(raw_text, len(blocks) or self.count_single_question(raw_text))
+
+        print(f"Solving {len(blocks)} questions in {len(batches)} batches")
+        metrics.observe("paper.solve_batches", len(batches))
+        semaphore = asyncio.Semaphore(Config.PAPER_SOLVE_CONCURRENCY)
+        solved = 0
+        progress("generating", 0, len(batches))
+
+        async def solve(batch: list[str]) -> str:
+            nonlocal solved
+            # Keep the paper header (instructions, marks scheme) as context for every batch
+            batch_text = "\n\n".join(([preamble] if preamble else []) + batch)
+            async with semaphore:
+                answer = await self._solve_questions_text(batch_text, len(batch))
+            solved += 1
+            progress("generating", solved, len(batches))
+            return answer
+
+        answers = await asyncio.gather(*(solve(batch) for batch in batches))
+        return "\n\n".join(answer.strip() for answer in answers)
+
+    async def _solve_questions_text(self, raw_text: str, num_questions: int = 0) -> str:
+        """Solve every question in `raw_text` with a single Groq call.
+
+        The model cascade picks the 8B model for short prompts with at most
+        CASCADE_MAX_SMALL_QUESTIONS questions (escalating weak answers) and the
+        70B model otherwise; `num_questions` is 0 when the count is unknown.
+        """
         prompt = f"""You are an expert academic solution generator.
 
 Your task is to:
@@ -157,7 +279,10 @@ Now, here is the question paper text:
 {raw_text}
 
 Give your output in the same format as the input."""
-        return await self._query_groq(prompt)
+        return await self.cascade.run(
+            lambda model: self._query_groq(prompt, model), "paper", estimate_tokens(prompt),
+            num_questions=num_questions, default=Config.GROQ_VERSATILE_MODEL
+        )
 
     async def generate_question_paper_text(self, raw_text: str) -> str:
         """Generate a similar question paper based on the input."""
@@ -175,95 +300,44 @@ Give your output in the same format as the input."""
         return await self._query_groq(prompt)
 
     def text_to_formatted_pdf(self, text: str, filename: str = "generated_pdf.pdf") -> dict:
-        """Convert text to a formatted PDF document."""
+        """Convert text to a formatted PDF document (rendered in memory)."""
         print_memory_usage("before text_to_formatted_pdf call")
-        
-        buffer = io.BytesIO()
-        c = canvas.Canvas(buffer, pagesize=A4)
-        width, height = A4
-        x_margin = 50
-        y = height - 50
-        line_height = 14
-        font_size = 11
-
-        initial_lines = text.split('\n')
-        lines = self.split_lines_to_fit_page(initial_lines)
-
-        for i, line in enumerate(lines):
-            clean_line = line.strip()
-            if i < 5 and clean_line:
-                c.setFont("Times-Bold", 14)
-                text_width = c.stringWidth(clean_line, "Times-Bold", 14)
-                c.drawString((width - text_width) / 2, y, clean_line)
-                y -= line_height
-            elif any(clean_line.lower().startswith(p) for p in ["part", "section", "instructions", "questions", "question", "solution"]):
-                c.setFont("Times-Bold", 12)
-                c.drawString(x_margin, y, clean_line)
-                y -= line_height
-            elif clean_line == "":
-                y -= line_height // 2
-            else:
-                c.setFont("Times-Roman", font_size)
-                c.drawString(x_margin, y, clean_line)
-                y -= line_height
-
-            if y < 50:
-                c.showPage()
-                y = height - 50
-                c.setFont("Times-Roman", font_size)
-
-        c.save()
-        buffer.seek(0)
+        lines = self.split_lines_to_fit_page(text.split('\n'))
+        buffer = pdf_layout.render_lines(lines)
         print_memory_usage("after text_to_formatted_pdf call")
         return {"text": lines, "pdf_file": buffer}
 
-    def wrap_text(self, text: str, canvas_obj, font_name: str, font_size: int, max_width: float) -> list:
+    def wrap_text(self, text: str, font_name: str, font_size: int, max_width: float) -> list:
         """Wrap text to fit within a given width."""
-        words = text.split()
-        lines = []
-        current_line = ""
-        for word in words:
-            test_line = f"{current_line} {word}".strip()
-            if canvas_obj.stringWidth(test_line, font_name, font_size) <= max_width:
-                current_line = test_line
-            else:
-                lines.append(current_line)
-                current_line = word
-        if current_line:
-            lines.append(current_line)
-        return lines
+        return pdf_layout.wrap_text(text, font_name, font_size, max_width)
 
     def split_lines_to_fit_page(self, lines: list, font_name: str = "Times-Roman", font_size: int = 11, page_size=A4, margin: int = 50) -> list:
         """Split lines to fit within page width."""
-        dummy_canvas = canvas.Canvas(os.path.join(self.temp_dir, "dummy.pdf"))
-        page_width, _ = page_size
-        usable_width = page_width - 2 * margin
-        fitted_lines = []
-        for line in lines:
-            if line.strip() == "":
-                fitted_lines.append("")
-            else:
-                wrapped = self.wrap_text(line, dummy_canvas, font_name, font_size, usable_width)
-                fitted_lines.extend(wrapped)
-        return fitted_lines
-
-    def _cleanup_temp_images(self, num_pages: int, session_id: str):
-        """Clean up temporary image files for a specific session."""
-        for i in range(num_pages):
-            path = os.path.join(self.temp_dir, f"{session_id}_Page_{i+1}.jpg")
-            try:
-                if os.path.exists(path):
-                    os.remove(path)
-            except Exception as e:
-                print(f"Error cleaning up {path}: {e}")
-
-    async def generate_question_paper(self, pdf_path: str) -> dict:
-        """Generate a similar question paper from uploaded PDF."""
-        num_pages = 0
-        session_id = str(uuid.uuid4())  # Unique ID for this request
+        return pdf_layout.fit_lines(lines, font_name, font_size, page_size, margin)
+
+    async def _get_paper_text(self, pdf_source: str | bytes, digest: str, use_cache: bool = True,
+                              progress: ProgressCallback = no_progress) -> str:
+        """Extracted text for a file, served from the content-addressed cache when allowed."""
+        if use_cache:
+            cached = await self.cache.get_text(digest)
+            if cached is not None:
+                return cached
+        text, _ = await self.extract_pdf_text(pdf_source, progress)
+        if text.strip():
+            await self.cache.put_text(digest, text)
+        return text
+
+    async def generate_question_paper(self, pdf_source: str | bytes,
+                                      reuse_cached_text: bool = Config.PAPER_CACHE_REUSE_TEXT_FOR_GENERATE,
+                                      progress: ProgressCallback = no_progress) -> dict:
+        """Generate a similar question paper from uploaded PDF.
+
+        The generated questions are always fresh; only the extracted text may
+        come from the cache.
+        """
         try:
-            num_pages = await self.pdf_to_images(pdf_path, session_id)
-            text = await self.extract_text(num_pages, session_id)
+            digest = await asyncio.to_thread(self.cache.digest_source, pdf_source)
+            text = await self._get_paper_text(pdf_source, digest, use_cache=reuse_cached_text, progress=progress)
             
             if not text.strip():
                 return {
@@ -271,25 +345,27 @@ Give your output in the same format as the input."""
                     "pdf_file": None
                 }
             
+            progress("generating")
             generated_text = await self.generate_question_paper_text(text)
+            progress("rendering_pdf")
             return self.text_to_formatted_pdf(generated_text)
+        except (OCRRejectedError, ModelBusyError) as e:
+            return {"text": str(e), "pdf_file": None, "status_code": 503}
         except Exception as e:
             print(f"Error generating question paper: {e}")
             return {
                 "text": f"I encountered an error while processing your question paper: {str(e)}\n\nPlease try again with a different file or a clearer scan.",
                 "pdf_file": None
             }
-        finally:
-            if num_pages > 0:
-                self._cleanup_temp_images(num_pages, session_id)
-
-    async def generate_ans_paper(self, pdf_path: str) -> dict:
-        """Generate solutions for questions from uploaded PDF."""
-        num_pages = 0
-        session_id = str(uuid.uuid4())  # Unique ID for this request
+
+    async def generate_ans_paper(self, pdf_source: str | bytes, progress: ProgressCallback = no_progress) -> dict:
+        """Generate solutions for questions from uploaded PDF (cached per file content)."""
         try:
-            num_pages = await self.pdf_to_images(pdf_path, session_id)
-            text = await self.extract_text(num_pages, session_id)
+            digest = await asyncio.to_thread(self.cache.digest_source, pdf_source)
+            cached = await self.cache.get_result(digest, "answer")
+            if cached is not None:
+                return cached
+            text = await self._get_paper_text(pdf_source, digest, progress=progress)
             
             if not text.strip():
                 return {
@@ -297,14 +373,16 @@ Give your output in the same format as the input."""
                     "pdf_file": None
                 }
             
-            generated_text = await self.generate_ans_paper_text(text)
-            return self.text_to_formatted_pdf(generated_text)
+            generated_text = await self.generate_ans_paper_text(text, progress)
+            progress("rendering_pdf")
+            result = self.text_to_formatted_pdf(generated_text)
+            await self.cache.put_result(digest, "answer", result)
+            return result
+        except (OCRRejectedError, ModelBusyError) as e:
+            return {"text": str(e), "pdf_file": None, "status_code": 503}
         except Exception as e:
             print(f"Error generating answer paper: {e}")
             return {
                 "text": f"I encountered an error while solving your questions: {str(e)}\n\nPlease try again with a different file or a clearer scan.",
                 "pdf_file": None
             }
-        finally:
-            if num_pages > 0:
-                self._cleanup_temp_images(num_pages, session_id)
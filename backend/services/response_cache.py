@@ -0,0 +1,107 @@
+import time
+from collections import OrderedDict
+import numpy as np
+from core.config import Config
+from utils.metrics import metrics
+
+class ResponseCache:
+    """Two-tier cache of LLM answers to academic queries.
+
+    Entries are keyed by the normalized question and the set of retrieved
+    chunk ids. The exact tier matches both; the semantic tier reuses an answer
+    whose question embedding is within `similarity_threshold` (cosine) of the
+    new one and that was answered from the same chunks. Entries expire after
+    `ttl` seconds and the least recently used ones are evicted beyond
+    `max_size`.
+    """
+
+    def __init__(self,
+                 max_size: int = Config.RESPONSE_CACHE_SIZE,
+                 ttl: float = Config.RESPONSE_CACHE_TTL,
+                 similarity_threshold: float = Config.RESPONSE_CACHE_SIMILARITY):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        # (chunk_key, question) -> (expires_at, unit vector, answer)
+        self._entries: OrderedDict = OrderedDict()
+        # chunk_key -> set of questions, so the semantic tier only scans answers from the same chunks
+        self._by_chunks: dict[tuple, set] = {}
+
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        return " ".join(question.lower().split())
+
+    @staticmethod
+    def chunk_key(chunk_ids) -> tuple:
+        return tuple(sorted(int(i) for i in chunk_ids))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, question: str, query_vec, chunk_ids) -> str | None:
+        chunk_key = self.chunk_key(chunk_ids)
+        question = self.normalize_question(question)
+        now = time.monotonic()
+
+        entry = self._entries.get((chunk_key, question))
+        if entry is not None and entry[0] > now:
+            self._entries.move_to_end((chunk_key, question))
+            metrics.incr("response_cache.exact_hits")
+            return entry[2]
+
+        if query_vec is not None:
+            unit = self._unit(query_vec)
+            best_key, best_score = None, self.similarity_threshold
+            for other in list(self._by_chunks.get(chunk_key, ())):
+                expires_at, vec, _ = self._entries[(chunk_key, other)]
+                if expires_at <= now:
+                    self._remove((chunk_key, other))
+                    continue
+                if vec is None:
+                    continue
+                score = float(vec @ unit)
+                if score >= best_score:
+                    best_key, best_score = (chunk_key, other), score
+            if best_key is not None:
+                self._entries.move_to_end(best_key)
+                metrics.incr("response_cache.semantic_hits")
+                return self._entries[best_key][2]
+
+        metrics.incr("response_cache.misses")
+        return None
+
+    def store(self, question: str, query_vec, chunk_ids, answer: str):
+        if self.max_size <= 0 or not answer:
+            return
+        key = (self.chunk_key(chunk_ids), self.normalize_question(question))
+        vec = self._unit(query_vec) if query_vec is not None else None
+        self._entries[key] = (time.monotonic() + self.ttl, vec, answer)
+        self._entries.move_to_end(key)
+        if vec is not None:
+            self._by_chunks.setdefault(key[0], set()).add(key[1])
+        else:
+            # Re-stored without a vector: the semantic tier must stop scanning it
+            self._discard_semantic(key)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+            metrics.incr("response_cache.evictions")
+
+    def clear(self):
+        self._entries.clear()
+        self._by_chunks.clear()
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        self._discard_semantic(key)
+
+    def _discard_semantic(self, key):
+        questions = self._by_chunks.get(key[0])
+        if questions is not None:
+            questions.discard(key[1])
+            if not questions:
+                del self._by_chunks[key[0]]
+
+    @staticmethod
+    def _unit(vec) -> np.ndarray:
+        vec = np.asarray(vec, dtype=np.float32).reshape(-1)
+        return vec / (np.linalg.norm(vec) or 1.0)
@@ -1,30 +1,159 @@
-import httpx
-import os
-import json
+import asyncio
+import importlib
+import time
+from datetime import datetime, timezone
 from core.config import Config
+from core.llm_client import GroqClient
+from core.rate_limiter import ModelBusyError
 from services.query_bot import QueryBot
 from services.question_bot import QuestionPaperBot
 from services.scheduler_bot import Scheduler
 from services.history import ChatHistoryManager
+from services.history_compactor import HistoryCompactor
+from services.curriculum_watcher import CurriculumWatcher
+from services.intent_classifier import IntentClassifier
+from services.model_cascade import ModelCascade
+from utils.pipeline import StageGraph
+from utils.metrics import metrics
+from utils.tokens import messages_tokens
+
+# Imported lazily by the paper pipeline; loaded once retrieval is up so the first upload does not pay for them
+PDF_MODULES = ("fitz", "reportlab.pdfgen.canvas", "reportlab.pdfbase.pdfmetrics")
+
+WARMING_UP_TEXT = (
+    "I'm still loading the course search index, so I can only look up specific course codes right now. "
+    "Please mention a course code (e.g., EE101, CS202) or try again in a moment."
+)
+
+GENERAL_FALLBACK_TEXT = (
+    "Hello! I'm NEXUS, your AI academic tutor. I can help you with course information, "
+    "study schedules, and question papers. How can I assist you today?"
+)
 
 class RouterAgent:
-    def __init__(self, db, groq_api_key=Config.GROQ_API_KEY, model=Config.GROQ_MODEL):
-        self.api_key = groq_api_key
-        self.api_url = "https://api.groq.com/openai/v1/chat/completions"
+    def __init__(self, db, llm_client: GroqClient, model=Config.GROQ_MODEL):
+        self.llm = llm_client
         self.model = model
         self.db = db
         self.history_manager = ChatHistoryManager(db)
+        self.compactor = HistoryCompactor(db, llm_client)
         
-        # Bots
-        self.query_bot = QueryBot(groq_api_key=groq_api_key)
-        self.question_bot = QuestionPaperBot(groq_api_key=groq_api_key)
-        self.scheduler_bot = Scheduler(api_key=groq_api_key)
+        # Bots share the pooled Groq client
+        self.query_bot = QueryBot(llm_client)
+        self.question_bot = QuestionPaperBot(llm_client)
+        self.scheduler_bot = Scheduler(llm_client)
+        # Picks the 8B or 70B model for general conversation
+        self.cascade = ModelCascade()
+
+        # Local classifier that lets most prompts skip the Groq routing call
+        self.intent_classifier = IntentClassifier()
+
+        # Keeps the QueryBot index in sync with curriculum edits
+        self.curriculum_watcher = CurriculumWatcher(db, self.query_bot)
+
+        # Fire-and-forget tasks (e.g. assistant message writes) kept alive until done
+        self._background_tasks: set[asyncio.Task] = set()
+
+        # "pending" until initialize_bots() runs, then "warming_up" and "done", or "failed"
+        # between attempts and after the last one; warmup_error holds the latest failure
+        self.warmup_status = "pending"
+        self.warmup_attempts = 0
+        self.warmup_error: str | None = None
+
+    @property
+    def ready(self) -> bool:
+        """Whether warm-up has finished and semantic retrieval is available."""
+        return self.warmup_status == "done" and self.query_bot.ready
+
+    async def initialize_bots(self, max_attempts: int = Config.STARTUP_WARMUP_MAX_ATTEMPTS,
+                              backoff_base: float = Config.STARTUP_WARMUP_BACKOFF_BASE,
+                              backoff_max: float = Config.STARTUP_WARMUP_BACKOFF_MAX):
+        """Create indexes, load the embedding model and index and start background services.
+
+        Requests are served while this runs (see STARTUP_BACKGROUND_WARMUP):
+        routing falls back to Groq until the local classifier is fitted and
+        the query bot answers what it can without semantic search. A failed
+        attempt is reported as "failed" and retried with exponential backoff;
+        the last failure is raised once `max_attempts` (0 = unlimited) is used up.
+        """
+        started = time.perf_counter()
+        while True:
+            self.warmup_status = "warming_up"
+            self.warmup_attempts += 1
+            try:
+                await self._warm_up()
+                break
+            except Exception as e:
+                self.warmup_status = "failed"
+                self.warmup_error = f"{type(e).__name__}: {e}"
+                metrics.incr("startup.warmup_failures")
+                if max_attempts and self.warmup_attempts >= max_attempts:
+                    raise
+                delay = min(backoff_max, backoff_base * 2 ** (self.warmup_attempts - 1))
+                print(f"Warm-up attempt {self.warmup_attempts} failed ({self.warmup_error}); retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+        self.warmup_status = "done"
+        self.warmup_error = None
+        metrics.set_gauge("startup.warmup_ms", round((time.perf_counter() - started) * 1000, 1))
+
+    async def _warm_up(self):
+        """One warm-up attempt; every step is safe to repeat after a failure."""
+        await self.history_manager.start()
+        await self.compactor.ensure_indexes()
+        if not self.query_bot.ready:
+            await self.query_bot.initialize(self.db)
+        if Config.INTENT_CLASSIFIER_ENABLED and not self.intent_classifier.ready:
+            await asyncio.to_thread(self.intent_classifier.fit, self.query_bot.model)
+            print("Local intent classifier ready")
+        if Config.CURRICULUM_WATCH_ENABLED:
+            self.curriculum_watcher.start()
+        await asyncio.to_thread(self._preload_modules, PDF_MODULES)
+
+    @staticmethod
+    def _preload_modules(names: tuple[str, ...]):
+        for name in names:
+            try:
+                importlib.import_module(name)
+            except ImportError as e:
+                print(f"Could not preload {name}: {e}")
+
+    async def shutdown(self):
+        """Stop the curriculum watcher, wait for pending background writes and flush history."""
+        await self.curriculum_watcher.stop()
+        await self.query_bot.shutdown()
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        await self.compactor.close()
+        # Background tasks save messages, so flush the history buffer last
+        await self.history_manager.close()
+
+    def _run_in_background(self, coro, description: str):
+        """Schedule a coroutine off the response path and report its failure."""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
 
-    async def initialize_bots(self):
-        await self.query_bot.initialize(self.db)
+        def _on_done(t: asyncio.Task):
+            self._background_tasks.discard(t)
+            if not t.cancelled() and t.exception() is not None:
+                print(f"Background task failed ({description}): {t.exception()}")
+
+        task.add_done_callback(_on_done)
+        return task
 
     async def classify_prompt(self, user_prompt: str) -> str:
-        """Classify user prompt into one of the bot categories."""
+        """Classify user prompt, using the local classifier when it is confident."""
+        if self.intent_classifier.ready:
+            try:
+                query_vec = await self.query_bot.embed_query(user_prompt)
+                label, confidence = self.intent_classifier.predict_vector(query_vec)
+                if confidence >= self.intent_classifier.threshold:
+                    return label
+            except Exception as e:
+                print(f"Local classification error: {e}")
+        return await self.classify_prompt_llm(user_prompt)
+
+    async def classify_prompt_llm(self, user_prompt: str) -> str:
+        """Classify user prompt into one of the bot categories using Groq."""
         system_prompt = (
             "You are an intelligent routing assistant for NEXUS, an AI academic tutor for IITI students. "
             "Classify the user's prompt into exactly one of the following categories:\n\n"
@@ -68,32 +197,19 @@ class RouterAgent:
             "max_tokens": 10
         }
 
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(self.api_url, headers=headers, json=payload, timeout=20)
-                response.raise_for_status()
-                data = response.json()
-                classification = data["choices"][0]["message"]["content"].strip().lower()
-                # Validate classification
-                valid_categories = ["general", "questionpaper", "scheduler", "query"]
-                if classification not in valid_categories:
-                    return "general"  # Default to general for unrecognized classifications
-                return classification
+            classification = (await self.llm.complete(payload, timeout=20, lane="routing")).lower()
+            # Validate classification
+            valid_categories = ["general", "questionpaper", "scheduler", "query"]
+            if classification not in valid_categories:
+                return "general"  # Default to general for unrecognized classifications
+            return classification
         except Exception as e:
             print(f"Classification error: {e}")
             return "general"  # Default to general on error
 
     async def classify_question_action(self, prompt: str) -> str:
         """Determine if user wants to solve or generate questions."""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
         classification_prompt = f"""
         Analyze the user's prompt and determine if they want to:
         1. "answer" - Solve the questions, provide solutions, explain answers, or "solve" the paper.
@@ -115,19 +231,14 @@ class RouterAgent:
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(self.api_url, headers=headers, json=payload, timeout=20)
-                response.raise_for_status()  # Fixed: Was missing this
-                data = response.json()
-                action = data["choices"][0]["message"]["content"].strip().lower()
-                print(f"DEBUG: PDF Action Classification for '{prompt}' -> {action}")
-                return action
+            action = (await self.llm.complete(payload, timeout=20, lane="routing")).lower()
+            print(f"DEBUG: PDF Action Classification for '{prompt}' -> {action}")
+            return action
         except Exception as e:
             print(f"Question action classification error: {e}")
             return "answer"  # Default to answer on error
 
-    async def handle_general_query(self, user_prompt: str, chat_history: list = None) -> dict:
-        """Handle general conversation, greetings, help requests, etc."""
+    def _build_general_payload(self, user_prompt: str, chat_history: list = None) -> dict:
         system_prompt = """You are NEXUS, a friendly and helpful AI academic tutor for the IIT Indore (IITI) community.
 
 Your capabilities include:
@@ -154,49 +265,171 @@ You are specifically designed for IITI students, so be aware of their academic c
             "temperature": 0.7,
             "max_tokens": 500
         }
+        return payload
 
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+    async def handle_general_query(self, user_prompt: str, chat_history: list = None) -> dict:
+        """Handle general conversation, greetings, help requests, etc."""
+        try:
+            payload = self._build_general_payload(user_prompt, chat_history)
+
+            async def call(model: str) -> str:
+                return await self.llm.complete({**payload, "model": model}, timeout=20)
+
+            text = await self.cascade.run(call, "general", messages_tokens(payload["messages"]), default=self.model)
+            return {"text": text, "pdf_file": None}
+        except ModelBusyError as e:
+            return {"text": str(e), "pdf_file": None, "status_code": 503}
+        except Exception as e:
+            print(f"General query error: {e}")
+            return {"text": GENERAL_FALLBACK_TEXT, "pdf_file": None}
 
+    async def handle_general_query_stream(self, user_prompt: str, chat_history: list = None):
+        """Stream a general conversation reply as text deltas."""
+        started = False
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(self.api_url, headers=headers, json=payload, timeout=20)
-                response.raise_for_status()
-                data = response.json()
-                return {
-                    "text": data["choices"][0]["message"]["content"].strip(),
-                    "pdf_file": None
-                }
+            payload = self._build_general_payload(user_prompt, chat_history)
+            # A streamed answer cannot be retried, so only the up-front choice applies
+            payload["model"] = self.cascade.choose(messages_tokens(payload["messages"]), default=self.model)
+            self.cascade.record_choice(payload["model"], "general")
+            async for delta in self.llm.stream_completion(payload, timeout=20):
+                started = True
+                yield delta
+        except ModelBusyError as e:
+            yield ("\n\n" if started else "") + str(e)
         except Exception as e:
             print(f"General query error: {e}")
-            return {
-                "text": "Hello! I'm NEXUS, your AI academic tutor. I can help you with course information, study schedules, and question papers. How can I assist you today?",
-                "pdf_file": None
-            }
-
-    async def route(self, user_prompt: str, user_id: str, conversation_id: str, file_path=None):
-        """Route the user query to the appropriate bot."""
-        query_type = await self.classify_prompt(user_prompt)
-        chat_history = await self.history_manager.load_history(user_id, conversation_id)
-        
-        await self.history_manager.save_message(user_id, conversation_id, "user", user_prompt)
-        
+            if not started:
+                yield GENERAL_FALLBACK_TEXT
+
+    async def route(self, user_prompt: str, user_id: str, conversation_id: str, pdf_source=None, stream: bool = False):
+        """Route the user query to the appropriate bot.
+
+        Classification, history load and the user-message write are independent,
+        so they run concurrently; the bot dispatch waits only for the first two.
+
+        With `stream=True`, text answers from the general, scheduler and query
+        bots are returned as {"stream": <async iterator of text deltas>}; the
+        full text is saved to history once the stream completes. PDF results
+        are never streamed.
+
+        `pdf_source` is the uploaded PDF, either in memory (bytes) or spooled
+        to a temp file (path).
+        """
+        # History is loaded strictly before this turn so the concurrent write of
+        # the user message can never show up in it.
+        turn_started = datetime.now(timezone.utc)
+
+        async def classify():
+            return await self.classify_prompt(user_prompt)
+
+        async def history():
+            return await self.history_manager.load_history(user_id, conversation_id, before=turn_started,
+                                                           include_timestamps=True)
+
+        async def save_user():
+            await self.history_manager.save_message(user_id, conversation_id, "user", user_prompt,
+                                                    timestamp=turn_started)
+
+        async def dispatch(classify, history):
+            return await self._dispatch(classify, user_prompt, history, pdf_source, stream,
+                                        user_id=user_id, conversation_id=conversation_id)
+
+        graph = (
+            StageGraph()
+            .add("classify", classify)
+            .add("history", history)
+            .add("save_user", save_user)
+            .add("dispatch", dispatch, deps=("classify", "history"))
+        )
+        result = (await graph.run())["dispatch"]
+
+        if result and result.get("stream") is not None:
+            result["stream"] = self._stream_and_save(result["stream"], user_id, conversation_id, turn_started)
+            return result
+
+        # Save bot response to history without holding up the response
+        if result and result.get("text"):
+            text_to_save = result["text"]
+            if isinstance(text_to_save, list):
+                text_to_save = "\n".join(text_to_save)
+            self._run_in_background(
+                self.history_manager.save_message(user_id, conversation_id, "assistant", text_to_save),
+                "save assistant message"
+            )
+
+        return result
+
+    async def run_question_paper_job(self, job: dict, progress) -> dict:
+        """Solve or regenerate an uploaded paper for a background job, recording the turn in history.
+
+        `job["action"]` ("answer" / "generate") skips the action classifier when given.
+        """
+        user_id, conversation_id, prompt = job["user_id"], job["conversation_id"], job["prompt"]
+        pdf_source = job["pdf_source"]
+        await self.history_manager.save_message(user_id, conversation_id, "user", prompt)
+
+        action = job.get("action") or await self.classify_question_action(prompt)
+        if "answer" in action or "solve" in action:
+            result = await self.question_bot.generate_ans_paper(pdf_source, progress=progress)
+        else:
+            result = await self.question_bot.generate_question_paper(pdf_source, progress=progress)
+
+        if result and result.get("text"):
+            text_to_save = result["text"]
+            if isinstance(text_to_save, list):
+                text_to_save = "\n".join(text_to_save)
+            self._run_in_background(
+                self.history_manager.save_message(user_id, conversation_id, "assistant", text_to_save),
+                "save assistant message"
+            )
+        return result
+
+    async def _stream_and_save(self, deltas, user_id: str, conversation_id: str, turn_started: datetime):
+        """Forward text deltas and persist the full reply once the stream finishes."""
+        parts = []
+        first = True
+        try:
+            async for delta in deltas:
+                if first:
+                    elapsed = (datetime.now(timezone.utc) - turn_started).total_seconds()
+                    metrics.observe("route.stream_ttft_ms", elapsed * 1000)
+                    first = False
+                parts.append(delta)
+                yield delta
+        finally:
+            text_to_save = "".join(parts)
+            if text_to_save:
+                self._run_in_background(
+                    self.history_manager.save_message(user_id, conversation_id, "assistant", text_to_save),
+                    "save streamed assistant message"
+                )
+
+    async def _dispatch(self, query_type: str, user_prompt: str, chat_history: list, pdf_source=None,
+                        stream: bool = False, user_id: str = None, conversation_id: str = None) -> dict:
+        """Run the bot selected by the classifier.
+
+        `chat_history` carries message timestamps; it is fitted to the bot's
+        token budget before it goes into a prompt.
+        """
         result = None
         
         # Handle general conversation
         if query_type == "general":
-            result = await self.handle_general_query(user_prompt, chat_history)
+            chat_history = await self.compactor.fit(user_id, conversation_id, chat_history,
+                                                    Config.HISTORY_TOKEN_BUDGET_GENERAL, "general")
+            if stream:
+                result = {"stream": self.handle_general_query_stream(user_prompt, chat_history), "pdf_file": None}
+            else:
+                result = await self.handle_general_query(user_prompt, chat_history)
         
         # Handle question paper requests
         elif query_type == "questionpaper":
-            if file_path:
+            if pdf_source:
                 action = await self.classify_question_action(user_prompt)
                 if "answer" in action or "solve" in action:
-                    result = await self.question_bot.generate_ans_paper(file_path)
+                    result = await self.question_bot.generate_ans_paper(pdf_source)
                 else:
-                    result = await self.question_bot.generate_question_paper(file_path)
+                    result = await self.question_bot.generate_question_paper(pdf_source)
             else:
                 # No file provided - give helpful message
                 result = {
@@ -211,13 +444,32 @@ You are specifically designed for IITI students, so be aware of their academic c
         
         # Handle scheduler requests
         elif query_type == "scheduler":
-            result = await self.scheduler_bot.run_scheduler(user_prompt)
+            if stream:
+                result = {"stream": self.scheduler_bot.run_scheduler_stream(user_prompt), "pdf_file": None}
+            else:
+                result = await self.scheduler_bot.run_scheduler(user_prompt)
         
         # Handle academic queries (default)
+        elif (direct := self.query_bot.answer_field_lookup(user_prompt)) is not None:
+            # Single-field lookups are rendered straight from the course record
+            result = direct
+
         else:
-            relevant_chunks = self.query_bot.retrieve_relevant_chunks(user_prompt, chat_history)
+            # Course codes are looked up in the full history, not just what fits the prompt
+            relevant_chunks = await self.query_bot.retrieve_relevant_chunks(user_prompt, chat_history)
             if relevant_chunks:
+                chat_history = await self.compactor.fit(user_id, conversation_id, chat_history,
+                                                        Config.HISTORY_TOKEN_BUDGET_QUERY, "query")
+            if relevant_chunks and stream:
+                result = {
+                    "stream": self.query_bot.query_llama_stream(user_prompt, relevant_chunks, chat_history),
+                    "pdf_file": None
+                }
+            elif relevant_chunks:
                 result = await self.query_bot.query_llama(user_prompt, relevant_chunks, chat_history)
+            elif self.warmup_status in ("warming_up", "failed"):
+                # A failed warm-up is retried, so the index is still on its way
+                result = {"text": WARMING_UP_TEXT, "pdf_file": None}
             else:
                 # No relevant chunks found - provide helpful response
                 result = {
@@ -229,11 +481,4 @@ You are specifically designed for IITI students, so be aware of their academic c
                     "pdf_file": None
                 }
 
-        # Save bot response to history
-        if result and result.get("text"):
-            text_to_save = result["text"]
-            if isinstance(text_to_save, list):
-                text_to_save = "\n".join(text_to_save)
-            await self.history_manager.save_message(user_id, conversation_id, "assistant", text_to_save)
-
         return result
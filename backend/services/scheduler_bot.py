@@ -1,31 +1,29 @@
 import httpx
 from core.config import Config
+from core.llm_client import GroqClient
+from core.rate_limiter import ModelBusyError
 
 class Scheduler:
-    def __init__(self, api_key: str = Config.GROQ_API_KEY, model_name: str = Config.GROQ_MODEL):
-        self.GROQ_API_KEY = api_key
+    def __init__(self, llm_client: GroqClient, model_name: str = Config.GROQ_MODEL):
+        self.llm = llm_client
         self.MODEL_NAME = model_name
-        self.GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
         self.TIME_ZONE = "Asia/Kolkata"
 
-    async def _query_groq(self, prompt: str, max_tokens: int = 2048, temperature: float = 0.7) -> str:
-        """Query Groq API for schedule generation."""
-        headers = {
-            "Authorization": f"Bearer {self.GROQ_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        payload = {
+    def _build_payload(self, prompt: str, max_tokens: int = 2048, temperature: float = 0.7) -> dict:
+        return {
             "model": self.MODEL_NAME,
             "messages": [{"role": "user", "content": prompt}],
             "temperature": temperature,
             "max_tokens": max_tokens
         }
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.post(self.GROQ_API_URL, headers=headers, json=payload, timeout=30)
-            response.raise_for_status()
-            data = response.json()
-            return data["choices"][0]["message"]["content"].strip()
+
+    async def _query_groq(self, prompt: str, max_tokens: int = 2048, temperature: float = 0.7) -> str:
+        """Query Groq API for schedule generation."""
+        return await self.llm.complete(self._build_payload(prompt, max_tokens, temperature), timeout=30)
+
+    def _stream_groq(self, prompt: str, max_tokens: int = 2048, temperature: float = 0.7):
+        """Stream schedule generation deltas from Groq."""
+        return self.llm.stream_completion(self._build_payload(prompt, max_tokens, temperature), timeout=30)
 
     def build_schedule_prompt(self, task_description: str) -> str:
         """Builds a flexible prompt for schedule generation with explicit formatting."""
@@ -80,29 +78,38 @@ Time                 | Task
 Now, generate the schedule based on all the rules and the exact format described above.
 """
 
+    def _error_text(self, error: Exception) -> str:
+        """User-facing message for a failed schedule generation."""
+        if isinstance(error, ModelBusyError):
+            return str(error)
+        if isinstance(error, httpx.TimeoutException):
+            return "I'm taking too long to generate your schedule. Please try with a simpler request or fewer tasks."
+        if isinstance(error, httpx.HTTPStatusError):
+            return "I encountered an error while generating your schedule. Please try again in a moment."
+        print(f"Scheduler error: {error}")
+        return ("I had trouble creating your schedule. Could you please provide more details about:\n"
+                "- What tasks you need to complete\n"
+                "- How many days you have\n"
+                "- Any specific time constraints\n\n"
+                "For example: 'Create a 3-day study plan for my physics and math exams'")
+
     async def run_scheduler(self, initial_prompt: str) -> dict:
         """Run the scheduler to generate a study/productivity schedule."""
         try:
             llm_prompt = self.build_schedule_prompt(initial_prompt)
             formatted_schedule = await self._query_groq(llm_prompt)
             return {"text": formatted_schedule, "pdf_file": None}
-        except httpx.TimeoutException:
-            return {
-                "text": "I'm taking too long to generate your schedule. Please try with a simpler request or fewer tasks.",
-                "pdf_file": None
-            }
-        except httpx.HTTPStatusError as e:
-            return {
-                "text": f"I encountered an error while generating your schedule. Please try again in a moment.",
-                "pdf_file": None
-            }
+        except ModelBusyError as e:
+            return {"text": str(e), "pdf_file": None, "status_code": 503}
+        except Exception as e:
+            return {"text": self._error_text(e), "pdf_file": None}
+
+    async def run_scheduler_stream(self, initial_prompt: str):
+        """Stream the generated schedule as text deltas."""
+        started = False
+        try:
+            async for delta in self._stream_groq(self.build_schedule_prompt(initial_prompt)):
+                started = True
+                yield delta
         except Exception as e:
-            print(f"Scheduler error: {e}")
-            return {
-                "text": "I had trouble creating your schedule. Could you please provide more details about:\n"
-                       "- What tasks you need to complete\n"
-                       "- How many days you have\n"
-                       "- Any specific time constraints\n\n"
-                       "For example: 'Create a 3-day study plan for my physics and math exams'",
-                "pdf_file": None
-            }
+            yield ("\n\n" if started else "") + self._error_text(e)
@@ -0,0 +1,261 @@
+"""Curriculum edits reach the QueryBot index without a restart.
+
+A small in-memory stand-in for the Mongo collection (find / to_list and a
+change stream fed from a queue) drives CurriculumWatcher, and a hashing
+bag-of-words model stands in for SentenceTransformer so search results
+depend only on the course text.
+"""
+import asyncio
+import re
+import threading
+import zlib
+import numpy as np
+import pytest
+from services.curriculum_watcher import CurriculumWatcher
+from services.query_bot import QueryBot
+from utils.index_store import IndexStore
+
+DIM = 64
+
+
+class HashingModel:
+    def encode(self, texts, **kwargs):
+        single = isinstance(texts, str)
+        vectors = np.zeros((1 if single else len(texts), DIM), dtype=np.float32)
+        for row, text in enumerate([texts] if single else texts):
+            for word in re.findall(r"\w+", text.lower()):
+                vectors[row, zlib.crc32(word.encode()) % DIM] += 1
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-6)
+        return vectors[0] if single else vectors
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length=None):
+        return [dict(doc) for doc in self.docs]
+
+
+class FakeChangeStream:
+    def __init__(self, events: asyncio.Queue):
+        self.events = events
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.events.get()
+
+
+class FakeCollection:
+    """Enough of a Motor collection for QueryBot.fetch_courses and CurriculumWatcher."""
+
+    def __init__(self, docs):
+        self.docs = {doc["_id"]: doc for doc in docs}
+        self.events: asyncio.Queue = asyncio.Queue()
+
+    def find(self, query=None, projection=None):
+        ids = (query or {}).get("_id", {}).get("$in")
+        return FakeCursor([doc for doc_id, doc in self.docs.items() if ids is None or doc_id in ids])
+
+    def watch(self, **kwargs):
+        return FakeChangeStream(self.events)
+
+    # Writes also emit the change event a replica set would
+    def insert(self, doc):
+        self.docs[doc["_id"]] = doc
+        self.events.put_nowait({"operationType": "insert", "fullDocument": doc, "documentKey": {"_id": doc["_id"]}})
+
+    def replace(self, doc):
+        self.docs[doc["_id"]] = doc
+        self.events.put_nowait({"operationType": "replace", "fullDocument": doc, "documentKey": {"_id": doc["_id"]}})
+
+    def delete(self, doc_id):
+        del self.docs[doc_id]
+        self.events.put_nowait({"operationType": "delete", "documentKey": {"_id": doc_id}})
+
+
+def course(doc_id, code, title, description):
+    return {"_id": doc_id, "Course Code": code, "Course Title": title, "Description": description}
+
+
+INITIAL_COURSES = [
+    course("a", "CS101", "Programming", "Variables, loops, functions and recursion in the C programming language."),
+    course("b", "MA105", "Calculus", "Limits, continuity, derivatives and integrals of functions of one variable."),
+]
+
+
+@pytest.fixture
+def query_bot(tmp_path, monkeypatch):
+    monkeypatch.setattr(QueryBot, "load_embedding_model", lambda self: HashingModel())
+    bot = QueryBot(llm_client=None)
+    bot.index_store = IndexStore(str(tmp_path))
+    return bot
+
+
+async def top_course(bot: QueryBot, query: str) -> str | None:
+    hits = await bot.retrieve_relevant_chunks(query, top_k=1)
+    return hits[0][1]["course"] if hits else None
+
+
+async def wait_for_version_change(bot: QueryBot, version: str):
+    for _ in range(200):
+        if bot.index_version != version:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("curriculum change did not reach the index")
+
+
+def test_change_stream_insert_update_delete_reach_the_index(query_bot):
+    async def scenario():
+        collection = FakeCollection(INITIAL_COURSES)
+        await query_bot.initialize({"First_Year_Curriculum": collection})
+        watcher = CurriculumWatcher({"First_Year_Curriculum": collection}, query_bot)
+        watcher.start()
+        try:
+            query = "quantum entanglement superposition qubits"
+            assert await top_course(query_bot, query) != "PH110"
+
+            version = query_bot.index_version
+            collection.insert(course("c", "PH110", "Quantum Physics",
+                                     "Quantum entanglement, superposition and qubits for first year students."))
+            await wait_for_version_change(query_bot, version)
+            assert await top_course(query_bot, query) == "PH110"
+
+            version = query_bot.index_version
+            collection.replace(course("c", "PH110", "Thermal Physics",
+                                      "Thermodynamics, entropy, heat engines and the laws of thermodynamics."))
+            await wait_for_version_change(query_bot, version)
+            assert await top_course(query_bot, "entropy heat engines thermodynamics") == "PH110"
+            assert not any("entanglement" in chunk for chunk in query_bot.chunks)
+
+            version = query_bot.index_version
+            collection.delete("c")
+            await wait_for_version_change(query_bot, version)
+            assert await top_course(query_bot, "entropy heat engines thermodynamics") != "PH110"
+            assert all(meta["course"] != "PH110" for meta in query_bot.metadata)
+            assert query_bot.index.ntotal == len(query_bot.store)
+        finally:
+            await watcher.stop()
+            await query_bot.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_polling_picks_up_insert_update_delete(query_bot):
+    async def scenario():
+        collection = FakeCollection(INITIAL_COURSES)
+        await query_bot.initialize({"First_Year_Curriculum": collection})
+        watcher = CurriculumWatcher({"First_Year_Curriculum": collection}, query_bot, use_change_stream=False)
+        try:
+            query = "organic chemistry reactions alkanes"
+            assert await top_course(query_bot, query) != "CH101"
+
+            collection.insert(course("d", "CH101", "Chemistry",
+                                     "Organic chemistry reactions of alkanes, alkenes and aromatic compounds."))
+            upserted, removed = await watcher.poll_once()
+            assert [doc["_id"] for doc in upserted] == ["d"] and removed == []
+            assert await top_course(query_bot, query) == "CH101"
+
+            collection.replace(course("b", "MA105", "Calculus",
+                                      "Organic chemistry reactions alkanes alkanes alkanes for calculus students."))
+            upserted, _ = await watcher.poll_once()
+            assert [doc["_id"] for doc in upserted] == ["b"]
+            assert any("alkanes alkanes" in chunk for chunk in query_bot.chunks)
+
+            collection.delete("d")
+            upserted, removed = await watcher.poll_once()
+            assert upserted == [] and removed == ["d"]
+            assert await top_course(query_bot, query) == "MA105"
+
+            # Nothing changed: no work
+            assert await watcher.poll_once() == ([], [])
+        finally:
+            await query_bot.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_only_the_leader_applies_changes_and_followers_reload(tmp_path, monkeypatch):
+    monkeypatch.setattr(QueryBot, "load_embedding_model", lambda self: HashingModel())
+
+    async def scenario():
+        collection = FakeCollection(INITIAL_COURSES)
+        db = {"First_Year_Curriculum": collection}
+        # Two workers sharing one INDEX_CACHE_DIR
+        bots = [QueryBot(llm_client=None) for _ in range(2)]
+        for bot in bots:
+            bot.index_store = IndexStore(str(tmp_path))
+            await bot.initialize(db)
+        leader, follower = [CurriculumWatcher(db, bot, follow_interval=0.01) for bot in bots]
+        leader.start()
+        await asyncio.sleep(0.05)
+        follower.start()
+        applied = []
+        original = bots[1].apply_course_changes
+
+        async def record(*args):
+            applied.append(args)
+            await original(*args)
+
+        bots[1].apply_course_changes = record
+        try:
+            assert leader.leader and not follower.leader
+            query = "quantum entanglement superposition qubits"
+            version = bots[1].index_version
+            collection.insert(course("c", "PH110", "Quantum Physics",
+                                     "Quantum entanglement, superposition and qubits for first year students."))
+            await wait_for_version_change(bots[0], version)
+            await wait_for_version_change(bots[1], version)
+            assert bots[1].index_version == bots[0].index_version
+            assert await top_course(bots[1], query) == "PH110"
+            assert "c" in bots[1].doc_hashes
+            assert applied == []
+
+            # The follower takes over once the leader stops
+            await leader.stop()
+            for _ in range(100):
+                if follower.leader:
+                    break
+                await asyncio.sleep(0.01)
+            assert follower.leader
+        finally:
+            await leader.stop()
+            await follower.stop()
+            for bot in bots:
+                await bot.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_index_is_patched_off_the_event_loop_without_blocking_searches(query_bot):
+    async def scenario():
+        collection = FakeCollection(INITIAL_COURSES)
+        await query_bot.initialize({"First_Year_Curriculum": collection})
+        loop_thread = threading.get_ident()
+        calls = []
+        private_copy = query_bot.index_store.private_copy
+
+        def record(index):
+            calls.append((threading.get_ident(), query_bot._index_lock.locked()))
+            return private_copy(index)
+
+        query_bot.index_store.private_copy = record
+        try:
+            await query_bot.apply_course_changes(
+                [course("c", "PH110", "Quantum Physics", "Quantum entanglement, superposition and qubits.")], []
+            )
+            assert calls and all(thread != loop_thread and not locked for thread, locked in calls)
+            assert await top_course(query_bot, "quantum entanglement superposition qubits") == "PH110"
+            assert query_bot.index.ntotal == len(query_bot.store)
+        finally:
+            await query_bot.shutdown()
+
+    asyncio.run(scenario())
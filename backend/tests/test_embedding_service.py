@@ -0,0 +1,34 @@
+import asyncio
+import threading
+import numpy as np
+import pytest
+from services.embedding_service import EmbeddingService, EmbeddingServiceStopped
+
+
+class BlockingModel:
+    """Holds every encode until released, so requests pile up behind it."""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def encode(self, texts, **kwargs):
+        self.release.wait(5)
+        return np.zeros((len(texts), 4), dtype=np.float32)
+
+
+def test_stop_fails_queued_and_in_flight_requests():
+    async def scenario():
+        model = BlockingModel()
+        service = EmbeddingService(model, max_batch_size=1, max_wait_ms=0, max_queue_size=2)
+        service.start()
+        # One request in the encoder, two queued, one waiting for queue room
+        requests = [asyncio.create_task(service.encode(f"text {i}")) for i in range(4)]
+        await asyncio.sleep(0.05)
+        await service.stop()
+        model.release.set()
+        results = await asyncio.wait_for(asyncio.gather(*requests, return_exceptions=True), 1)
+        assert all(isinstance(result, EmbeddingServiceStopped) for result in results)
+        with pytest.raises(EmbeddingServiceStopped):
+            await service.encode("after stop")
+
+    asyncio.run(scenario())
@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from services.history import ChatHistoryManager
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs = sorted(self.docs, key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for doc in self.docs:
+            yield dict(doc)
+
+
+class FakeCollection:
+    """The subset of a Motor collection ChatHistoryManager uses, shared by both managers."""
+
+    def __init__(self):
+        self.docs = []
+
+    def _matching(self, query):
+        return [d for d in self.docs if all(d.get(k) == v for k, v in query.items())]
+
+    def find(self, query, projection=None):
+        return FakeCursor(self._matching(query))
+
+    async def find_one(self, query, projection=None, sort=None):
+        docs = self._matching(query)
+        if sort:
+            field, direction = sort[0]
+            docs = sorted(docs, key=lambda d: d[field], reverse=direction < 0)
+        return dict(docs[0]) if docs else None
+
+    async def insert_many(self, docs, ordered=True):
+        self.docs.extend(dict(d) for d in docs)
+
+
+def test_cached_history_picks_up_turns_saved_by_another_worker():
+    async def scenario():
+        db = {"chat_history": FakeCollection()}
+        worker_a, worker_b = ChatHistoryManager(db), ChatHistoryManager(db)
+        started = datetime.now(timezone.utc)
+
+        await worker_a.save_message("u", "c", "user", "turn 1", timestamp=started)
+        await worker_a.flush()
+        assert [m["content"] for m in await worker_a.load_history("u", "c")] == ["turn 1"]
+
+        await worker_b.save_message("u", "c", "user", "turn 2", timestamp=started + timedelta(seconds=1))
+        await worker_b.flush()
+        # Worker A has the conversation cached but must not miss worker B's turn
+        assert [m["content"] for m in await worker_a.load_history("u", "c")] == ["turn 1", "turn 2"]
+
+        # Nothing new elsewhere: the cache is still used
+        hits = worker_a._recent[("u", "c")]
+        assert [m["content"] for m in await worker_a.load_history("u", "c")] == ["turn 1", "turn 2"]
+        assert worker_a._recent[("u", "c")] is hits
+
+    asyncio.run(scenario())
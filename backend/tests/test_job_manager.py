@@ -0,0 +1,32 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from services.job_manager import InMemoryJobStore, JobManager
+
+
+def make_job(job_id: str, status: str) -> dict:
+    now = datetime.now(timezone.utc)
+    return {"id": job_id, "status": status, "stage": status, "progress": None,
+            "created_at": now, "updated_at": now, "expires_at": now + timedelta(minutes=5)}
+
+
+def test_watch_does_not_leak_events_for_unknown_finished_or_abandoned_jobs():
+    async def scenario():
+        store = InMemoryJobStore()
+        jobs = JobManager(runner=None, store=store, poll_interval=0.01)
+        await store.create(make_job("done", "done"))
+        await store.create(make_job("remote", "running"))
+
+        assert [job async for job in jobs.watch("missing")] == []
+        assert [job["status"] async for job in jobs.watch("done")] == ["done"]
+
+        # Two clients follow a job running in another worker; both disconnect
+        first, second = jobs.watch("remote"), jobs.watch("remote")
+        assert (await anext(first))["status"] == "running"
+        assert (await anext(second))["status"] == "running"
+        await first.aclose()
+        assert "remote" in jobs._changed
+        await second.aclose()
+
+        assert jobs._changed == {} and jobs._watchers == {}
+
+    asyncio.run(scenario())
@@ -0,0 +1,85 @@
+import asyncio
+import pytest
+from services.model_cascade import ModelCascade
+
+NOT_IN_CONTEXT = "The provided context does not list the credits; that information is not in the provided context."
+
+
+@pytest.mark.parametrize("answer", [
+    NOT_IN_CONTEXT,
+    "There is not enough information in the curriculum to say who teaches CS101.",
+    "The prerequisites cannot be determined from the course description given.",
+])
+def test_grounded_missing_information_answers_are_not_escalated(answer):
+    cascade = ModelCascade(small_model="small", large_model="large", enabled=True, escalate=True)
+    assert not cascade.low_confidence(answer, grounded=True)
+    assert cascade.low_confidence(answer)
+
+
+def test_hedges_still_escalate_when_grounded():
+    cascade = ModelCascade(small_model="small", large_model="large", enabled=True, escalate=True)
+    assert cascade.low_confidence("I'm not sure which semester this course is offered in.", grounded=True)
+    assert cascade.low_confidence("Yes.", grounded=True)
+
+
+def test_run_keeps_the_small_model_answer_for_a_missing_context_reply():
+    cascade = ModelCascade(small_model="small", large_model="large", enabled=True, escalate=True,
+                           max_small_prompt_tokens=1000)
+    calls = []
+
+    async def call(model):
+        calls.append(model)
+        return NOT_IN_CONTEXT
+
+    answer = asyncio.run(cascade.run(call, "query", 100, grounded=True))
+    assert answer == NOT_IN_CONTEXT
+    assert calls == ["small"]
+
+
+class StubDatabase(dict):
+    def __missing__(self, name):
+        return None
+
+
+class RecordingClient:
+    def __init__(self, answer):
+        self.answer = answer
+        self.models = []
+
+    async def complete(self, payload, timeout=None, lane="interactive"):
+        self.models.append(payload["model"])
+        return self.answer
+
+    async def stream_completion(self, payload, timeout=None, lane="interactive"):
+        self.models.append(payload["model"])
+        yield self.answer
+
+
+def general_router(answer):
+    from services.router_agent import RouterAgent
+
+    client = RecordingClient(answer)
+    router = RouterAgent(StubDatabase(), client)
+    router.cascade = ModelCascade(small_model="small", large_model="large", enabled=True, escalate=True)
+    return router, client
+
+
+def test_general_answers_go_through_the_cascade():
+    router, client = general_router("Hi! I'm NEXUS. I can help with courses, schedules and question papers.")
+    result = asyncio.run(router.handle_general_query("hello"))
+    assert result["text"].startswith("Hi!")
+    assert client.models == ["small"]
+
+    router, client = general_router("I'm not sure.")
+    asyncio.run(router.handle_general_query("what is the meaning of life?"))
+    assert client.models == ["small", "large"]
+
+
+def test_streamed_general_answers_use_the_chosen_tier():
+    router, client = general_router("Hello there, how can I help you today?")
+
+    async def collect():
+        return [delta async for delta in router.handle_general_query_stream("hello")]
+
+    assert asyncio.run(collect()) == ["Hello there, how can I help you today?"]
+    assert client.models == ["small"]
@@ -0,0 +1,29 @@
+import asyncio
+from core.config import Config
+from services.question_bot import QuestionPaperBot
+
+
+class RecordingClient:
+    def __init__(self):
+        self.models = []
+
+    async def complete(self, payload, timeout=None, lane="interactive"):
+        self.models.append(payload["model"])
+        return "Question 1:\nState Ohm's law.\n\nSolution 1\nV = IR: current is proportional to voltage."
+
+
+def solve(paper: str) -> list[str]:
+    client = RecordingClient()
+    bot = QuestionPaperBot(client)
+    bot.cascade.enabled = True
+    asyncio.run(bot.generate_ans_paper_text(paper))
+    return client.models
+
+
+def test_single_question_paper_is_solved_on_the_small_model():
+    assert solve("Physics quiz\n\nQuestion 1 (2 marks)\nState Ohm's law and give its SI units.") == [Config.GROQ_MODEL]
+
+
+def test_long_paper_is_solved_on_the_large_model():
+    essay = "Discuss the historical development of electromagnetism in detail. " * 400
+    assert solve(f"Question 1 (20 marks)\n{essay}") == [Config.GROQ_VERSATILE_MODEL]
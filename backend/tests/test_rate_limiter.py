@@ -0,0 +1,78 @@
+import asyncio
+import httpx
+import pytest
+from core.llm_client import GroqClient
+from core.rate_limiter import ModelBusyError, ModelLimiter
+
+
+def test_acquire_fails_busy_once_the_lane_wait_is_exceeded():
+    async def scenario():
+        limiter = ModelLimiter("m", rpm=60, tpm=1000, reserve_fraction=0.0,
+                               max_wait={"interactive": 0.1, "background": 60})
+        await limiter.acquire("interactive", 1000)
+        # The bucket refills ~17 tokens/s, far beyond the interactive lane's 0.1s
+        with pytest.raises(ModelBusyError) as busy:
+            await limiter.acquire("interactive", 500)
+        assert busy.value.retry_after > 1
+        assert "try again" in str(busy.value)
+        assert limiter._waiters == []
+
+    asyncio.run(scenario())
+
+
+def test_queued_waiter_behind_head_times_out():
+    async def scenario():
+        limiter = ModelLimiter("m", rpm=60, tpm=1000, reserve_fraction=0.0,
+                               max_wait={"interactive": 0.1, "background": 60})
+        await limiter.acquire("interactive", 1000)
+        head = asyncio.create_task(limiter.acquire("background", 10))
+        await asyncio.sleep(0)
+        with pytest.raises(ModelBusyError):
+            await limiter.acquire("interactive", 900)
+        await asyncio.wait_for(head, 2)
+
+    asyncio.run(scenario())
+
+
+def test_settle_charges_overruns_and_refunds_the_rest():
+    limiter = ModelLimiter("m", rpm=60, tpm=1000, max_wait={})
+    limiter.tokens.take(300)
+    limiter.settle(300, 500)
+    assert limiter.tokens.level == pytest.approx(500, abs=1)
+    limiter.settle(300, 100)
+    assert limiter.tokens.level == pytest.approx(700, abs=1)
+
+
+def test_reservation_uses_expected_output_not_max_tokens():
+    client = GroqClient(api_key="k", rate_limits={}, expected_output_tokens=300)
+    payload = {"messages": [{"role": "user", "content": "hi"}], "max_tokens": 4096}
+    short = {**payload, "max_tokens": 10}
+    assert client._reservation(payload) - client._reservation(short) == 290
+    assert client._reservation(payload) < 400
+
+
+def connect_timeout(request):
+    raise httpx.ConnectTimeout("timed out", request=request)
+
+
+@pytest.mark.parametrize("handler", [
+    lambda request: httpx.Response(400, json={"error": "bad request"}),
+    # A 429 on the last attempt
+    lambda request: httpx.Response(429, headers={"retry-after": "0"}),
+    connect_timeout,
+])
+def test_failed_call_refunds_its_reservation(handler):
+    async def scenario():
+        client = GroqClient(api_key="k", rate_limits={"m": (60, 1000)}, max_retries=0)
+        client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        limiter = client.limiters["m"]
+        limiter.max_wait = {}
+        payload = {"model": "m", "messages": [{"role": "user", "content": "hi"}]}
+        try:
+            with pytest.raises(httpx.HTTPError):
+                await client._send(payload, None, "interactive", stream=False)
+        finally:
+            await client.close()
+        assert limiter.tokens.level == pytest.approx(1000, abs=1)
+
+    asyncio.run(scenario())
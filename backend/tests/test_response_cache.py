@@ -0,0 +1,16 @@
+import numpy as np
+from services.response_cache import ResponseCache
+
+
+def test_restoring_without_a_vector_leaves_the_semantic_tier_working():
+    cache = ResponseCache(max_size=10, ttl=60, similarity_threshold=0.9)
+    vec = np.array([1.0, 0.0, 0.0])
+    cache.store("credits of CS101?", vec, [1, 2], "4 credits")
+    # The embedding failed on a later request for the same question
+    cache.store("credits of CS101?", None, [1, 2], "4 credits (3-0-2)")
+
+    assert cache.lookup("how many credits does CS101 have", vec, [2, 1]) is None
+    assert cache.lookup("credits of CS101?", None, [1, 2]) == "4 credits (3-0-2)"
+
+    cache.store("syllabus of CS101", vec, [1, 2], "Loops, functions")
+    assert cache.lookup("CS101 syllabus please", vec, [1, 2]) == "Loops, functions"
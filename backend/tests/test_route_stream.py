@@ -0,0 +1,36 @@
+import json
+from fastapi.testclient import TestClient
+import main
+
+
+class CannedRouter:
+    def __init__(self, result):
+        self.result = result
+
+    async def route(self, prompt, user_id, convo_id, pdf_source=None, stream=False):
+        return dict(self.result)
+
+
+def post_route(result, stream):
+    main.app.state.router = CannedRouter(result)
+    # No context manager: the lifespan (Mongo, warm-up) is not needed here
+    client = TestClient(main.app)
+    return client.post("/route", data={"prompt": "credits of CS101", "stream": str(stream).lower()})
+
+
+def test_canned_text_is_one_delta_then_done_when_streaming():
+    resp = post_route({"text": "**Credits** for CS101: 3-0-2", "pdf_file": None}, stream=True)
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in resp.text.splitlines()]
+    assert events == [{"type": "delta", "text": "**Credits** for CS101: 3-0-2"}, {"type": "done"}]
+
+
+def test_canned_text_stays_json_without_stream():
+    resp = post_route({"text": "**Credits** for CS101: 3-0-2", "pdf_file": None}, stream=False)
+    assert resp.json() == {"text": "**Credits** for CS101: 3-0-2"}
+
+
+def test_error_results_keep_their_status_when_streaming():
+    resp = post_route({"text": "Busy, retry later", "pdf_file": None, "status_code": 503}, stream=True)
+    assert resp.status_code == 503
+    assert resp.json() == {"text": "Busy, retry later"}
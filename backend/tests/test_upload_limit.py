@@ -0,0 +1,15 @@
+from fastapi.testclient import TestClient
+from core.config import Config
+import main
+from utils.uploads import FORM_OVERHEAD_BYTES
+
+
+def test_oversized_upload_413_carries_cors_headers():
+    client = TestClient(main.app)
+    resp = client.post(
+        "/route",
+        content=b"x" * (Config.UPLOAD_MAX_BYTES + FORM_OVERHEAD_BYTES + 1),
+        headers={"Origin": "http://localhost:5173", "Content-Type": "multipart/form-data; boundary=b"}
+    )
+    assert resp.status_code == 413
+    assert resp.headers["access-control-allow-origin"] == "http://localhost:5173"
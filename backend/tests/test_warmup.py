@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+from services.query_bot import QueryBot
+from services.router_agent import RouterAgent
+
+
+class EmptyDatabase(dict):
+    def __missing__(self, name):
+        return EmptyCollection()
+
+
+class EmptyCollection:
+    def find(self, query=None, projection=None):
+        return self
+
+    async def to_list(self, length=None):
+        return []
+
+
+def make_router(monkeypatch, failures: int):
+    router = RouterAgent(EmptyDatabase(), llm_client=None)
+    attempts = []
+
+    async def warm_up():
+        attempts.append(router.warmup_status)
+        if len(attempts) <= failures:
+            raise RuntimeError("index unavailable")
+
+    monkeypatch.setattr(router, "_warm_up", warm_up)
+    return router, attempts
+
+
+def test_query_bot_initialize_raises_without_an_index():
+    bot = QueryBot(llm_client=None)
+    with pytest.raises(RuntimeError):
+        asyncio.run(bot.initialize({"First_Year_Curriculum": EmptyCollection()}))
+    assert not bot.ready
+
+
+def test_failed_warmup_reports_failed_and_retries_until_done(monkeypatch):
+    router, attempts = make_router(monkeypatch, failures=2)
+    statuses = []
+
+    async def scenario():
+        task = asyncio.create_task(router.initialize_bots(max_attempts=0, backoff_base=0.05, backoff_max=0.05))
+        while not task.done():
+            statuses.append(router.warmup_status)
+            await asyncio.sleep(0.01)
+        await task
+
+    asyncio.run(scenario())
+    assert attempts == ["warming_up"] * 3
+    assert "failed" in statuses
+    assert router.warmup_status == "done"
+    assert router.warmup_attempts == 3 and router.warmup_error is None
+
+
+def test_warmup_gives_up_after_max_attempts(monkeypatch):
+    router, attempts = make_router(monkeypatch, failures=10)
+    with pytest.raises(RuntimeError):
+        asyncio.run(router.initialize_bots(max_attempts=2, backoff_base=0, backoff_max=0))
+    assert len(attempts) == 2
+    assert router.warmup_status == "failed"
+    assert router.warmup_error == "RuntimeError: index unavailable"
+    assert not router.ready
@@ -0,0 +1,68 @@
+import time
+from collections import OrderedDict
+from utils.metrics import metrics
+
+_MISSING = object()
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after `ttl` seconds.
+
+    Hits and misses are counted on the instance and exported to the metrics
+    registry as `cache.<name>.hits` / `cache.<name>.misses`.
+    """
+
+    def __init__(self, max_size: int, ttl: float, name: str):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key, default=None):
+        entry = self._data.get(key, _MISSING)
+        if entry is not _MISSING:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self._record(hit=True)
+                return value
+            del self._data[key]
+        self._record(hit=False)
+        return default
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            metrics.incr(f"cache.{self.name}.evictions")
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+    def _record(self, hit: bool):
+        if hit:
+            self.hits += 1
+            metrics.incr(f"cache.{self.name}.hits")
+        else:
+            self.misses += 1
+            metrics.incr(f"cache.{self.name}.misses")
@@ -0,0 +1,83 @@
+import re
+
+COURSE_CODE_PATTERN = re.compile(r"[A-Z]{2,3}\d{3}[A-Z]?")
+# Shortest prefix indexed for prefix lookups, e.g. "EE" or "EE1"
+MIN_PREFIX_LENGTH = 2
+
+
+def normalize_course_code(code: str) -> str:
+    return (code or "").upper().replace(" ", "")
+
+class ChunkStore:
+    """Immutable snapshot of the searchable curriculum chunks.
+
+    Every chunk has a stable int64 id that is also its id in the FAISS
+    IndexIDMap. Updates never mutate a store; they build a new one, so a reader
+    that grabbed a reference keeps a consistent view while the next version is
+    swapped in.
+    """
+
+    def __init__(self, ids=None, chunks=None, metadata=None, next_id: int | None = None):
+        self.ids = [int(i) for i in (ids if ids is not None else [])]
+        self.chunks = list(chunks or [])
+        self.metadata = list(metadata or [])
+        self.positions = {chunk_id: pos for pos, chunk_id in enumerate(self.ids)}
+        self.doc_chunk_ids: dict[str, list[int]] = {}
+        for chunk_id, meta in zip(self.ids, self.metadata):
+            self.doc_chunk_ids.setdefault(meta.get("doc_id"), []).append(chunk_id)
+        self.code_index, self.prefix_index = self._build_code_indexes()
+        if next_id is None:
+            next_id = max(self.ids) + 1 if self.ids else 0
+        self.next_id = next_id
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def get(self, chunk_id: int) -> tuple[str, dict] | None:
+        """Return (chunk, metadata) for an id, or None if it is not in this snapshot."""
+        pos = self.positions.get(int(chunk_id))
+        if pos is None:
+            return None
+        return self.chunks[pos], self.metadata[pos]
+
+    def _build_code_indexes(self):
+        """Map normalized course codes (and their prefixes) to chunk ids, in store order."""
+        code_index: dict[str, list[int]] = {}
+        prefix_index: dict[str, list[int]] = {}
+        for chunk_id, meta in zip(self.ids, self.metadata):
+            normalized = normalize_course_code(meta.get("course", ""))
+            if not normalized:
+                continue
+            # A course field may list several codes ("EE101/EE102"); index each one
+            codes = {normalized, *COURSE_CODE_PATTERN.findall(normalized)}
+            prefixes = set()
+            for code in codes:
+                code_index.setdefault(code, []).append(chunk_id)
+                prefixes.update(code[:n] for n in range(MIN_PREFIX_LENGTH, len(code) + 1))
+            for prefix in prefixes:
+                prefix_index.setdefault(prefix, []).append(chunk_id)
+        return code_index, prefix_index
+
+    def chunk_ids_for_code(self, course_code: str) -> list[int]:
+        """Chunk ids for an exact course code, or for every code it is a prefix of."""
+        normalized = normalize_course_code(course_code)
+        return self.code_index.get(normalized) or self.prefix_index.get(normalized, [])
+
+    def replace_docs(self, doc_ids, new_chunks: list, new_metadata: list):
+        """Drop every chunk of `doc_ids` and append the new chunks.
+
+        Returns (new_store, removed_ids, added_ids).
+        """
+        doc_ids = set(doc_ids)
+        keep = [pos for pos, meta in enumerate(self.metadata) if meta.get("doc_id") not in doc_ids]
+        removed_ids = [chunk_id for chunk_id, meta in zip(self.ids, self.metadata) if meta.get("doc_id") in doc_ids]
+        added_ids = list(range(self.next_id, self.next_id + len(new_chunks)))
+
+        new_metadata = [{**meta, "chunk_id": chunk_id} for meta, chunk_id in zip(new_metadata, added_ids)]
+        store = ChunkStore(
+            ids=[self.ids[pos] for pos in keep] + added_ids,
+            chunks=[self.chunks[pos] for pos in keep] + list(new_chunks),
+            metadata=[self.metadata[pos] for pos in keep] + new_metadata,
+            next_id=self.next_id + len(new_chunks)
+        )
+        return store, removed_ids, added_ids
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from core.config import Config
+from utils.chunk_store import ChunkStore
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process build lock
+    fcntl = None
+
+# Bump when the on-disk layout changes so old artifacts are ignored.
+INDEX_FORMAT_VERSION = 3
+
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.json"
+MANIFEST_FILE = "manifest.json"
+BUILD_LOCK_FILE = ".build.lock"
+LEADER_LOCK_FILE = ".leader.lock"
+# Name of the version the curriculum leader last published
+CURRENT_FILE = ".current"
+
+
+def doc_hash(course: dict) -> str:
+    """Stable hash of a single curriculum document."""
+    return hashlib.sha256(json.dumps(course, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def content_hash(doc_hashes, model_name: str) -> str:
+    """Stable hash of the whole curriculum (per-document hashes), embedding model and format version."""
+    digest = hashlib.sha256()
+    digest.update(f"format={INDEX_FORMAT_VERSION}\nmodel={model_name}\n".encode("utf-8"))
+    for h in sorted(doc_hashes):
+        digest.update(h.encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+class IndexStore:
+    """Versioned on-disk FAISS index artifacts.
+
+    Each version lives in its own directory named after the content hash and
+    holds the FAISS index, the chunk texts/metadata and a manifest. The
+    vectors live only in the index file. The manifest is written last, so a directory without one is an
+    incomplete build and is ignored.
+    """
+
+    def __init__(self, root: str = Config.INDEX_CACHE_DIR):
+        self.root = root
+        self._leader_file = None
+
+    def path_for(self, version: str) -> str:
+        return os.path.join(self.root, version)
+
+    @contextmanager
+    def build_lock(self):
+        """Hold an exclusive lock across processes while loading or building an artifact.
+
+        Uvicorn workers start together; the first one builds the index and the
+        others wait, then memory-map what it wrote instead of building their own.
+        """
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, BUILD_LOCK_FILE), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def try_lead(self) -> bool:
+        """Become the process that applies curriculum updates, without waiting.
+
+        The leader holds an exclusive lock on LEADER_LOCK_FILE for as long as
+        it lives, so when it exits the next worker to ask takes over.
+        """
+        if self._leader_file is not None:
+            return True
+        if fcntl is None:
+            return True
+        os.makedirs(self.root, exist_ok=True)
+        lock_file = open(os.path.join(self.root, LEADER_LOCK_FILE), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._leader_file = lock_file
+        return True
+
+    def release_leadership(self):
+        if self._leader_file is not None:
+            self._leader_file.close()
+            self._leader_file = None
+
+    def publish(self, version: str):
+        """Point CURRENT_FILE at a saved version so other workers reload it."""
+        path = os.path.join(self.root, CURRENT_FILE)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(tmp_path, path)
+
+    def current(self) -> str | None:
+        """The last published version, or None if nothing was published yet."""
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE), encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def load(self, version: str) -> dict | None:
+        """Memory-map a stored artifact, or return None if it is missing or unreadable.
+
+        IO_FLAG_MMAP_IFC maps the flat vector array straight from the file, so
+        processes loading the same version share its pages. (IO_FLAG_MMAP
+        would still copy the vectors of an IndexFlat into private memory.)
+        The mapped index is read-only; use `private_copy` before modifying it.
+        """
+        path = self.path_for(version)
+        manifest_path = os.path.join(path, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return None
+        try:
+            import faiss
+
+            with open(manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("format") != INDEX_FORMAT_VERSION:
+                return None
+            index = faiss.read_index(
+                os.path.join(path, INDEX_FILE),
+                faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+            )
+            with open(os.path.join(path, CHUNKS_FILE), encoding="utf-8") as f:
+                stored = json.load(f)
+            store = ChunkStore(
+                ids=stored["ids"],
+                chunks=stored["chunks"],
+                metadata=stored["metadata"],
+                next_id=stored["next_id"]
+            )
+            return {"index": index, "store": store, "manifest": manifest}
+        except Exception as e:
+            print(f"Error loading index artifact {path}: {e}")
+            return None
+
+    @staticmethod
+    def private_copy(index):
+        """Writable in-memory copy of a (possibly memory-mapped) index.
+
+        faiss.clone_index crashes on IO_FLAG_MMAP_IFC indexes, so the copy goes
+        through serialization instead.
+        """
+        import faiss
+
+        return faiss.deserialize_index(faiss.serialize_index(index))
+
+    def save(self, version: str, index, store: ChunkStore, model_name: str):
+        """Write an artifact atomically: build in a temp dir, then rename into place."""
+        final_path = self.path_for(version)
+        if os.path.exists(os.path.join(final_path, MANIFEST_FILE)):
+            return
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{final_path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        try:
+            import faiss
+
+            faiss.write_index(index, os.path.join(tmp_path, INDEX_FILE))
+            with open(os.path.join(tmp_path, CHUNKS_FILE), "w", encoding="utf-8") as f:
+                json.dump({
+                    "ids": store.ids,
+                    "chunks": store.chunks,
+                    "metadata": store.metadata,
+                    "next_id": store.next_id
+                }, f)
+            manifest = {
+                "format": INDEX_FORMAT_VERSION,
+                "version": version,
+                "model": model_name,
+                "num_chunks": len(store),
+                "dim": int(index.d)
+            }
+            with open(os.path.join(tmp_path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+            shutil.rmtree(final_path, ignore_errors=True)
+            os.replace(tmp_path, final_path)
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+    def prune(self, keep: str):
+        """Remove every stored version except `keep`."""
+        if not os.path.isdir(self.root):
+            return
+        for name in os.listdir(self.root):
+            # Leave in-progress builds from other processes (and the build lock) alone
+            if name != keep and ".tmp-" not in name and not name.startswith("."):
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
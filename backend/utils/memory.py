@@ -1,4 +1,23 @@
 import psutil, os
+from utils.metrics import metrics
 
 def print_memory_usage(tag=""):
     print(f"[MEMORY {tag}] Used: {psutil.Process(os.getpid()).memory_info().rss / 1024**2:.2f} MB")
+
+def memory_usage(pid: int | None = None) -> dict[str, float]:
+    """RSS, and where the OS reports them USS/PSS, of a process in MB.
+
+    RSS counts shared pages (the mmapped index artifact, shared libraries) in
+    every worker; PSS splits them between the processes that map them, so
+    summing PSS over workers gives the real footprint.
+    """
+    process = psutil.Process(pid or os.getpid())
+    try:
+        info = process.memory_full_info()
+    except psutil.AccessDenied:
+        info = process.memory_info()
+    return {field: getattr(info, field) / 1024**2 for field in ("rss", "uss", "pss") if hasattr(info, field)}
+
+def record_memory_gauges():
+    for field, mb in memory_usage().items():
+        metrics.set_gauge(f"process.{field}_mb", round(mb, 2))
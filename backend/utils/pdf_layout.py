@@ -0,0 +1,118 @@
+import io
+from reportlab.lib.pagesizes import A4
+
+HEADING_PREFIXES = ("part", "section", "instructions", "questions", "question", "solution")
+
+# font name -> {char: width at size 1000}, shared by every render in the process
+_GLYPH_WIDTHS: dict[str, dict[str, float]] = {}
+
+
+def glyph_widths(font_name: str) -> dict[str, float]:
+    """Per-font glyph width table, filled lazily one character at a time."""
+    table = _GLYPH_WIDTHS.get(font_name)
+    if table is None:
+        table = _GLYPH_WIDTHS[font_name] = {}
+    return table
+
+
+def text_width(text: str, font_name: str, font_size: float) -> float:
+    """Width of `text` in points; equal to canvas.stringWidth for the built-in Type1 fonts."""
+    table = glyph_widths(font_name)
+    total = 0.0
+    for ch in text:
+        width = table.get(ch)
+        if width is None:
+            width = table[ch] = _glyph_width(ch, font_name)
+        total += width
+    return total * font_size / 1000
+
+
+def _glyph_width(ch: str, font_name: str) -> float:
+    # reportlab's font metrics load on the first miss rather than at import
+    from reportlab.pdfbase import pdfmetrics
+    return pdfmetrics.stringWidth(ch, font_name, 1000)
+
+
+def wrap_text(text: str, font_name: str, font_size: float, max_width: float) -> list[str]:
+    """Greedy word wrap in a single pass.
+
+    Each word is measured once and the running line width is kept, instead of
+    re-measuring the whole candidate line for every word.
+    """
+    space = text_width(" ", font_name, font_size)
+    lines, current, current_width = [], [], 0.0
+    for word in text.split():
+        word_width = text_width(word, font_name, font_size)
+        candidate = current_width + space + word_width if current else word_width
+        if candidate <= max_width:
+            current.append(word)
+            current_width = candidate
+        else:
+            lines.append(" ".join(current))
+            current, current_width = [word], word_width
+    if current:
+        lines.append(" ".join(current))
+    return lines
+
+
+def fit_lines(lines: list[str], font_name: str = "Times-Roman", font_size: float = 11,
+              page_size=A4, margin: float = 50) -> list[str]:
+    """Wrap every line to the usable page width, keeping blank lines."""
+    usable_width = page_size[0] - 2 * margin
+    fitted = []
+    for line in lines:
+        if line.strip() == "":
+            fitted.append("")
+        else:
+            fitted.extend(wrap_text(line, font_name, font_size, usable_width))
+    return fitted
+
+
+def render_lines(lines: list[str], page_size=A4, margin: float = 50,
+                 line_height: float = 14, font_size: float = 11) -> io.BytesIO:
+    """Lay out pre-wrapped lines into a PDF written straight into memory.
+
+    The first five non-empty lines are centred as the paper header, heading
+    lines are set in bold and blank lines add half a line of space. Each page
+    is drawn as one text object and emitted as soon as it is full.
+    """
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=page_size)
+    width, height = page_size
+    y = height - margin
+    text = c.beginText()
+
+    for i, line in enumerate(lines):
+        clean_line = line.strip()
+        if i < 5 and clean_line:
+            text.setFont("Times-Bold", 14)
+            text.setTextOrigin((width - text_width(clean_line, "Times-Bold", 14)) / 2, y)
+            text.textOut(clean_line)
+            y -= line_height
+        elif any(clean_line.lower().startswith(p) for p in HEADING_PREFIXES):
+            text.setFont("Times-Bold", 12)
+            text.setTextOrigin(margin, y)
+            text.textOut(clean_line)
+            y -= line_height
+        elif clean_line == "":
+            y -= line_height // 2
+        else:
+            text.setFont("Times-Roman", font_size)
+            text.setTextOrigin(margin, y)
+            text.textOut(clean_line)
+            y -= line_height
+
+        if y < margin:
+            c.drawText(text)
+            c.showPage()
+            y = height - margin
+            text = c.beginText()
+
+    # A page that was just turned holds nothing yet; drawing it would add a blank page
+    if y < height - margin:
+        c.drawText(text)
+    c.save()
+    buffer.seek(0)
+    return buffer
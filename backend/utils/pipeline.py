@@ -0,0 +1,47 @@
+import asyncio
+from typing import Awaitable, Callable
+
+class StageGraph:
+    """Tiny dependency-aware runner for async pipeline stages.
+
+    Each stage is an async callable that receives the results of its
+    dependencies as keyword arguments. Stages start as soon as everything they
+    depend on has finished, so independent stages run concurrently.
+    """
+
+    def __init__(self):
+        self._stages: dict[str, tuple[Callable[..., Awaitable], tuple[str, ...]]] = {}
+
+    def add(self, name: str, func: Callable[..., Awaitable], deps: tuple[str, ...] = ()) -> "StageGraph":
+        """Register a stage. Dependencies must be registered first, which keeps the graph acyclic."""
+        if name in self._stages:
+            raise ValueError(f"Stage '{name}' is already registered")
+        missing = [dep for dep in deps if dep not in self._stages]
+        if missing:
+            raise ValueError(f"Stage '{name}' depends on unknown stage(s): {', '.join(missing)}")
+        self._stages[name] = (func, tuple(deps))
+        return self
+
+    async def run(self) -> dict:
+        """Run all stages and return their results keyed by stage name.
+
+        If any stage fails, the remaining stages are cancelled and the first
+        error is re-raised.
+        """
+        tasks: dict[str, asyncio.Task] = {}
+
+        async def run_stage(func, deps):
+            inputs = {dep: await tasks[dep] for dep in deps}
+            return await func(**inputs)
+
+        for name, (func, deps) in self._stages.items():
+            tasks[name] = asyncio.create_task(run_stage(func, deps), name=f"stage:{name}")
+
+        try:
+            results = await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        return dict(zip(tasks.keys(), results))
@@ -0,0 +1,17 @@
+# Groq does not expose the Llama tokenizer; ~4 characters per token is close
+# enough for budgeting English prompts.
+CHARS_PER_TOKEN = 4
+# Role markers and separators the chat template adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def message_tokens(message: dict) -> int:
+    return estimate_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+
+def messages_tokens(messages: list[dict]) -> int:
+    return sum(message_tokens(m) for m in messages)
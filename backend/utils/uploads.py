@@ -0,0 +1,121 @@
+import asyncio
+import os
+import uuid
+from fastapi import UploadFile
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+from core.config import Config
+
+# Multipart boundaries and the other form fields on top of the file itself
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """The uploaded file exceeds UPLOAD_MAX_BYTES; the message is user-facing."""
+
+
+def too_large_message(max_bytes: int = Config.UPLOAD_MAX_BYTES) -> str:
+    return f"This file is too large. Please upload a PDF smaller than {max_bytes // (1024 * 1024)} MB."
+
+
+class UploadLimitMiddleware:
+    """Reject oversized request bodies on upload endpoints before they are buffered.
+
+    A declared Content-Length over the limit is answered with 413 without
+    reading the body; otherwise bytes are counted as they arrive and the
+    request is aborted with 413 as soon as the limit is crossed.
+    """
+
+    def __init__(self, app, paths: tuple[str, ...], max_bytes: int = Config.UPLOAD_MAX_BYTES):
+        self.app = app
+        self.paths = paths
+        self.max_body_bytes = max_bytes + FORM_OVERHEAD_BYTES
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        response = JSONResponse({"text": too_large_message(self.max_bytes)}, status_code=413)
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_body_bytes:
+            await response(scope, receive, send)
+            return
+
+        received = 0
+        exceeded = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    exceeded = True
+                    raise HTTPException(status_code=413)
+            return message
+
+        async def guarded_send(message):
+            # Form parsing turns the abort into its own error response; send ours instead
+            if not exceeded:
+                await send(message)
+
+        await self.app(scope, limited_receive, guarded_send)
+        if exceeded:
+            await response(scope, receive, send)
+
+
+async def read_upload(file: UploadFile,
+                      max_bytes: int = Config.UPLOAD_MAX_BYTES,
+                      spool_threshold: int = Config.UPLOAD_SPOOL_THRESHOLD,
+                      chunk_size: int = Config.UPLOAD_CHUNK_SIZE) -> bytes | str:
+    """Read an upload in chunks without blocking the event loop.
+
+    Files up to `spool_threshold` bytes are returned as bytes; larger ones are
+    written to a file under temp/ (writes run in a worker thread) and its path
+    is returned. Raises UploadTooLargeError past `max_bytes`.
+    """
+    chunks, size = [], 0
+    while chunk := await file.read(chunk_size):
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadTooLargeError(too_large_message(max_bytes))
+        chunks.append(chunk)
+        if size > spool_threshold:
+            break
+    else:
+        return b"".join(chunks)
+
+    os.makedirs("temp", exist_ok=True)
+    # Use unique filename to avoid collisions
+    file_path = os.path.join("temp", f"{uuid.uuid4()}_{os.path.basename(file.filename or 'upload.pdf')}")
+    out = await asyncio.to_thread(open, file_path, "wb")
+    try:
+        await asyncio.to_thread(out.writelines, chunks)
+        while chunk := await file.read(chunk_size):
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLargeError(too_large_message(max_bytes))
+            await asyncio.to_thread(out.write, chunk)
+    except BaseException:
+        await asyncio.to_thread(out.close)
+        await discard_upload(file_path)
+        raise
+    await asyncio.to_thread(out.close)
+    return file_path
+
+
+async def discard_upload(source: bytes | str | None):
+    """Delete a spooled upload (in-memory uploads need no cleanup)."""
+    if isinstance(source, str):
+        await asyncio.to_thread(_remove_file, source)
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Error cleaning up file {path}: {e}")